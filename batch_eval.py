@@ -0,0 +1,266 @@
+#***********************************************************************************************
+# Headless batch evaluation of prompts against the configured chat services
+#
+# Reads prompts from a JSONL file (one {"id": ..., "prompt": ...} object per line; optional
+# "system_message" and "services" keys), runs every prompt through every selected service on a
+# bounded asyncio worker pool, and writes one result per (prompt, service) to JSONL or Parquet
+# as soon as it finishes.
+#
+# Usage: python batch_eval.py prompts.jsonl results.jsonl [--services gpt-4-turbo phi3-instruct] [--workers 8]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+# Third-party imports
+import streamlit as st
+import streamlit.logger
+
+# Local imports
+from helpers import helper_sk as sk
+from helpers.helper_history import count_tokens
+from helpers.helper_admission import RETRYABLE_STATUS_CODES, error_status
+
+
+# Rows buffered before a Parquet row group is written
+PARQUET_BATCH_ROWS = 500
+
+# Parquet columns of a result record and their Arrow types. Declared rather than inferred, so a
+# column that is all null in the first row group (e.g. error) doesn't reject later rows; the id is
+# written as a string, since prompt files may mix string and numeric IDs
+PARQUET_COLUMNS = (
+    ("id", "string"), ("service_id", "string"), ("output", "string"), ("error", "string"), ("attempts", "int64"),
+    ("latency", "float64"), ("prompt_tokens", "int64"), ("completion_tokens", "int64"),
+)
+
+
+class NullResponseHolder:
+    """
+    Response holder that discards output, used in place of a Streamlit placeholder.
+    """
+
+    def write(self, text):
+        pass
+
+    def json(self, text):
+        pass
+
+
+# Return a percentile of a sorted list
+def percentile(sorted_values, q):
+    """
+    Return the q-th percentile (0-100) of a sorted list, by nearest rank.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+# Read the work items from the prompts file
+def read_work_items(path, services):
+    """
+    Yield one work item per (prompt, service) from a JSONL prompts file, reading it lazily.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for service_id in record.get("services") or services:
+                yield {
+                    "id": record.get("id", line_number),
+                    "service_id": service_id,
+                    "prompt": record["prompt"],
+                    "system_message": record.get("system_message"),
+                    "settings": record.get("settings", {}),
+                }
+
+
+# Run one work item with retries
+async def run_work_item(item, max_retries, use_cache):
+    """
+    Run one prompt against one service within its quota, retrying 429/5xx errors with
+    exponential backoff (a 429's Retry-After pauses every call to the service). Returns the
+    result record.
+    """
+    chat_service = sk.get_chat_service(item["service_id"])
+    controller = sk.get_admission_controller()
+    tokens = sk.estimate_request_tokens(item["service_id"], item["system_message"], None, item["prompt"], item["settings"].get("max_tokens", 2000))
+    result = {"id": item["id"], "service_id": item["service_id"], "output": None, "error": None, "attempts": 0}
+
+    started = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            throttle_time = await controller.admit(item["service_id"], tokens)
+            async with sk.get_scheduler().slot(sk.get_service_endpoint(item["service_id"])) as slot_wait:
+                result["output"] = await sk.generate_response(
+                    response_holder=NullResponseHolder(),
+                    chat_service=chat_service,
+                    system_message=item["system_message"],
+                    chat_history=None,
+                    user_input=item["prompt"],
+                    use_cache=use_cache,
+                    queue_time=throttle_time + slot_wait,
+                    **item["settings"],
+                )
+            result["error"] = None
+            break
+        except Exception as e:
+            status, retry_after = error_status(e)
+            result["error"] = f"{status or type(e).__name__}: {e}"
+            if status not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                break
+            delay = retry_after if retry_after is not None else min(60.0, 2 ** attempt) * (0.5 + random.random())
+            if status == 429:
+                controller.throttle(item["service_id"], delay)
+            else:
+                await asyncio.sleep(delay)
+
+    result["latency"] = time.perf_counter() - started
+    result["prompt_tokens"] = count_tokens(item["system_message"] or "") + count_tokens(item["prompt"])
+    result["completion_tokens"] = count_tokens(result["output"] or "")
+    return result
+
+
+class ResultWriter:
+    """
+    Writes result records as they arrive, to JSONL (one line each) or Parquet (in row groups).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._rows = []
+        self._writer = None
+        self._file = None if self.parquet else open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        if not self.parquet:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            return
+        self._rows.append(record)
+        if len(self._rows) >= PARQUET_BATCH_ROWS:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Writing Parquet requires pyarrow (pip install pyarrow).")
+        if not self._rows:
+            return
+        schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in PARQUET_COLUMNS])
+        rows = [{**row, "id": str(row["id"])} for row in self._rows]
+        table = pa.Table.from_pylist(rows, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        if self.parquet:
+            self._write_row_group()
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+class ServiceStats:
+    """
+    Throughput and latency totals for one service.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.completion_tokens = 0
+        self.latencies = []
+
+    def add(self, result):
+        self.requests += 1
+        self.errors += result["error"] is not None
+        self.completion_tokens += result["completion_tokens"]
+        self.latencies.append(result["latency"])
+
+
+# Run the batch
+async def run_batch(args):
+    """
+    Run every work item through a bounded worker pool and write the results as they finish.
+    """
+    sk.initialize_chat_services()
+    services = args.services or st.session_state.chat_services
+    unknown = [service_id for service_id in services if service_id not in st.session_state.chat_services]
+    if unknown:
+        sys.exit(f"Unknown chat services: {', '.join(unknown)}. Configured: {', '.join(st.session_state.chat_services)}")
+
+    queue = asyncio.Queue(maxsize=args.workers * 2)
+    writer = ResultWriter(args.output)
+    stats = {}
+    started = time.perf_counter()
+
+    # Workers take items from the queue and write each result as soon as it is done
+    async def worker():
+        while (item := await queue.get()) is not None:
+            result = await run_work_item(item, args.max_retries, not args.no_cache)
+            writer.write(result)
+            stats.setdefault(result["service_id"], ServiceStats()).add(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.workers)]
+    try:
+        # The bounded queue keeps only a few items in memory while the file is read
+        for item in read_work_items(args.input, services):
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        writer.close()
+        await sk.release_event_loop_clients()
+
+    report(stats, time.perf_counter() - started)
+
+
+# Print the throughput and latency report
+def report(stats, elapsed):
+    """
+    Print requests/s, tokens/s and latency percentiles per service.
+    """
+    print(f"{'service':<24}{'requests':>9}{'errors':>8}{'req/s':>8}{'tok/s':>9}{'p50 s':>8}{'p90 s':>8}{'p99 s':>8}")
+    for service_id, service_stats in stats.items():
+        latencies = sorted(service_stats.latencies)
+        print(
+            f"{service_id:<24}{service_stats.requests:>9}{service_stats.errors:>8}"
+            f"{service_stats.requests / elapsed:>8.2f}{service_stats.completion_tokens / elapsed:>9.1f}"
+            f"{percentile(latencies, 50):>8.2f}{percentile(latencies, 90):>8.2f}{percentile(latencies, 99):>8.2f}"
+        )
+    print(f"Finished in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the configured chat services.")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"prompt\"} object per line")
+    parser.add_argument("output", help="Results file (.jsonl or .parquet)")
+    parser.add_argument("--services", nargs="+", help="Service IDs to run (default: all configured)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for 429/5xx errors")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the completion cache")
+    args = parser.parse_args()
+
+    # Silence Streamlit's warnings about running outside `streamlit run`
+    streamlit.logger.set_log_level("error")
+    asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    main()
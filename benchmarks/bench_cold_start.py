@@ -0,0 +1,113 @@
+#***********************************************************************************************
+# Benchmark: cold start of a fresh server process and of a new Streamlit session
+#
+# "process" runs each sample in a new Python process: it times importing the app's modules and
+# the first render of a page with Streamlit's AppTest. "session" times the first render of a
+# page for a new session in a process that has already served one (modules imported, process-
+# wide resources built). Rendering a page does not call any model.
+#
+# Usage: python benchmarks/bench_cold_start.py [--pages "Chat Services" "Chat Compare"] [--samples 5]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Make the repository root importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+APP_PATH = os.path.join(REPO_ROOT, "sk_streamlit.py")
+
+# The app needs two chat services; use local Ollama ones if none are configured
+# (nothing connects to them, since no page is asked for a response)
+if not any(os.getenv(name) for name in ("GPT_4_SERVICE_ID", "GPT_3_5_SERVICE_ID", "PHI3_MINI_OLLAMA_SERVICE_ID", "MIXTRAL_8x7B_OLLAMA_SERVICE_ID")):
+    os.environ.update(PHI3_MINI_OLLAMA_SERVICE_ID="phi3-instruct", PHI3_MINI_OLLAMA_MODEL_ID="phi3:instruct", PHI3_MINI_OLLAMA_URL="http://localhost:11434/api/chat",
+                      MIXTRAL_8x7B_OLLAMA_SERVICE_ID="mixtral-8x7b", MIXTRAL_8x7B_OLLAMA_MODEL_ID="mixtral:instruct", MIXTRAL_8x7B_OLLAMA_URL="http://localhost:11434/api/chat")
+
+
+def render_page(page):
+    """
+    Render a page of the app for a new session and return the seconds it took.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    started = time.perf_counter()
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.run()
+    if page != app.sidebar.radio[0].value:
+        app.sidebar.radio[0].set_value(page).run()
+    if app.exception:
+        raise RuntimeError(f"{page} failed to render: {app.exception[0].message}")
+    return time.perf_counter() - started
+
+
+def child(page):
+    """
+    Run in a fresh process: print the import and first render times as JSON.
+    """
+    import streamlit.logger
+
+    started = time.perf_counter()
+    import streamlit
+    from helpers import helper_utils, helper_sk
+    imported = time.perf_counter() - started
+
+    streamlit.logger.set_log_level("error")
+    rendered = render_page(page)
+    print(json.dumps({"import": imported, "first_render": rendered, "modules": len(sys.modules)}))
+
+
+def process_cold_start(page, samples):
+    """
+    Return the child timings of `samples` fresh processes.
+    """
+    results = []
+    for _ in range(samples):
+        output = subprocess.run([sys.executable, __file__, "--child", page], capture_output=True, text=True, check=True, cwd=REPO_ROOT).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def session_cold_start(page, samples):
+    """
+    Return the first render times of `samples` new sessions in this (warmed-up) process.
+    """
+    import streamlit.logger
+
+    streamlit.logger.set_log_level("error")
+    render_page(page)
+    return [render_page(page) for _ in range(samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of a server process and of a session.")
+    parser.add_argument("--pages", nargs="+", default=["Chat Services", "Chat Compare"])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # The app loads its CSS with paths relative to the repository root
+    os.chdir(REPO_ROOT)
+    if args.child:
+        child(args.child)
+        return
+
+    print(f"{'page':<16}{'process import s':>18}{'process render s':>18}{'modules':>9}{'session render s':>18}")
+    for page in args.pages:
+        processes = process_cold_start(page, args.samples)
+        sessions = session_cold_start(page, args.samples)
+        print(
+            f"{page:<16}{statistics.median(r['import'] for r in processes):>18.3f}"
+            f"{statistics.median(r['first_render'] for r in processes):>18.3f}"
+            f"{statistics.median(r['modules'] for r in processes):>9.0f}"
+            f"{statistics.median(sessions):>18.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
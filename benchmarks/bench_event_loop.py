@@ -0,0 +1,129 @@
+#***********************************************************************************************
+# Benchmark: per-turn latency with an event loop per script run vs. one long-lived event loop
+#
+# Every chat turn is a Streamlit script run. The app used to run each one with asyncio.run: the
+# chat services, HTTP clients and connection pools were built on that run's event loop and
+# closed at its end, so every turn paid for new clients and new connections. Now the model
+# calls run on the background worker's long-lived event loop (BackgroundWorker.run), which
+# keeps them across script runs. Each turn here is an asyncio.run, like a script run, that
+# streams one response from the mock model server:
+# - "per run": the service is built on the turn's own loop and its clients are closed at the end;
+# - "persistent": the call is bridged to a BackgroundWorker's loop, as the app does now.
+#
+# Reports the per-turn latency (script run start to last token) and time to first token, and
+# the connections each mode opened, for one Azure OpenAI and one Ollama service. (The OpenAI
+# client drops its connection at the end of every stream, so Azure turns save the client build
+# rather than the connection.)
+#
+# Usage: python benchmarks/bench_event_loop.py [--turns 30] [--ttft 0.02] [--tokens-per-second 2000]
+#            [--response-tokens 20] [--url http://127.0.0.1:18080]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Make the repository root importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Third-party imports
+import streamlit.logger
+
+# Local imports
+from batch_eval import percentile
+from benchmarks.load_test import CountingResponseHolder, create_registry, start_mock_server
+from helpers import helper_sk as sk
+from helpers.helper_worker import BackgroundWorker
+
+PROMPT = "Give three tips for reducing tail latency."
+
+
+def stream(registry, service_id, response_holder):
+    """
+    Return the coroutine streaming one response, with the service built for the running loop.
+    """
+    return sk.run_streaming_response(response_holder, registry.get_service(service_id), None, None, PROMPT)
+
+
+async def turn_per_run(registry, service_id):
+    """
+    One script run the old way: the service and its clients live and die with the run's loop.
+    """
+    try:
+        return await stream(registry, service_id, CountingResponseHolder())
+    finally:
+        await registry.close_loop_clients()
+
+
+async def turn_persistent(registry, service_id, worker):
+    """
+    One script run the new way: the call runs on the worker's long-lived loop.
+    """
+    return await worker.run(lambda response_holder: stream(registry, service_id, response_holder), CountingResponseHolder())
+
+
+def measure(run_turn, turns):
+    """
+    Run the turns one after the other and return (turn latencies, times to first token, errors).
+    """
+    latencies, ttfts, errors = [], [], 0
+    for _ in range(turns):
+        started = time.perf_counter()
+        result = asyncio.run(run_turn())
+        latencies.append(time.perf_counter() - started)
+        if result["status"] != "ok":
+            errors += 1
+        elif result["time_to_first_token"] is not None:
+            ttfts.append(result["time_to_first_token"])
+    return latencies, ttfts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-turn latency with an event loop per script run vs. a long-lived one.")
+    parser.add_argument("--turns", type=int, default=30, help="Turns per service and mode")
+    parser.add_argument("--url", help="Use a mock server already running at this base URL")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--ttft", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--response-tokens", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Silence Streamlit's warnings about running outside `streamlit run`
+    streamlit.logger.set_log_level("error")
+
+    process, base_url = (None, args.url.rstrip("/")) if args.url else start_mock_server(args)
+    try:
+        print(f"{args.turns} sequential turns per service and mode (mock server: ttft {args.ttft:g}s, "
+              f"{args.response_tokens} tokens at {args.tokens_per_second:g} tok/s)")
+        print(f"{'service':<13}{'mode':<12}{'turn p50 ms':>13}{'turn p95 ms':>13}{'mean ms':>9}{'ttft p50 ms':>13}{'new conns':>11}{'errors':>8}")
+        for service_id in ("mock-azure", "mock-ollama"):
+            worker = BackgroundWorker(name="bench-worker")
+            modes = (
+                ("per run", lambda registry: lambda: turn_per_run(registry, service_id)),
+                ("persistent", lambda registry: lambda: turn_persistent(registry, service_id, worker)),
+            )
+            for mode, make_turn in modes:
+                # A fresh registry per mode, so connection counts are its own
+                registry = create_registry(base_url)
+                latencies, ttfts, errors = measure(make_turn(registry), args.turns)
+                pool = registry.get_pool(service_id).stats()
+                worker.submit(registry.close_loop_clients()).result()
+                ttft = percentile(sorted(ttfts), 50)
+                print(f"{service_id:<13}{mode:<12}{percentile(sorted(latencies), 50) * 1000:>13.1f}{percentile(sorted(latencies), 95) * 1000:>13.1f}"
+                      f"{statistics.mean(latencies) * 1000:>9.1f}{ttft * 1000 if ttft is not None else float('nan'):>13.1f}"
+                      f"{pool['new_connections']:>11}{errors:>8}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#***********************************************************************************************
+# Benchmark: memory and per-turn cost of Semantic Kernel's ChatHistory vs. CompactHistory
+#
+# For conversations of 10, 100 and 1000 turns (a user message and an assistant reply each), it
+# measures:
+# - the memory the history holds (tracemalloc, content strings included);
+# - the time and memory to build the prompt history for a turn: ChatHistory(messages=...,
+#   system_message=...) as the app used to, against CompactHistory.view();
+# - the persisted size: the JSON of [role, content] pairs used before, against the binary form.
+#
+# Usage: python benchmarks/bench_history_memory.py [--turns 10 100 1000] [--repeats 20]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Third-party imports
+from semantic_kernel.contents.chat_history import ChatHistory
+
+# Make the repository root importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Local imports
+from helpers.helper_compact_history import CompactHistory
+
+SYSTEM_MESSAGE = "You are a helpful assistant. Answer concisely."
+
+
+def fill(history, turns):
+    """
+    Add the turns of a made-up conversation to the history.
+    """
+    for turn in range(turns):
+        history.add_user_message(f"Question {turn}: how does item {turn} compare with the previous one?")
+        history.add_assistant_message(f"Answer {turn}: here is a reply of typical length. " + "word " * 60)
+    return history
+
+
+def measure(build):
+    """
+    Return (result, bytes allocated and still held) for a call.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, held
+
+
+def prompt_cost(build_prompt, repeats):
+    """
+    Return (mean seconds, mean bytes held) to build the prompt history for one turn.
+    """
+    _, held = measure(build_prompt)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        build_prompt()
+    return (time.perf_counter() - started) / repeats, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatHistory vs. CompactHistory memory and per-turn cost.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=20, help="prompt builds timed per size")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6}{'ChatHistory KB':>16}{'Compact KB':>12}{'ratio':>7}"
+          f"{'prompt ms':>11}{'view ms':>9}{'prompt KB':>11}{'view KB':>9}"
+          f"{'JSON KB':>9}{'binary KB':>11}")
+
+    # Warm up, so one-time costs (pydantic validators, caches) are not counted in the first size
+    fill(ChatHistory(), 1)
+    fill(CompactHistory(), 1).view(SYSTEM_MESSAGE)
+
+    for turns in args.turns:
+        chat_history, chat_bytes = measure(lambda: fill(ChatHistory(), turns))
+        compact, compact_bytes = measure(lambda: fill(CompactHistory(), turns))
+
+        prompt_time, prompt_bytes = prompt_cost(lambda: ChatHistory(messages=chat_history.messages, system_message=SYSTEM_MESSAGE), args.repeats)
+        view_time, view_bytes = prompt_cost(lambda: compact.view(SYSTEM_MESSAGE), args.repeats)
+
+        json_size = len(json.dumps([[message.role.value, message.content] for message in chat_history.messages], ensure_ascii=False).encode("utf-8"))
+        binary_size = len(compact.dumps())
+
+        print(f"{turns:>6}{chat_bytes / 1024:>16.1f}{compact_bytes / 1024:>12.1f}{chat_bytes / compact_bytes:>7.1f}"
+              f"{prompt_time * 1000:>11.3f}{view_time * 1000:>9.3f}{prompt_bytes / 1024:>11.1f}{view_bytes / 1024:>9.1f}"
+              f"{json_size / 1024:>9.1f}{binary_size / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
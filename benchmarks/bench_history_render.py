@@ -0,0 +1,81 @@
+#***********************************************************************************************
+# Benchmark: Streamlit rerun time vs. chat history length
+#
+# Runs a script that displays one chat history with Streamlit's AppTest, rendering every
+# message ("full", the old behaviour) or through utils.display_message_history ("incremental").
+#
+# Usage: python benchmarks/bench_history_render.py [--lengths 10 100 1000] [--reruns 5]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import os
+import sys
+import time
+
+# Third-party imports
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+# Make the repository root importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def history_script(length, mode, repo_root):
+    """
+    The Streamlit script under test (run by AppTest, so it imports what it needs itself).
+    """
+    import sys
+    sys.path.insert(0, repo_root)
+
+    import streamlit as st
+    from semantic_kernel.contents.chat_history import ChatHistory
+    from helpers import helper_utils as utils
+
+    # Build the history once per session
+    if "history" not in st.session_state:
+        history = ChatHistory()
+        for turn in range(length // 2):
+            history.add_user_message(f"Question {turn}: what about **item {turn}**?")
+            history.add_assistant_message(f"Answer {turn}: here is a longer reply with a list\n\n- one\n- two\n- three\n\n" + "text " * 60)
+        st.session_state.history = history
+
+    if mode == "full":
+        for message in st.session_state.history.messages:
+            with st.chat_message(message.role):
+                st.markdown(message.content)
+    else:
+        utils.display_message_history(st.container(), st.session_state.history, key="bench")
+
+
+def time_reruns(length, mode, reruns):
+    """
+    Return the mean seconds per rerun, after a first (warm-up) run.
+    """
+    app = AppTest.from_function(history_script, args=(length, mode, REPO_ROOT), default_timeout=120)
+    app.run()
+    start = time.perf_counter()
+    for _ in range(reruns):
+        app.run()
+    return (time.perf_counter() - start) / reruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rerun time vs. chat history length.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    # Silence Streamlit's warnings about running outside `streamlit run`
+    streamlit.logger.set_log_level("error")
+
+    print(f"{'messages':>10}{'full ms':>12}{'incremental ms':>18}")
+    for length in args.lengths:
+        full = time_reruns(length, "full", args.reruns)
+        incremental = time_reruns(length, "incremental", args.reruns)
+        print(f"{length:>10}{full * 1000:>12.1f}{incremental * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#***********************************************************************************************
+# Micro-benchmark: bytes written and render time per streamed response
+#
+# Compares writing the whole growing output on every chunk (the old behaviour) with the
+# buffered StreamingRenderer used by generate_streaming_response.
+#
+# Usage: python benchmarks/bench_stream_render.py [--tokens 2000] [--chunk-delay 0.002]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Make the repository root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from helpers.helper_stream import StreamingRenderer
+
+
+class CountingPlaceholder:
+    """
+    Stand-in for an `st.empty()` placeholder that serializes what it is given, like Streamlit
+    does before sending the element over the websocket.
+    """
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes_written = 0
+
+    def write(self, text):
+        self.writes += 1
+        self.bytes_written += len(text.encode("utf-8"))
+
+
+async def token_stream(tokens, chunk_delay):
+    """
+    Yield `tokens` chunks of text, sleeping `chunk_delay` seconds between them.
+    """
+    for i in range(tokens):
+        if chunk_delay:
+            await asyncio.sleep(chunk_delay)
+        yield f"tok{i % 97} "
+
+
+async def run_naive(tokens, chunk_delay):
+    placeholder = CountingPlaceholder()
+    output = ""
+    render_time = 0.0
+    async for chunk in token_stream(tokens, chunk_delay):
+        output += chunk
+        start = time.perf_counter()
+        placeholder.write(output)
+        render_time += time.perf_counter() - start
+    return {"flushes": placeholder.writes, "bytes_written": placeholder.bytes_written, "render_time": render_time}
+
+
+async def run_buffered(tokens, chunk_delay, flush_interval, flush_tokens):
+    placeholder = CountingPlaceholder()
+    renderer = StreamingRenderer(placeholder, flush_interval=flush_interval, flush_tokens=flush_tokens)
+    async for chunk in token_stream(tokens, chunk_delay):
+        renderer.add(chunk)
+    renderer.close()
+    return renderer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed response rendering.")
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--flush-tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    naive = asyncio.run(run_naive(args.tokens, args.chunk_delay))
+    buffered = asyncio.run(run_buffered(args.tokens, args.chunk_delay, args.flush_interval, args.flush_tokens))
+
+    print(f"{'mode':<10}{'flushes':>10}{'bytes written':>16}{'render ms':>12}")
+    for name, result in (("naive", naive), ("buffered", buffered)):
+        print(f"{name:<10}{result['flushes']:>10}{result['bytes_written']:>16,}{result['render_time'] * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
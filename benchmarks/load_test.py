@@ -0,0 +1,250 @@
+#***********************************************************************************************
+# Load test: N concurrent Chat Compare sessions against the mock model server
+#
+# Each simulated session holds two chat histories, like the Chat Compare page, and for every
+# turn streams one response from each of its two services at the same time through
+# helper_sk.generate_streaming_response. The services point at benchmarks/mock_model_server.py
+# (started here unless --url is given), one Azure OpenAI and one Ollama service by default, so
+# no quota or local model is used. Reports throughput, time-to-first-token and latency
+# percentiles, errors and memory per session. With --scheduled, calls also go through the
+# admission controller (optionally with a quota on the Azure service) and failed calls are
+# retried, so injected errors show up as latency rather than as errors.
+#
+# Usage: python benchmarks/load_test.py [--sessions 50] [--turns 3] [--tokens-per-second 50] [--ttft 0.3]
+#            [--jitter 0.2] [--error-rate 0.0] [--response-tokens 200] [--scheduled]
+#            [--requests-per-minute 0] [--tokens-per-minute 0]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import asyncio
+import gc
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Make the repository root importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Third-party imports
+import streamlit.logger
+
+# Local imports
+from batch_eval import percentile
+from helpers import helper_sk as sk
+from helpers.helper_pool import ServiceRegistry
+from helpers.helper_history_store import history_size
+from helpers.helper_stream import StreamingRenderer
+
+
+# Prompts the simulated users send
+PROMPTS = (
+    "Explain the difference between a process and a thread.",
+    "Write a haiku about connection pools.",
+    "What are the trade-offs of streaming responses?",
+    "Summarize the previous answer in one sentence.",
+    "Give three tips for reducing tail latency.",
+)
+
+
+class CountingResponseHolder:
+    """
+    Response holder standing in for a Streamlit placeholder; counts what would be rendered.
+    """
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, text):
+        self.writes += 1
+        self.bytes += len(str(text))
+
+    def json(self, value):
+        self.writes += 1
+
+
+# Start the mock model server in its own process
+def start_mock_server(args):
+    """
+    Start benchmarks/mock_model_server.py on a free port and return (process, base_url).
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [
+        sys.executable, os.path.join(REPO_ROOT, "benchmarks", "mock_model_server.py"), "--port", str(port),
+        "--tokens-per-second", str(args.tokens_per_second), "--ttft", str(args.ttft), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--response-tokens", str(args.response_tokens), "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    # Wait until the server accepts connections
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    sys.exit("The mock model server did not start.")
+
+
+# Register the chat services used by the simulated sessions
+def create_registry(base_url):
+    """
+    Return a registry with one Azure OpenAI and one Ollama service, both served by the mock server.
+    """
+    registry = ServiceRegistry()
+    registry.register("mock-azure", base_url, lambda pool: sk._create_azure_chat_service(
+        pool, service_id="mock-azure", deployment_name="mock-gpt", endpoint=base_url, api_key="mock-key", api_version="2024-02-01"))
+    registry.register("mock-ollama", base_url, lambda pool: sk._create_ollama_chat_service(
+        pool, service_id="mock-ollama", ai_model_id="mock-llama", url=f"{base_url}/api/chat"))
+    return registry
+
+
+# Stream one response and return its measurements
+async def stream_response(chat_service, chat_history, prompt, scheduled, session_id=None):
+    """
+    Stream one response into a chat history, the way the Chat Compare page does.
+    """
+    holder = CountingResponseHolder()
+    started = time.perf_counter()
+    if scheduled:
+        # Through the concurrency scheduler and timeouts, like the Chat Compare page
+        result = await sk.run_streaming_response(holder, chat_service, None, chat_history, prompt, use_cache=False, session_id=session_id)
+        output, status, ttft = result["output"], result["status"], result["time_to_first_token"]
+    else:
+        renderer = StreamingRenderer(holder)
+        status = "ok"
+        try:
+            output = await sk.generate_streaming_response(holder, chat_service, None, chat_history, prompt, use_cache=False, renderer=renderer)
+        except Exception:
+            output, status = renderer.text, "error"
+        ttft = renderer.time_to_first_token
+    if output:
+        chat_history.add_assistant_message(output)
+    return {
+        "service_id": chat_service.service_id,
+        "status": status,
+        "time_to_first_token": ttft,
+        "latency": time.perf_counter() - started,
+        "chunks": holder.writes,
+        "characters": len(output or ""),
+    }
+
+
+# Run one simulated Chat Compare session
+async def run_session(session_index, registry, args, results, histories):
+    """
+    Run the turns of one session: each turn streams both services' responses concurrently.
+    """
+    rng = random.Random(args.seed + session_index)
+    services = [registry.get_service(service_id) for service_id in registry.service_ids()]
+    session_histories = [sk.new_chat_history() for _ in services]
+    histories.extend(session_histories)
+
+    # Stagger the session starts like users arriving
+    await asyncio.sleep(rng.random() * args.ramp_up)
+    for _ in range(args.turns):
+        prompt = rng.choice(PROMPTS)
+        turn = await asyncio.gather(*(stream_response(service, history, prompt, args.scheduled, f"session-{session_index}") for service, history in zip(services, session_histories)))
+        results.extend(turn)
+        await asyncio.sleep(rng.random() * args.think_time)
+
+
+# Run the load test
+async def run_load_test(args, base_url):
+    """
+    Run all sessions concurrently and return (results, histories, elapsed seconds, pool statistics).
+    """
+    registry = create_registry(base_url)
+    if args.requests_per_minute or args.tokens_per_minute:
+        sk.get_admission_controller().set_limits("mock-azure", args.requests_per_minute, args.tokens_per_minute)
+    results, histories = [], []
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_session(index, registry, args, results, histories) for index in range(args.sessions)))
+    finally:
+        await registry.close_loop_clients()
+    return results, histories, time.perf_counter() - started, registry.pool_stats()
+
+
+# Print the load test report
+def report(args, results, histories, elapsed, pool_stats, rss_growth, traced_peak):
+    """
+    Print throughput, latency percentiles, errors and memory per session.
+    """
+    print(f"{args.sessions} sessions x {args.turns} turns x 2 services in {elapsed:.1f}s "
+          f"({'scheduled' if args.scheduled else 'unscheduled'}, {args.tokens_per_second:g} tok/s, ttft {args.ttft:g}s, error rate {args.error_rate:g})")
+    print(f"{'service':<14}{'calls':>7}{'errors':>8}{'calls/s':>9}{'chars/s':>10}{'ttft p50':>10}{'ttft p95':>10}{'ttft p99':>10}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}")
+    for service_id in sorted({result["service_id"] for result in results}):
+        calls = [result for result in results if result["service_id"] == service_id]
+        ok = [result for result in calls if result["status"] == "ok"]
+        ttfts = sorted(result["time_to_first_token"] for result in ok if result["time_to_first_token"] is not None)
+        latencies = sorted(result["latency"] for result in ok)
+        print(
+            f"{service_id:<14}{len(calls):>7}{len(calls) - len(ok):>8}{len(calls) / elapsed:>9.2f}"
+            f"{sum(result['characters'] for result in ok) / elapsed:>10.0f}"
+            + "".join(f"{value:>10.3f}" if value is not None else f"{'-':>10}" for value in (percentile(ttfts, 50), percentile(ttfts, 95), percentile(ttfts, 99)))
+            + "".join(f"{value:>8.2f}" if value is not None else f"{'-':>8}" for value in (percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99)))
+        )
+    for stats in sk.get_admission_controller().stats():
+        print(f"admission {stats['deployment']}: max queue depth {stats['max_queue_depth']}, {stats['delayed']} of {stats['admitted']} calls delayed "
+              f"({stats['avg_delay_s']:.2f}s on average), {stats['rate_limited_responses']} rate-limited responses")
+    for stats in pool_stats:
+        print(f"pool {stats['endpoint']}: {stats['requests']} requests, {stats['new_connections']} new connections, reuse {stats['reuse_ratio']:.0%}")
+    history_bytes = sum(history_size(history) for history in histories)
+    print(f"memory per session: {rss_growth / args.sessions / 1024:.0f} KiB RSS growth, "
+          f"{history_bytes / args.sessions / 1024:.1f} KiB chat history"
+          + (f", {traced_peak / args.sessions / 1024:.0f} KiB traced peak" if traced_peak is not None else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test concurrent Chat Compare sessions against the mock model server.")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent Chat Compare sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Prompts sent per session")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="Seconds over which the sessions start")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Maximum seconds between turns")
+    parser.add_argument("--scheduled", action="store_true", help="Go through the concurrency scheduler and timeouts (run_streaming_response)")
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Quota of the Azure service with --scheduled (0 = none)")
+    parser.add_argument("--tokens-per-minute", type=int, default=0, help="Token quota of the Azure service with --scheduled (0 = none)")
+    parser.add_argument("--trace-memory", action="store_true", help="Also measure the traced Python heap peak (slower)")
+    parser.add_argument("--url", help="Use a mock server already running at this base URL")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Silence Streamlit's warnings about running outside `streamlit run`
+    streamlit.logger.set_log_level("error")
+
+    process, base_url = (None, args.url.rstrip("/")) if args.url else start_mock_server(args)
+    try:
+        gc.collect()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        if args.trace_memory:
+            tracemalloc.start()
+        results, histories, elapsed, pool_stats = asyncio.run(run_load_test(args, base_url))
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - rss_before
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report(args, results, histories, elapsed, pool_stats, rss_growth, traced_peak)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#***********************************************************************************************
+# Mock chat model server for load tests
+#
+# Speaks the Azure OpenAI chat completions protocol
+# (POST /openai/deployments/<deployment>/chat/completions, streamed as server-sent events) and
+# the Ollama chat protocol (POST /api/chat, streamed as JSON lines), so the app's services can
+# be pointed at it instead of Azure or a local model. Replies are generated text streamed at a
+# configurable rate, after a configurable time to first token, with jitter and injected errors.
+# Ollama models are loaded on first use (--load-time) and evicted beyond --max-loaded-models, and
+# /api/ps and /api/generate (model loads and keep-alive) are served like Ollama's. A non-streamed
+# Azure request offering tools gets a call of every tool, then a reply once the results are sent.
+#
+# Usage: python benchmarks/mock_model_server.py [--port 18080] [--tokens-per-second 50] [--ttft 0.3]
+#            [--jitter 0.2] [--error-rate 0.0] [--response-tokens 200] [--load-time 0] [--max-loaded-models 0]
+#***********************************************************************************************
+
+# Standard imports
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+# Third-party imports
+from aiohttp import web
+
+
+# Words the generated replies are made of
+VOCABULARY = ("the", "model", "answer", "stream", "token", "kernel", "service", "latency", "chat", "request", "reply", "is", "a", "of", "and", "to")
+
+
+class MockSettings:
+    """
+    Behaviour of the mock server.
+
+    Args:
+        tokens_per_second (float): Mean rate at which reply tokens are streamed.
+        ttft (float): Mean seconds before the first token.
+        jitter (float): Relative random variation (0.2 = +/-20%) of the first token time and of each token gap.
+        error_rate (float): Fraction of requests answered with an error (half 429 with Retry-After, half 500).
+        response_tokens (int): Tokens per reply (capped by the request's max_tokens).
+        retry_after (float): Retry-After seconds sent with 429 errors.
+        seed (int): Optional random seed, for reproducible runs.
+        load_time (float): Seconds an Ollama model takes to load when it is not resident.
+        max_loaded_models (int): Ollama models resident at once (0 = no limit); the least
+            recently used one is evicted.
+    """
+
+    def __init__(self, tokens_per_second=50.0, ttft=0.3, jitter=0.2, error_rate=0.0, response_tokens=200, retry_after=1.0, seed=None, load_time=0.0, max_loaded_models=0):
+        self.tokens_per_second = tokens_per_second
+        self.ttft = ttft
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.response_tokens = response_tokens
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.load_time = load_time
+        self.max_loaded_models = max_loaded_models
+
+        # Resident Ollama models, least recently used first: name -> expiry time
+        self.loaded = {}
+        self.load_lock = asyncio.Lock()
+
+    async def load_model(self, model, keep_alive=300.0):
+        """
+        Make the model resident, waiting load_time if it was not, and return the seconds spent loading.
+        """
+        model = model if ":" in model else f"{model}:latest"
+        async with self.load_lock:
+            now = time.time()
+            for name in [name for name, expires in self.loaded.items() if expires < now]:
+                del self.loaded[name]
+            waited = 0.0
+            if model not in self.loaded:
+                if self.max_loaded_models:
+                    while len(self.loaded) >= self.max_loaded_models:
+                        del self.loaded[next(iter(self.loaded))]
+                await asyncio.sleep(self.load_time)
+                waited = self.load_time
+            self.loaded.pop(model, None)
+            self.loaded[model] = time.time() + keep_alive
+            return waited
+
+    def vary(self, seconds):
+        """
+        Return the seconds with the configured jitter applied.
+        """
+        return max(0.0, seconds * (1 + self.jitter * (2 * self.random.random() - 1)))
+
+    def reply_tokens(self, max_tokens):
+        """
+        Return the list of tokens of one reply.
+        """
+        count = min(self.response_tokens, max_tokens or self.response_tokens)
+        return [self.random.choice(VOCABULARY) + " " for _ in range(count)]
+
+    def error_response(self):
+        """
+        Return an error response for a request picked to fail, or None.
+        """
+        if self.random.random() >= self.error_rate:
+            return None
+        if self.random.random() < 0.5:
+            return web.json_response({"error": {"code": "429", "message": "Rate limit exceeded (mock)."}}, status=429, headers={"Retry-After": str(self.retry_after)})
+        return web.json_response({"error": {"code": "500", "message": "Internal server error (mock)."}}, status=500)
+
+    async def stream_tokens(self, tokens):
+        """
+        Yield the tokens at the configured time to first token and rate.
+        """
+        await asyncio.sleep(self.vary(self.ttft))
+        gap = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.vary(gap))
+            yield token
+
+
+# Count the tokens a handler streams, and the streams the client abandons
+async def count_streamed(request, tokens):
+    counters = request.app["counters"]
+    try:
+        async for token in tokens:
+            if request.transport is None or request.transport.is_closing():
+                raise ConnectionResetError("client disconnected")
+            counters["tokens_streamed"] += 1
+            yield token
+    except (ConnectionResetError, asyncio.CancelledError):
+        counters["aborted_streams"] += 1
+        raise
+
+
+# Arguments the mock model passes for each JSON schema type
+MOCK_ARGUMENTS = {"string": "2024-01-01", "integer": 360, "number": 1.5, "boolean": True, "array": [], "object": {}}
+
+
+# Return a tool call of an offered tool
+def mock_tool_call(tool):
+    """
+    Return an OpenAI tool call of the tool, with a placeholder value for each required parameter.
+    """
+    function = tool["function"]
+    parameters = function.get("parameters") or {}
+    arguments = {name: MOCK_ARGUMENTS.get(parameters.get("properties", {}).get(name, {}).get("type"), "")
+                 for name in parameters.get("required", [])}
+    return {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": function["name"], "arguments": json.dumps(arguments)}}
+
+
+# Handle an Azure OpenAI chat completions request
+async def azure_chat_completions(request):
+    settings = request.app["settings"]
+    body = await request.json()
+    request.app["counters"]["requests"] += 1
+    error = settings.error_response()
+    if error is not None:
+        return error
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = request.match_info["deployment"]
+    created = int(time.time())
+    tokens = settings.reply_tokens(body.get("max_tokens"))
+    prompt_tokens = sum(len(str(message.get("content") or "")) // 4 for message in body.get("messages", []))
+
+    if not body.get("stream"):
+        await asyncio.sleep(settings.vary(settings.ttft) + len(tokens) / max(settings.tokens_per_second, 1e-9))
+
+        # Offered tools are all called once, then the reply follows the tool results
+        messages = body.get("messages") or [{}]
+        if body.get("tools") and messages[-1].get("role") != "tool":
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [mock_tool_call(tool) for tool in body["tools"]]}, "finish_reason": "tool_calls"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 0, "total_tokens": prompt_tokens},
+            })
+
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    def event(delta, finish_reason=None):
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    first = True
+    async for token in count_streamed(request, settings.stream_tokens(tokens)):
+        await response.write(event({"role": "assistant", "content": token} if first else {"content": token}))
+        first = False
+    await response.write(event({}, "stop"))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+# Handle an Ollama chat request
+async def ollama_chat(request):
+    settings = request.app["settings"]
+    body = await request.json()
+    request.app["counters"]["requests"] += 1
+    error = settings.error_response()
+    if error is not None:
+        return error
+
+    started = time.perf_counter()
+    model = body.get("model", "mock")
+    tokens = settings.reply_tokens((body.get("options") or {}).get("num_predict"))
+    load_seconds = await settings.load_model(model, parse_keep_alive(body.get("keep_alive")))
+
+    def message(content, done):
+        record = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "message": {"role": "assistant", "content": content}, "done": done}
+        if done:
+            record.update({"done_reason": "stop", "total_duration": int((time.perf_counter() - started) * 1e9), "load_duration": int(load_seconds * 1e9), "eval_count": len(tokens)})
+        return record
+
+    if not body.get("stream", True):
+        await asyncio.sleep(settings.vary(settings.ttft) + len(tokens) / max(settings.tokens_per_second, 1e-9))
+        return web.json_response(message("".join(tokens), True))
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    async for token in count_streamed(request, settings.stream_tokens(tokens)):
+        await response.write((json.dumps(message(token, False)) + "\n").encode())
+    await response.write((json.dumps(message("", True)) + "\n").encode())
+    await response.write_eof()
+    return response
+
+
+# Parse an Ollama keep_alive value ("5m", "1h", "30s" or seconds) into seconds
+def parse_keep_alive(value, default=300.0):
+    if value is None:
+        return default
+    text = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+# Handle an Ollama generate request: only the model load (empty prompt) and keep-alive are mocked
+async def ollama_generate(request):
+    settings = request.app["settings"]
+    body = await request.json()
+    model = body.get("model", "mock")
+    started = time.perf_counter()
+    load_seconds = await settings.load_model(model, parse_keep_alive(body.get("keep_alive")))
+    return web.json_response({"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "response": "", "done": True,
+                              "total_duration": int((time.perf_counter() - started) * 1e9), "load_duration": int(load_seconds * 1e9)})
+
+
+# List the resident Ollama models
+async def ollama_ps(request):
+    settings = request.app["settings"]
+    now = time.time()
+    return web.json_response({"models": [
+        {"name": name, "model": name, "size": 4 * 1024 ** 3, "size_vram": 4 * 1024 ** 3,
+         "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires))}
+        for name, expires in settings.loaded.items() if expires >= now
+    ]})
+
+
+# Report the server statistics
+async def stats(request):
+    return web.json_response(request.app["counters"])
+
+
+# Build the mock server application
+def create_app(settings):
+    """
+    Return the aiohttp application of the mock server.
+
+    Args:
+        settings (MockSettings): The server behaviour.
+    """
+    app = web.Application()
+    app["settings"] = settings
+    app["counters"] = {"requests": 0, "tokens_streamed": 0, "aborted_streams": 0}
+    app.router.add_post("/openai/deployments/{deployment}/chat/completions", azure_chat_completions)
+    app.router.add_post("/api/chat", ollama_chat)
+    app.router.add_post("/api/generate", ollama_generate)
+    app.router.add_get("/api/ps", ollama_ps)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Azure OpenAI and Ollama chat server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Mean seconds to the first token")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative variation of the timings")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (429 or 500)")
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--load-time", type=float, default=0.0, help="Seconds to load an Ollama model that is not resident")
+    parser.add_argument("--max-loaded-models", type=int, default=0, help="Ollama models resident at once (0 = no limit)")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.tokens_per_second, args.ttft, args.jitter, args.error_rate, args.response_tokens, args.retry_after, args.seed, args.load_time, args.max_loaded_models)
+    print(f"Mock model server on http://{args.host}:{args.port} (Azure OpenAI: /openai/deployments/<name>/chat/completions, Ollama: /api/chat)", flush=True)
+    web.run_app(create_app(settings), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# Helper for client-side rate limiting: admitting model calls within each deployment's quota
+
+# Imports
+
+# Standard imports
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+# Find the HTTP status code and Retry-After of a failed call
+def error_status(error):
+    """
+    Return (status_code, retry_after_seconds) for an error raised by a chat service call.
+
+    Semantic Kernel wraps the client errors, so the exception chain is searched for an OpenAI
+    APIStatusError (status_code) or an aiohttp ClientResponseError (status).
+    """
+    while error is not None:
+        status = getattr(error, "status_code", None) or getattr(error, "status", None)
+        if isinstance(status, int):
+            headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+            retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            return status, retry_after
+        error = error.__cause__ or error.__context__
+    return None, None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per-minute rate.
+
+    Args:
+        per_minute (float): Tokens added per minute.
+        burst_seconds (float): Seconds of refill the bucket holds, i.e. the largest burst.
+    """
+
+    def __init__(self, per_minute, burst_seconds=60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Return the seconds until the bucket holds the amount (after refill).
+        """
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class _Waiter:
+    """
+    A call waiting for admission, woken on its own event loop.
+    """
+
+    __slots__ = ("session", "tokens", "loop", "wake")
+
+    def __init__(self, session, tokens):
+        self.session = session
+        self.tokens = tokens
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+
+
+class _Deployment:
+    """
+    Buckets, queue and counters of one deployment. Guarded by the controller's lock.
+    """
+
+    def __init__(self, key, requests_per_minute, tokens_per_minute, burst_seconds):
+        self.key = key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self.blocked_until = 0.0
+
+        # Waiting calls per session, sessions in round-robin order
+        self.sessions = OrderedDict()
+
+        # Counters
+        self.admitted = 0
+        self.delayed = 0
+        self.throttle_time = 0.0
+        self.max_queue_depth = 0
+        self.rate_limited = 0
+
+    def refill(self, now):
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.refill(now)
+
+    def queue_depth(self):
+        return sum(len(waiters) for waiters in self.sessions.values())
+
+    def fair_order(self):
+        # One call per session per round, so a session with many calls can't starve the others
+        queues = list(self.sessions.values())
+        return [queue[index] for index in range(max(map(len, queues), default=0)) for queue in queues if index < len(queue)]
+
+    def clamp(self, tokens):
+        # A call larger than the bucket waits for a full bucket rather than forever
+        return min(tokens, self.tokens.capacity) if self.tokens is not None else tokens
+
+    def wait_time(self, waiters, now):
+        # Seconds until the buckets hold enough for all the waiters, and any Retry-After pause is over
+        wait = max(0.0, self.blocked_until - now)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(len(waiters)))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(sum(self.clamp(waiter.tokens) for waiter in waiters)))
+        return wait
+
+    def take(self, tokens):
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= self.clamp(tokens)
+        self.admitted += 1
+
+
+class AdmissionController:
+    """
+    Admits model calls within each deployment's requests-per-minute and tokens-per-minute quota.
+
+    Each deployment has a token bucket for requests and one for tokens (a call's estimated prompt
+    tokens plus its max_tokens), refilled continuously. A call that doesn't fit waits in a queue
+    that is fair across sessions: sessions take turns, one call each. When a deployment answers
+    429, throttle() pauses every call to it for the Retry-After time, so sessions back off
+    together instead of retrying on their own.
+
+    The controller is shared by every session in the process. Streamlit sessions run their own
+    event loops on their own threads, so the state is guarded by a thread lock and waiters are
+    woken on their own loop.
+
+    Args:
+        limits (dict): (requests_per_minute, tokens_per_minute) per deployment key; 0 or None
+            means no limit. Unknown keys are unlimited but still honor throttle().
+        burst_seconds (float): Seconds of quota a bucket holds. Azure OpenAI enforces quotas
+            over short windows, so letting a minute's quota through at once draws 429s.
+        poll_interval (float): Maximum seconds between updates of a waiter's position and ETA.
+    """
+
+    def __init__(self, limits=None, burst_seconds=10.0, poll_interval=1.0):
+        self.limits = dict(limits or {})
+        self.burst_seconds = burst_seconds
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._deployments = {}
+
+    def _get_deployment(self, key):
+        # Must hold the lock
+        deployment = self._deployments.get(key)
+        if deployment is None:
+            requests_per_minute, tokens_per_minute = self.limits.get(key) or (None, None)
+            deployment = self._deployments[key] = _Deployment(key, requests_per_minute, tokens_per_minute, self.burst_seconds)
+        return deployment
+
+    def set_limits(self, key, requests_per_minute, tokens_per_minute):
+        """
+        Set or replace a deployment's quota (0 or None means no limit).
+        """
+        with self._lock:
+            self.limits[key] = (requests_per_minute, tokens_per_minute)
+            deployment = self._get_deployment(key)
+            deployment.requests_per_minute, deployment.tokens_per_minute = requests_per_minute, tokens_per_minute
+            deployment.requests = TokenBucket(requests_per_minute, self.burst_seconds) if requests_per_minute else None
+            deployment.tokens = TokenBucket(tokens_per_minute, self.burst_seconds) if tokens_per_minute else None
+            self._wake_all(deployment)
+
+    def _wake_all(self, deployment):
+        # Must hold the lock
+        for waiters in deployment.sessions.values():
+            for waiter in waiters:
+                try:
+                    waiter.loop.call_soon_threadsafe(waiter.wake.set)
+                except RuntimeError:
+                    # The waiter's event loop has closed
+                    pass
+
+    def _remove(self, deployment, waiter):
+        # Must hold the lock; the waiter's session moves to the back of the round-robin order
+        waiters = deployment.sessions.get(waiter.session)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            del deployment.sessions[waiter.session]
+            if waiters:
+                deployment.sessions[waiter.session] = waiters
+        self._wake_all(deployment)
+
+    async def admit(self, key, tokens, session=None, on_wait=None):
+        """
+        Wait until the deployment's quota allows the call, and take its share.
+
+        Args:
+            key (str): The deployment key.
+            tokens (int): Estimated tokens of the call (prompt plus max_tokens).
+            session (str): The calling session, for fairness between sessions.
+            on_wait (callable): Called with (queue position, ETA in seconds) while the call waits.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._lock:
+            deployment = self._get_deployment(key)
+            deployment.refill(started)
+            if not deployment.sessions and deployment.wait_time([_Waiter(session, tokens)], started) == 0:
+                deployment.take(tokens)
+                return 0.0
+            waiter = _Waiter(session, tokens)
+            deployment.sessions.setdefault(session, deque()).append(waiter)
+            deployment.delayed += 1
+            deployment.max_queue_depth = max(deployment.max_queue_depth, deployment.queue_depth())
+
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    deployment.refill(now)
+                    order = deployment.fair_order()
+                    position = order.index(waiter) + 1
+                    eta = deployment.wait_time(order[:position], now)
+                    if position == 1 and eta == 0:
+                        self._remove(deployment, waiter)
+                        deployment.take(tokens)
+                        waited = now - started
+                        deployment.throttle_time += waited
+                        return waited
+                    waiter.wake.clear()
+
+                if on_wait is not None:
+                    on_wait(position, eta)
+                try:
+                    await asyncio.wait_for(waiter.wake.wait(), timeout=min(max(eta, 0.01), self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                self._remove(deployment, waiter)
+            raise
+
+    def throttle(self, key, retry_after):
+        """
+        Pause every call to the deployment for retry_after seconds, after it answered 429.
+        """
+        with self._lock:
+            deployment = self._get_deployment(key)
+            deployment.blocked_until = max(deployment.blocked_until, time.monotonic() + retry_after)
+            deployment.rate_limited += 1
+            self._wake_all(deployment)
+
+    def stats(self):
+        """
+        Return one dict per deployment with its quota, queue depth, throttling time and 429 count.
+        """
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "deployment": deployment.key,
+                    "requests_per_minute": deployment.requests_per_minute,
+                    "tokens_per_minute": deployment.tokens_per_minute,
+                    "queue_depth": deployment.queue_depth(),
+                    "max_queue_depth": deployment.max_queue_depth,
+                    "admitted": deployment.admitted,
+                    "delayed": deployment.delayed,
+                    "throttle_time_s": deployment.throttle_time,
+                    "avg_delay_s": deployment.throttle_time / deployment.delayed if deployment.delayed else 0.0,
+                    "rate_limited_responses": deployment.rate_limited,
+                    "paused_for_s": max(0.0, deployment.blocked_until - now),
+                }
+                for deployment in self._deployments.values()
+            ]
@@ -0,0 +1,239 @@
+# Helper for serving local images and CSS: decoded once, downscaled, cached by file version
+
+# Imports
+
+# Standard imports
+import io
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+# Widths images are downscaled to: a requested width is rounded up to the next one, so nearby
+# widths share a variant
+IMAGE_WIDTHS = (480, 960, 1440, 1920, 2560)
+
+
+# Return the version of a file
+def file_version(path):
+    """
+    Return a key identifying the current contents of a file: its absolute path, modification time
+    and size. A cached entry keyed by it is replaced as soon as the file changes.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+# Return the width bucket of a display width
+def width_bucket(width=None):
+    """
+    Return the IMAGE_WIDTHS bucket a display width is rounded up to (the width itself beyond the
+    largest bucket, None for full width).
+    """
+    if width is None:
+        return None
+    return next((bucket for bucket in IMAGE_WIDTHS if bucket >= width), width)
+
+
+# Return the width an image is scaled to for display
+def variant_width(image_width, width=None):
+    """
+    Return the width of the variant to serve for an image `image_width` pixels wide displayed at
+    `width` pixels (None for its full width). Images are never scaled up.
+    """
+    if width is None:
+        return image_width
+    return min(image_width, width_bucket(width))
+
+
+# Decode an image and encode its display variant
+def encode_variant(path, width=None, quality=85):
+    """
+    Decode an image file and return it scaled to `width` and re-encoded: as JPEG at `quality`
+    when it has no transparency, otherwise as optimized PNG.
+
+    Args:
+        path (str): The image file.
+        width (int): The display width in pixels, or None to keep the original size.
+        quality (int): The JPEG quality.
+
+    Returns:
+        tuple: The encoded bytes and the (width, height) of the variant.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+        PIL.UnidentifiedImageError: If the file is not an image.
+    """
+    # PIL is only imported when an image is shown
+    from PIL import Image
+
+    with Image.open(path) as image:
+        target = variant_width(image.width, width)
+        target_size = (target, max(1, round(image.height * target / image.width)))
+
+        # Let JPEG decode at a reduced scale when the variant is much smaller than the original
+        image.draft("RGB", target_size)
+        image.load()
+
+        if image.size != target_size:
+            image = image.resize(target_size, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        if image.mode in ("RGBA", "LA", "P") and ("A" in image.mode or "transparency" in image.info):
+            image.save(buffer, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue(), image.size
+
+
+class AssetCache:
+    """
+    Cache of display-ready image variants and CSS bundles, shared by every session.
+
+    Images are decoded once per file version and display width, and kept as compressed bytes in
+    an LRU bounded by their total size. Entries are keyed by the file's path, modification time
+    and size, so editing a file replaces its entries on the next lookup. Concurrent lookups of the
+    same variant (a page and a preload) decode it once.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached images.
+        max_workers (int): Threads used to preload images.
+        quality (int): JPEG quality of the variants.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_workers=4, quality=85):
+        self.max_bytes = max_bytes
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+        self._css = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asset-preload")
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def image(self, path, width=None):
+        """
+        Return the image file as encoded bytes scaled to `width` pixels (None for full size).
+        Widths in the same bucket (see width_bucket) share one cached variant.
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist.
+            PIL.UnidentifiedImageError: If the file is not an image.
+        """
+        width = width_bucket(width)
+        key = (*file_version(path), width)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+            # Wait for a decode of the same variant already running, or run it here
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            data, _ = encode_variant(path, width, self.quality)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            self._remember(key, data)
+        future.set_result(data)
+        return data
+
+    def _remember(self, key, data):
+        # Drop older versions of the same file and width, then the least recently used entries over the limit
+        for stale in [other for other in self._images if other[0] == key[0] and other[3] == key[3]]:
+            self._bytes -= len(self._images.pop(stale))
+        if len(data) > self.max_bytes:
+            return
+        self._images[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def preload(self, paths, width=None):
+        """
+        Decode and cache images in the background, e.g. the slides of a deck before they are shown.
+        Returns at once; failures are logged and surface again when the image is displayed.
+
+        Returns:
+            list: A Future per path.
+        """
+        return [self._executor.submit(self._preload, path, width) for path in paths]
+
+    def _preload(self, path, width):
+        try:
+            self.image(path, width)
+        except Exception as e:
+            logging.warning(f"Could not preload image '{path}': {e}")
+
+    def css(self, paths):
+        """
+        Return the CSS files merged into one <style> block. The bundle is rebuilt when any of the
+        files changes.
+
+        Raises:
+            FileNotFoundError: If a file doesn't exist.
+        """
+        key = tuple(file_version(path) for path in paths)
+        with self._lock:
+            bundle = self._css.get(key)
+        if bundle is not None:
+            return bundle
+
+        parts = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as file:
+                parts.append(f"/* {os.path.basename(path)} */\n{file.read()}")
+        bundle = "<style>\n" + "\n".join(parts) + "\n</style>"
+
+        # Only the current version of a bundle is kept
+        names = tuple(version[0] for version in key)
+        with self._lock:
+            for stale in [other for other in self._css if tuple(version[0] for version in other) == names]:
+                del self._css[stale]
+            self._css[key] = bundle
+        logging.info(f"CSS bundle built from {len(paths)} files")
+        return bundle
+
+    def stats(self):
+        """
+        Return the cache counters as a dict.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "css_bundles": len(self._css),
+            }
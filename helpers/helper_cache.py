@@ -0,0 +1,165 @@
+# Helper for caching chat completions of identical requests
+
+# Imports
+
+# Standard imports
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Return a stable key for a chat request
+def request_key(service_id, messages, settings):
+    """
+    Return a stable hash of the normalized request.
+
+    Args:
+        service_id (str): The chat service ID.
+        messages (list): The prompt messages (including the system message) as objects with role and content.
+        settings (dict): The request settings that affect the completion (max_tokens, temperature, ...).
+
+    Returns:
+        str: The hex digest identifying the request.
+    """
+    normalized = {
+        "service_id": service_id,
+        "messages": [[str(message.role), str(message.content or "").strip()] for message in messages],
+        "settings": {name: value for name, value in sorted(settings.items()) if value is not None},
+    }
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Replay a cached response as a stream
+async def replay_stream(text):
+    """
+    Yield a cached response in word-sized chunks, so it renders through the same streaming path
+    as a live response.
+
+    Args:
+        text (str): The cached response.
+
+    Yields:
+        str: The next chunk of the response.
+    """
+    for chunk in re.findall(r"\s*\S+|\s+", text):
+        yield chunk
+        await asyncio.sleep(0)
+
+
+class CompletionCache:
+    """
+    Two-tier cache of chat completions: an in-memory LRU in front of an SQLite file.
+
+    Entries expire after `ttl` seconds. Each tier is bounded by its number of entries; the least
+    recently used entries are evicted first. The cache is thread-safe and meant to be shared by
+    every session in the process.
+
+    Args:
+        path (str): Path of the SQLite file, or None for a memory-only cache.
+        max_memory_entries (int): Maximum entries in the in-memory tier.
+        max_disk_entries (int): Maximum entries in the SQLite tier.
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, path=None, max_memory_entries=256, max_disk_entries=10000, ttl=24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self._db.commit()
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return the cached completion for the key, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            # In-memory tier
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            # On-disk tier
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created < self.ttl:
+                        self._db.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, value, created)
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Store a completion for the key in both tiers.
+        """
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO completions (key, value, created, accessed) VALUES (?, ?, ?, ?)", (key, value, now, now))
+
+                # Evict expired entries, then the least recently used ones over the size limit
+                self._db.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM completions WHERE key IN (SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """
+        Return the cache counters as a dict.
+        """
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] if self._db is not None else 0
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
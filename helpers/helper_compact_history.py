@@ -0,0 +1,275 @@
+# Helper for a compact, append-only chat history: small message records, shared prefixes and a binary form
+
+# Imports
+
+# Standard imports
+import zlib
+import struct
+from types import MappingProxyType
+from collections.abc import Sequence
+
+
+# Roles a message can have, interned: every record points at one of these strings, and the binary form stores the index
+ROLES = ("system", "user", "assistant", "tool")
+_ROLE_IDS = {role: index for index, role in enumerate(ROLES)}
+
+# Binary form: magic, version, flags, then (role id, content length, UTF-8 content) per message
+BINARY_MAGIC = b"CHB"
+BINARY_VERSION = 1
+FLAG_COMPRESSED = 1
+_HEADER = struct.Struct("<3sBB")
+_RECORD = struct.Struct("<BI")
+
+# Histories whose binary form is at least this many bytes are compressed
+COMPRESS_MIN_BYTES = 1024
+
+
+# Return the interned role string
+def intern_role(role):
+    """
+    Return the interned string of a role, given as a string or a Semantic Kernel ChatRole.
+
+    Raises:
+        ValueError: If the role is not one of ROLES.
+    """
+    role = getattr(role, "value", role)
+    try:
+        return ROLES[_ROLE_IDS[role]]
+    except KeyError:
+        raise ValueError(f"Unknown chat role: {role!r}") from None
+
+
+class CompactMessage:
+    """
+    One chat message: an interned role, the content string and its token count, filled in on
+    first use by helper_history.message_tokens.
+
+    It has the attributes the app reads (role, content) and the ones the Semantic Kernel chat
+    connectors read when building a request (to_dict, and model_dump and metadata on older
+    releases), so the connectors take it in place of a ChatMessageContent.
+    """
+
+    __slots__ = ("role", "content", "tokens")
+
+    # Shared, read-only; the connectors only look at it for tool messages
+    metadata = MappingProxyType({})
+
+    def __init__(self, role, content):
+        self.role = intern_role(role)
+        self.content = content
+        self.tokens = None
+
+    def model_dump(self, include=None, **kwargs):
+        fields = {"role": self.role, "content": self.content}
+        return {name: value for name, value in fields.items() if include is None or name in include}
+
+    def to_dict(self, role_key="role", content_key="content"):
+        return {role_key: self.role, content_key: self.content}
+
+    def __repr__(self):
+        return f"CompactMessage(role={self.role!r}, content={self.content!r})"
+
+
+class HistoryView(Sequence):
+    """
+    Read-only view of messages [start, stop) of a CompactHistory, optionally preceded by head
+    messages (e.g. the system message), without copying them.
+
+    A history only grows, so the messages a view covers never change: a view is an immutable
+    snapshot, safe to read while another thread adds messages to the history.
+    """
+
+    __slots__ = ("_history", "_start", "_stop", "_head")
+
+    def __init__(self, history, start, stop, head=()):
+        self._history = history
+        self._start = start
+        self._stop = stop
+        self._head = tuple(head)
+
+    def __len__(self):
+        return len(self._head) + self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and not self._head:
+                return HistoryView(self._history, self._start + start, self._start + max(start, stop))
+            return [self[position] for position in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history view index out of range")
+        if index < len(self._head):
+            return self._head[index]
+        return self._history._get(self._start + index - len(self._head))
+
+    def __iter__(self):
+        yield from self._head
+        yield from self._history._iter(self._start, self._stop)
+
+    def __repr__(self):
+        return f"HistoryView({len(self)} messages)"
+
+
+class CompactHistory:
+    """
+    Append-only chat history built for memory and per-turn cost.
+
+    - Messages are CompactMessage records (__slots__, interned roles) rather than pydantic
+      ChatMessageContent objects.
+    - Messages are only ever added, so any prefix of the history is immutable: fork() starts a
+      new history on a shared prefix of this one (no copy), and messages returns a HistoryView
+      snapshot rather than a list.
+    - view() gives the Semantic Kernel ChatHistory the chat connectors need (system message,
+      optional summary, a window of the messages) over the same records, without copying them
+      into new message objects on every turn.
+    - dumps()/loads() give a compact binary form for persistence.
+    - metadata is a small JSON-serializable dict kept with the history (e.g. the rolling summary
+      of helper_history), which the history store saves next to the messages.
+
+    It has the ChatHistory methods the app uses (messages, add_user_message,
+    add_assistant_message, add_system_message, add_message, len and truth value).
+
+    Args:
+        prefix (HistoryView): Optional immutable messages the history starts with (see fork).
+    """
+
+    __slots__ = ("_prefix", "_records", "metadata", "__weakref__")
+
+    def __init__(self, prefix=None):
+        self._prefix = prefix if prefix else None
+        self._records = []
+        self.metadata = {}
+
+    @classmethod
+    def from_messages(cls, messages):
+        """
+        Build a compact history from messages with role and content (e.g. ChatHistory.messages).
+        """
+        history = cls()
+        history._records.extend(CompactMessage(message.role, message.content) for message in messages)
+        return history
+
+    def __len__(self):
+        return (len(self._prefix) if self._prefix else 0) + len(self._records)
+
+    def _get(self, index):
+        shared = len(self._prefix) if self._prefix else 0
+        return self._prefix[index] if index < shared else self._records[index - shared]
+
+    def _iter(self, start, stop):
+        shared = len(self._prefix) if self._prefix else 0
+        if start < shared:
+            yield from self._prefix[start:min(stop, shared)]
+        yield from self._records[max(start - shared, 0):stop - shared]
+
+    @property
+    def messages(self):
+        """
+        The messages so far, as an immutable HistoryView.
+        """
+        return HistoryView(self, 0, len(self))
+
+    def add_message(self, role, content):
+        self._records.append(CompactMessage(role, content))
+
+    def add_system_message(self, content):
+        self.add_message("system", content)
+
+    def add_user_message(self, content):
+        self.add_message("user", content)
+
+    def add_assistant_message(self, content):
+        self.add_message("assistant", content)
+
+    def fork(self):
+        """
+        Return a new history that starts with this history's messages, shared rather than copied.
+        Messages added to either history afterwards are not seen by the other. The metadata is copied.
+        """
+        history = CompactHistory(prefix=self.messages)
+        history.metadata = dict(self.metadata)
+        return history
+
+    def view(self, system_message=None, start=0, summary=None):
+        """
+        Return the Semantic Kernel ChatHistory sent to the model: the system message, an
+        optional summary system message, then the messages from start on. The messages are
+        the history's own records, seen through a HistoryView.
+
+        Args:
+            system_message (str): Optional system message placed first.
+            start (int): Index of the first message of the history to include.
+            summary (str): Optional summary of the earlier messages, sent as a system message.
+
+        Returns:
+            ChatHistory: A chat history for the chat connectors; read-only.
+        """
+        # Imported here to keep Semantic Kernel out of the app's import time
+        from semantic_kernel.contents.chat_history import ChatHistory
+
+        head = []
+        if system_message:
+            head.append(CompactMessage("system", system_message))
+        if summary:
+            head.append(CompactMessage("system", f"Summary of the earlier conversation:\n{summary}"))
+
+        # model_construct skips validation, which would copy the messages into a new list of ChatMessageContent
+        return ChatHistory.model_construct(messages=HistoryView(self, start, len(self), head))
+
+    def dumps(self, compress=None):
+        """
+        Serialize the history to its binary form.
+
+        Args:
+            compress (bool): Whether to zlib-compress the messages; by default, histories of at
+                least COMPRESS_MIN_BYTES are compressed.
+
+        Returns:
+            bytes: The binary form, read back with CompactHistory.loads.
+        """
+        parts = []
+        for message in self.messages:
+            content = str(message.content or "").encode("utf-8")
+            parts.append(_RECORD.pack(_ROLE_IDS[message.role], len(content)))
+            parts.append(content)
+        body = b"".join(parts)
+
+        if compress is None:
+            compress = len(body) >= COMPRESS_MIN_BYTES
+        flags = 0
+        if compress:
+            body, flags = zlib.compress(body, 6), FLAG_COMPRESSED
+        return _HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags) + body
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Rebuild a history from the binary form written by dumps.
+
+        Raises:
+            ValueError: If the data is not a compact history.
+        """
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a compact chat history")
+        magic, version, flags = _HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("Not a compact chat history, or an unsupported version")
+        body = memoryview(data)[_HEADER.size:]
+        if flags & FLAG_COMPRESSED:
+            body = memoryview(zlib.decompress(body))
+
+        history = cls()
+        offset = 0
+        while offset < len(body):
+            role_id, length = _RECORD.unpack_from(body, offset)
+            offset += _RECORD.size
+            if role_id >= len(ROLES) or offset + length > len(body):
+                raise ValueError("Corrupt compact chat history")
+            history._records.append(CompactMessage(ROLES[role_id], str(body[offset:offset + length], "utf-8")))
+            offset += length
+        return history
+
+    def __repr__(self):
+        return f"CompactHistory({len(self)} messages)"
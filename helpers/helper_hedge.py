@@ -0,0 +1,137 @@
+# Helper for hedged requests: racing a backup service against a primary that is slow to answer
+
+# Imports
+
+# Standard imports
+import time
+import asyncio
+import threading
+import statistics
+
+
+class HedgeGate:
+    """
+    Decides which of the racing requests owns the shared response placeholder.
+
+    The first request to receive a token claims the gate; only the winner's writes reach the
+    placeholder, so the user never sees the loser's partial output.
+    """
+
+    def __init__(self):
+        self.winner = None
+        self.claimed_at = None
+        self.claimed = asyncio.Event()
+
+    def claim(self, name):
+        """
+        Claim the gate for the named request if no other request has; returns True for the winner.
+        """
+        if self.winner is None:
+            self.winner = name
+            self.claimed_at = time.perf_counter()
+            self.claimed.set()
+        return self.winner == name
+
+    def holder(self, name, response_holder):
+        """
+        Return a response holder for the named request that only writes once it has won.
+        """
+        return GatedResponseHolder(self, name, response_holder)
+
+
+class GatedResponseHolder:
+    """
+    Response holder that passes writes to the placeholder only for the gate's winner.
+    """
+
+    def __init__(self, gate, name, response_holder):
+        self._gate = gate
+        self._name = name
+        self._holder = response_holder
+
+    def write(self, text):
+        if self._gate.winner == self._name:
+            self._holder.write(text)
+
+    def json(self, value):
+        if self._gate.winner == self._name:
+            self._holder.json(value)
+
+
+class HedgeStats:
+    """
+    Hedging counters per (primary, backup) pair, shared by every session in the process.
+
+    The latency saved by a backup win can't be measured, since the primary is cancelled. It is
+    estimated as the median time to first token of the primary's calls slower than the hedge
+    deadline (from the metrics records) minus the backup's time to first token, both counted
+    from the start of the primary request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pairs = {}
+
+    def record(self, primary, backup, hedged, winner, fallback=False, saved=None):
+        """
+        Record one hedged request.
+
+        Args:
+            primary (str): The primary service ID.
+            backup (str): The backup service ID.
+            hedged (bool): True if the backup request was sent.
+            winner (str): The service ID that answered, or None if neither did.
+            fallback (bool): True if the backup was sent because the primary failed.
+            saved (float): Estimated seconds saved by a backup win, or None.
+        """
+        with self._lock:
+            pair = self._pairs.setdefault((primary, backup), {"requests": 0, "hedged": 0, "backup_wins": 0, "fallbacks": 0, "saved_total": 0.0, "saved_count": 0})
+            pair["requests"] += 1
+            pair["hedged"] += hedged
+            pair["backup_wins"] += winner == backup
+            pair["fallbacks"] += fallback
+            if saved is not None:
+                pair["saved_total"] += saved
+                pair["saved_count"] += 1
+
+    def stats(self):
+        """
+        Return one dict per (primary, backup) pair with the hedge rate, backup win rate and
+        estimated latency saved.
+        """
+        with self._lock:
+            return [
+                {
+                    "primary": primary,
+                    "backup": backup,
+                    "requests": pair["requests"],
+                    "hedge_rate": pair["hedged"] / pair["requests"],
+                    "backup_win_rate": pair["backup_wins"] / pair["hedged"] if pair["hedged"] else 0.0,
+                    "fallbacks": pair["fallbacks"],
+                    "avg_saved_s": pair["saved_total"] / pair["saved_count"] if pair["saved_count"] else None,
+                    "total_saved_s": pair["saved_total"],
+                }
+                for (primary, backup), pair in self._pairs.items()
+            ]
+
+
+# Estimate the latency a backup win saved
+def estimate_latency_saved(records, primary, hedge_after, winner_ttft):
+    """
+    Return the estimated seconds saved when the backup answered first, or None without data.
+
+    Args:
+        records (list): Metrics records (see helper_metrics.MetricsRecorder).
+        primary (str): The primary service ID.
+        hedge_after (float): The hedge deadline in seconds.
+        winner_ttft (float): Seconds from the primary request's start to the backup's first token.
+    """
+    first_token_times = [
+        (record["queue_wait"] or 0.0) + record["time_to_first_token"]
+        for record in records
+        if record["service_id"] == primary and record["kind"] == "stream" and record["status"] == "ok" and record["time_to_first_token"] is not None
+    ]
+    slow = [seconds for seconds in first_token_times if seconds > hedge_after]
+    if not slow:
+        return None
+    return max(0.0, statistics.median(slow) - winner_ttft)
@@ -0,0 +1,193 @@
+# Helper for keeping the chat history sent to a model within a token budget
+
+# Imports
+
+# Standard imports
+import weakref
+from functools import lru_cache
+
+# Local imports
+from helpers.helper_compact_history import CompactHistory, CompactMessage
+
+
+
+# Tokens added per message for role and formatting by the chat APIs
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Characters per token used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+# Load the tokenizer on first use if tiktoken is available, otherwise fall back to a character estimate
+@lru_cache(maxsize=None)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+# Count the tokens in a piece of text
+def count_tokens(text):
+    """
+    Return the number of tokens in the text.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The token count (exact with tiktoken, estimated otherwise).
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# Count the tokens of a chat message
+def message_tokens(message):
+    """
+    Return the number of tokens a chat message adds to the prompt.
+
+    A CompactMessage keeps its count once counted, so the messages of a conversation are only
+    counted once and not again on every turn.
+    """
+    if isinstance(message, CompactMessage):
+        if message.tokens is None:
+            message.tokens = count_tokens(str(message.content or "")) + MESSAGE_OVERHEAD_TOKENS
+        return message.tokens
+    return count_tokens(str(message.content or "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+class HistoryWindow:
+    """
+    Rolling summary state of one chat history, read from and written to a metadata dict.
+
+    For a CompactHistory the dict is the history's own metadata, which the history store saves
+    with the messages, so the summary survives a page reload or a request served by another
+    replica instead of being written again with an extra model call.
+
+    Attributes:
+        summary (str): Summary of the messages evicted from the window so far.
+        summarized_count (int): Number of leading messages covered by the summary.
+    """
+
+    __slots__ = ("_metadata",)
+
+    def __init__(self, metadata):
+        self._metadata = metadata
+
+    @property
+    def summary(self):
+        return self._metadata.get("summary", "")
+
+    @summary.setter
+    def summary(self, value):
+        self._metadata["summary"] = value
+
+    @property
+    def summarized_count(self):
+        return self._metadata.get("summarized_count", 0)
+
+    @summarized_count.setter
+    def summarized_count(self, value):
+        self._metadata["summarized_count"] = value
+
+
+# Window state of Semantic Kernel ChatHistory objects, which have no metadata of their own;
+# kept for this process only and dropped when the chat history is garbage collected
+_windows = {}
+
+
+# Get the window state for a chat history
+def get_history_window(chat_history):
+    """
+    Return the HistoryWindow for a chat history: over its metadata for a CompactHistory,
+    otherwise over process-local state created on first use.
+    """
+    if isinstance(chat_history, CompactHistory):
+        return HistoryWindow(chat_history.metadata)
+    key = id(chat_history)
+    metadata = _windows.get(key)
+    if metadata is None:
+        metadata = _windows[key] = {}
+        weakref.finalize(chat_history, _windows.pop, key, None)
+    return HistoryWindow(metadata)
+
+
+# Find the first message that fits in the token budget
+def first_message_in_window(messages, token_budget):
+    """
+    Return the index of the oldest message of the newest messages that fit in the token budget.
+
+    The latest message is always kept, even if it is larger than the budget on its own.
+
+    Args:
+        messages (list): The chat messages, oldest first.
+        token_budget (int): The number of tokens available for the messages.
+
+    Returns:
+        int: The index of the first message in the window.
+    """
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[index])
+        if used > token_budget and index < len(messages) - 1:
+            return index + 1
+    return 0
+
+
+# Build the chat history sent to the model
+async def build_prompt_history(chat_history, system_message=None, token_budget=None, summarize=None):
+    """
+    Build the chat history to send to the model, keeping it within a token budget.
+
+    Without a token budget all messages are sent. With a budget, a sliding window of the newest
+    messages that fit is sent. If a summarize coroutine is given, messages that fall out of the
+    window are folded into a rolling summary that is sent as a system message ahead of the window.
+
+    Args:
+        chat_history (CompactHistory or ChatHistory): The full chat history.
+        system_message (str): Optional system message placed first.
+        token_budget (int): Optional token budget for the system message, summary and messages.
+        summarize (coroutine function): Optional, called as summarize(summary, evicted_messages)
+            and returning the updated summary text.
+
+    Returns:
+        ChatHistory: The chat history for the prompt. For a CompactHistory this is a read-only
+            view over its messages (see CompactHistory.view) rather than a copy.
+    """
+    # Imported here to keep Semantic Kernel out of the app's import time
+    from semantic_kernel.contents.chat_history import ChatHistory
+
+    messages = chat_history.messages
+    start, summary = 0, None
+    if token_budget:
+        window = get_history_window(chat_history)
+        reserved = count_tokens(system_message) + MESSAGE_OVERHEAD_TOKENS
+        start = first_message_in_window(messages, token_budget - reserved - count_tokens(window.summary))
+
+        # Fold messages that were evicted since the last turn into the rolling summary
+        if summarize and start > window.summarized_count:
+            window.summary = await summarize(window.summary, messages[window.summarized_count:start])
+            window.summarized_count = start
+            start = first_message_in_window(messages, token_budget - reserved - count_tokens(window.summary))
+
+        # Messages covered by the summary are never sent again
+        if window.summary:
+            start = max(start, window.summarized_count)
+            summary = window.summary
+
+    if isinstance(chat_history, CompactHistory):
+        return chat_history.view(system_message, start, summary)
+
+    if not token_budget:
+        return ChatHistory(messages=messages, system_message=system_message) if system_message else chat_history
+    chat = ChatHistory(system_message=system_message) if system_message else ChatHistory()
+    if summary:
+        chat.add_system_message(f"Summary of the earlier conversation:\n{summary}")
+    chat.messages.extend(messages[start:])
+    return chat
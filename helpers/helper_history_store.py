@@ -0,0 +1,244 @@
+# Helper for storing chat histories outside of the Streamlit session state
+
+# Imports
+
+# Standard imports
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Local imports
+from helpers.helper_compact_history import CompactHistory
+
+
+# Approximate bytes a message costs beyond its content
+MESSAGE_OVERHEAD_BYTES = 200
+
+# Approximate bytes a CompactHistory message costs beyond its content
+COMPACT_MESSAGE_OVERHEAD_BYTES = 64
+
+
+# Estimate the memory used by a chat history
+def history_size(chat_history):
+    """
+    Return the approximate number of bytes a chat history holds in memory.
+    """
+    overhead = COMPACT_MESSAGE_OVERHEAD_BYTES if isinstance(chat_history, CompactHistory) else MESSAGE_OVERHEAD_BYTES
+    return sum(len(str(message.content or "")) + overhead for message in chat_history.messages)
+
+
+# Serialize a chat history
+def dump_history(chat_history):
+    """
+    Serialize a chat history to the CompactHistory binary form.
+    """
+    if not isinstance(chat_history, CompactHistory):
+        chat_history = CompactHistory.from_messages(chat_history.messages)
+    return chat_history.dumps()
+
+
+# Serialize the metadata of a chat history
+def dump_metadata(chat_history):
+    """
+    Return the JSON of a chat history's metadata (see CompactHistory.metadata), or None if it has none.
+    """
+    metadata = getattr(chat_history, "metadata", None)
+    return json.dumps(metadata, ensure_ascii=False) if metadata else None
+
+
+# Deserialize a chat history
+def load_history(data, metadata=None):
+    """
+    Rebuild a chat history written by dump_history, or the JSON string of [role, content]
+    pairs stored before histories were kept in the binary form.
+
+    Args:
+        data (bytes or str): The stored messages.
+        metadata (str): The JSON written by dump_metadata, or None.
+
+    Returns:
+        CompactHistory: The chat history.
+    """
+    if isinstance(data, str):
+        history = CompactHistory()
+        for role, content in json.loads(data):
+            history.add_message(role, content)
+    else:
+        history = CompactHistory.loads(data)
+    if metadata:
+        history.metadata = json.loads(metadata)
+    return history
+
+
+class InMemoryHistoryStore:
+    """
+    Keeps chat histories per session in process memory, under a memory cap.
+
+    Sessions idle for longer than `idle_ttl` seconds are evicted, and when the histories use more
+    than `max_bytes` the least recently used sessions are evicted first (never the session being
+    accessed). Evicted histories are gone, so this backend suits a single server process.
+
+    Args:
+        max_bytes (int): Approximate memory cap for all histories.
+        idle_ttl (float): Seconds after which an idle session is evicted.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, idle_ttl=3600):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+
+        # session_id -> {"histories": {name: (chat_history, version)}, "bytes": int, "accessed": float}
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self.evicted_sessions = 0
+
+    def _cached(self, session_id, name):
+        # Returns (chat_history, version) from memory, or (None, None); must hold the lock
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None, None
+        entry["accessed"] = time.time()
+        self._sessions.move_to_end(session_id)
+        return entry["histories"].get(name, (None, None))
+
+    def _remember(self, session_id, name, chat_history, version):
+        # Caches a history and evicts other sessions if needed; must hold the lock
+        entry = self._sessions.setdefault(session_id, {"histories": {}, "bytes": 0, "accessed": 0.0})
+        entry["accessed"] = time.time()
+        self._sessions.move_to_end(session_id)
+        entry["histories"][name] = (chat_history, version)
+
+        size = sum(history_size(history) for history, _ in entry["histories"].values())
+        self._bytes += size - entry["bytes"]
+        entry["bytes"] = size
+        self._evict(keep=session_id)
+
+    def _forget(self, session_id, name):
+        # Drops a history from memory; must hold the lock
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry["histories"].pop(name, None) is not None:
+            size = sum(history_size(history) for history, _ in entry["histories"].values())
+            self._bytes += size - entry["bytes"]
+            entry["bytes"] = size
+
+    def _evict(self, keep):
+        idle_before = time.time() - self.idle_ttl
+        for session_id in list(self._sessions):
+            entry = self._sessions[session_id]
+            over_cap = self._bytes > self.max_bytes
+            if session_id == keep or (entry["accessed"] >= idle_before and not over_cap):
+                continue
+            del self._sessions[session_id]
+            self._bytes -= entry["bytes"]
+            self.evicted_sessions += 1
+
+    def get(self, session_id, name):
+        """
+        Return the chat history stored under the session and name, or None.
+        """
+        with self._lock:
+            return self._cached(session_id, name)[0]
+
+    def put(self, session_id, name, chat_history):
+        """
+        Store (or update) a chat history under the session and name.
+        """
+        with self._lock:
+            self._remember(session_id, name, chat_history, None)
+
+    def delete(self, session_id, name):
+        """
+        Remove the chat history stored under the session and name.
+        """
+        with self._lock:
+            self._forget(session_id, name)
+
+    def stats(self):
+        """
+        Return the store statistics as a dict.
+        """
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "cached_sessions": len(self._sessions),
+                "cached_histories": sum(len(entry["histories"]) for entry in self._sessions.values()),
+                "cached_mb": self._bytes / (1024 * 1024),
+                "evicted_sessions": self.evicted_sessions,
+            }
+
+
+class SqliteHistoryStore(InMemoryHistoryStore):
+    """
+    Stores chat histories in an SQLite file, with an in-memory cache of recently used sessions.
+
+    This is a local stand-in for a shared store: several server processes pointed at the same
+    file see the same conversations. Each stored history has a version; a cached history is only
+    used while its version matches the file, otherwise it is loaded again on demand. A history's
+    metadata (e.g. its rolling summary) is stored with its messages. Sessions
+    evicted from the cache stay in the file; sessions not updated for `retention` seconds are
+    deleted from it.
+
+    Args:
+        path (str): Path of the SQLite file.
+        max_bytes (int): Approximate memory cap for the cached histories.
+        idle_ttl (float): Seconds after which an idle session is dropped from the cache.
+        retention (float): Seconds after which an untouched session is deleted from the file.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, idle_ttl=3600, retention=7 * 24 * 3600):
+        super().__init__(max_bytes=max_bytes, idle_ttl=idle_ttl)
+        self.retention = retention
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS histories (session_id TEXT NOT NULL, name TEXT NOT NULL, messages BLOB NOT NULL, version INTEGER NOT NULL, updated REAL NOT NULL, metadata TEXT, PRIMARY KEY (session_id, name))")
+
+        # Files written before histories had metadata get the column
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(histories)")]
+        if "metadata" not in columns:
+            self._db.execute("ALTER TABLE histories ADD COLUMN metadata TEXT")
+        self._db.commit()
+
+    def get(self, session_id, name):
+        with self._lock:
+            row = self._db.execute("SELECT version FROM histories WHERE session_id = ? AND name = ?", (session_id, name)).fetchone()
+            if row is None:
+                self._forget(session_id, name)
+                return None
+
+            # Use the cached history while it is current, otherwise load it
+            chat_history, version = self._cached(session_id, name)
+            if chat_history is None or version != row[0]:
+                messages, metadata, version = self._db.execute("SELECT messages, metadata, version FROM histories WHERE session_id = ? AND name = ?", (session_id, name)).fetchone()
+                chat_history = load_history(messages, metadata)
+                self._remember(session_id, name, chat_history, version)
+            return chat_history
+
+    def put(self, session_id, name, chat_history):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT version FROM histories WHERE session_id = ? AND name = ?", (session_id, name)).fetchone()
+            version = row[0] + 1 if row else 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO histories (session_id, name, messages, metadata, version, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, name, dump_history(chat_history), dump_metadata(chat_history), version, now),
+            )
+            self._db.execute("DELETE FROM histories WHERE updated < ?", (now - self.retention,))
+            self._db.commit()
+            self._remember(session_id, name, chat_history, version)
+
+    def delete(self, session_id, name):
+        with self._lock:
+            self._db.execute("DELETE FROM histories WHERE session_id = ? AND name = ?", (session_id, name))
+            self._db.commit()
+            self._forget(session_id, name)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats["stored_sessions"] = self._db.execute("SELECT COUNT(DISTINCT session_id) FROM histories").fetchone()[0]
+        return stats
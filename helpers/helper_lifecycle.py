@@ -0,0 +1,348 @@
+# Helper for tracking the lifecycle of generations: ids, cancellation tokens and aborting superseded or orphaned streams
+
+# Imports
+
+# Standard imports
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import asynccontextmanager
+
+
+# Reasons a generation ends before its stream does
+CANCEL_REASONS = ("superseded", "reset", "orphaned", "interrupted", "cancelled")
+
+# The generation the running task works for (inherited by the tasks it starts)
+_current = contextvars.ContextVar("generation", default=None)
+
+
+# Return the generation the running task works for
+def current_generation():
+    """
+    Return the GenerationToken of the generation the running task works for, or None.
+    """
+    return _current.get()
+
+
+# Hand an HTTP response to the running generation
+def attach_response(response):
+    """
+    Attach an HTTP response (httpx or aiohttp) that was opened for the running generation, so
+    it can be closed if the generation is aborted. Called by the connection pools' hooks.
+    """
+    token = _current.get()
+    if token is not None:
+        token.attach(response)
+
+
+async def _close_response(response):
+    # Returns True if the response was still open, i.e. a stream was cut off
+    if getattr(response, "is_closed", getattr(response, "closed", False)):
+        return False
+    try:
+        if hasattr(response, "aclose"):
+            await response.aclose()
+        else:
+            response.close()
+    except Exception as e:
+        logging.debug(f"Closing an aborted response failed: {e}")
+    return True
+
+
+class GenerationToken:
+    """
+    Id and cancellation token of one generation (one response for one chat history).
+
+    cancel() may be called from any thread: it cancels the generation's task on its own event
+    loop. The streams of the generation then close their HTTP responses (see close_responses),
+    so the provider stops generating instead of streaming into a connection nobody reads.
+
+    Attributes:
+        id (str): The generation ID.
+        reason (str): Why the generation was cancelled, or None.
+        prompt_tokens (int): Prompt tokens of the requests sent so far.
+        output_tokens (int): Tokens streamed back so far.
+    """
+
+    def __init__(self, tracker, session_id, key, service_id, task=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.key = key
+        self.service_id = service_id
+        self.started = time.time()
+        self.loop = asyncio.get_running_loop()
+        self.task = task or asyncio.current_task()
+        self.reason = None
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.finished = threading.Event()
+
+        self._tracker = tracker
+        self._responses = {}
+
+    def cancel(self, reason="cancelled"):
+        """
+        Abort the generation. Returns False if it had already ended or been cancelled.
+        """
+        with self._tracker._lock:
+            if self.finished.is_set() or self.reason is not None:
+                return False
+            self.reason = reason
+        try:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        except RuntimeError:
+            # The generation's event loop has closed, and the generation with it
+            pass
+        return True
+
+    def wait(self, timeout=None):
+        """
+        Wait until the generation has ended; returns False on timeout.
+        """
+        return self.finished.wait(timeout)
+
+    def attach(self, response):
+        self._responses.setdefault(asyncio.current_task(), []).append(response)
+
+    def add_prompt(self, tokens):
+        self.prompt_tokens += tokens
+
+    def add_output(self, tokens):
+        self.output_tokens += tokens
+
+    async def close_responses(self, every=False):
+        """
+        Close the HTTP responses the running task opened (or, with every, any task of the
+        generation) that are still open. Returns how many were closed.
+        """
+        tasks = list(self._responses) if every else [asyncio.current_task()]
+        closed = 0
+        for task in tasks:
+            for response in self._responses.pop(task, []):
+                closed += await _close_response(response)
+        return closed
+
+    async def abort_stream(self):
+        """
+        Record that a stream of the running task ended before the model finished (cancelled,
+        timed out or abandoned), and close its HTTP response if the client library hasn't.
+        """
+        self._tracker._count(self.service_id, "streams_aborted")
+        await self.close_responses()
+
+
+class GenerationTracker:
+    """
+    Tracks the running generations of every session and ends the ones nobody will read.
+
+    Each generation runs under generation(session_id, key, service_id), which gives it a
+    GenerationToken. A generation is cancelled when:
+
+    - a newer generation starts for the same session and key (superseded), or the caller
+      cancels it with cancel(), e.g. when its chat history is reset;
+    - no browser tab of its session has been connected for orphan_grace seconds (orphaned),
+      checked by run_reaper;
+    - the Streamlit script run awaiting it is stopped (interrupted).
+
+    Tokens a cancelled generation cost (its prompts and the output streamed so far) are
+    counted as wasted; the output it would still have produced (the service's average output
+    of completed generations, or expected_tokens until there is one) is counted as saved.
+
+    The tracker is shared by every session in the process, so its state is guarded by a
+    thread lock.
+
+    Args:
+        orphan_grace (float): Seconds a session may have no connected tab before its
+            generations are cancelled; a browser reconnect within that time keeps them.
+        expected_tokens (int): Output tokens a generation is assumed to produce, until the
+            service has completed generations to average.
+    """
+
+    def __init__(self, orphan_grace=30.0, expected_tokens=300):
+        self.orphan_grace = orphan_grace
+        self.expected_tokens = expected_tokens
+
+        self._lock = threading.Lock()
+        self._running = {}
+        self._services = {}
+        self._clients = {}
+        self._last_connected = {}
+
+    def _counters(self, service_id):
+        # Must hold the lock
+        counters = self._services.get(service_id)
+        if counters is None:
+            counters = self._services[service_id] = dict.fromkeys(
+                ("started", "completed", "failed", *CANCEL_REASONS, "completed_output_tokens", "wasted_tokens", "saved_tokens", "streams_aborted"), 0)
+        return counters
+
+    def _count(self, service_id, name, amount=1):
+        with self._lock:
+            self._counters(service_id)[name] += amount
+
+    @asynccontextmanager
+    async def generation(self, session_id, key, service_id, task=None):
+        """
+        Async context manager that runs a generation under a new GenerationToken (yielded),
+        cancelling any generation still running for the same session and key.
+
+        Args:
+            session_id (str): The session the generation belongs to.
+            key (str): The generation's key within the session (e.g. the chat history name).
+            service_id (str): The service generating the response.
+            task (asyncio.Task): The task cancel() cancels; the current task by default.
+        """
+        token = GenerationToken(self, session_id, key, service_id, task)
+        with self._lock:
+            previous = self._running.get((session_id, key))
+            self._running[(session_id, key)] = token
+            self._counters(service_id)["started"] += 1
+        if previous is not None:
+            previous.cancel("superseded")
+
+        reset = _current.set(token)
+        outcome = "completed"
+        try:
+            yield token
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "failed"
+            raise
+        except BaseException:
+            # e.g. Streamlit stopping the script run for a rerun or a closed tab
+            outcome = "interrupted"
+            raise
+        finally:
+            _current.reset(reset)
+            await token.close_responses(every=True)
+            self._finish(token, token.reason or outcome)
+
+    def _finish(self, token, outcome):
+        with self._lock:
+            if self._running.get((token.session_id, token.key)) is token:
+                del self._running[(token.session_id, token.key)]
+            counters = self._counters(token.service_id)
+            counters[outcome] += 1
+            if outcome == "completed":
+                counters["completed_output_tokens"] += token.output_tokens
+            elif outcome != "failed":
+                expected = counters["completed_output_tokens"] / counters["completed"] if counters["completed"] else self.expected_tokens
+                counters["wasted_tokens"] += token.prompt_tokens + token.output_tokens
+                counters["saved_tokens"] += max(0, round(expected) - token.output_tokens)
+            token.finished.set()
+
+    def get(self, session_id, key):
+        """
+        Return the token of the generation running for the session and key, or None.
+        """
+        with self._lock:
+            return self._running.get((session_id, key))
+
+    def cancel(self, session_id, key, reason="cancelled", wait=None):
+        """
+        Cancel the generation running for the session and key, if any.
+
+        Args:
+            wait (float): Seconds to wait for the generation to end, or None not to wait.
+
+        Returns:
+            GenerationToken: The cancelled generation's token, or None.
+        """
+        token = self.get(session_id, key)
+        if token is None or not token.cancel(reason):
+            return None
+        if wait:
+            token.wait(wait)
+        return token
+
+    def touch(self, session_id, client_id):
+        """
+        Record that a browser tab (client_id, e.g. the Streamlit session ID) is showing the session.
+        """
+        with self._lock:
+            self._clients.setdefault(session_id, set()).add(client_id)
+            self._last_connected[session_id] = time.time()
+
+    def reap(self, is_connected):
+        """
+        Cancel the generations of sessions that have had no connected tab for orphan_grace
+        seconds. Sessions no tab was ever recorded for (e.g. scripts) are left alone. Sessions
+        with no running generation that weren't seen for orphan_grace seconds are forgotten.
+
+        Args:
+            is_connected (callable): Called with a client_id; returns whether the tab is connected.
+
+        Returns:
+            int: The number of generations cancelled.
+        """
+        now = time.time()
+        with self._lock:
+            running = {token.session_id for token in self._running.values()}
+            for session_id in [session_id for session_id, seen in self._last_connected.items() if session_id not in running and now - seen >= self.orphan_grace]:
+                self._clients.pop(session_id, None)
+                self._last_connected.pop(session_id, None)
+
+            sessions = running & self._clients.keys()
+            clients = {session_id: list(self._clients[session_id]) for session_id in sessions}
+
+        orphaned = []
+        for session_id, client_ids in clients.items():
+            connected = [client_id for client_id in client_ids if is_connected(client_id)]
+            with self._lock:
+                if connected:
+                    self._clients[session_id] = set(connected)
+                    self._last_connected[session_id] = now
+                elif now - self._last_connected.get(session_id, now) >= self.orphan_grace:
+                    orphaned.append(session_id)
+                    self._clients.pop(session_id, None)
+                    self._last_connected.pop(session_id, None)
+
+        with self._lock:
+            tokens = [token for token in self._running.values() if token.session_id in orphaned]
+        return sum(token.cancel("orphaned") for token in tokens)
+
+    async def run_reaper(self, is_connected, interval=5.0):
+        """
+        Call reap every interval seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                reaped = self.reap(is_connected)
+                if reaped:
+                    logging.info(f"Cancelled {reaped} orphaned generation(s)")
+            except Exception as e:
+                logging.warning(f"Reaping orphaned generations failed: {e}")
+
+    def running(self):
+        """
+        Return one dict per running generation: id, session, key, service, age and tokens so far.
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "generation_id": token.id,
+                    "session_id": token.session_id,
+                    "key": token.key,
+                    "service_id": token.service_id,
+                    "age_s": now - token.started,
+                    "prompt_tokens": token.prompt_tokens,
+                    "output_tokens": token.output_tokens,
+                    "cancelling": token.reason,
+                }
+                for token in self._running.values()
+            ]
+
+    def stats(self):
+        """
+        Return one dict per service with its generation outcomes, wasted and saved tokens, and
+        the number of streams aborted before the model finished.
+        """
+        with self._lock:
+            return [{"service_id": service_id, **counters} for service_id, counters in self._services.items()]
@@ -0,0 +1,116 @@
+# Helper for recording latency and throughput of every model call
+
+# Imports
+
+# Standard imports
+import os
+import json
+import logging
+import threading
+from collections import deque
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent call records in memory, for the Performance page.
+
+    Args:
+        capacity (int): Maximum number of records kept.
+    """
+
+    def __init__(self, capacity=5000):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        """
+        Return a copy of the records, oldest first.
+        """
+        with self._lock:
+            return list(self._records)
+
+
+class JsonlSink:
+    """
+    Appends each call record as a JSON line to a file.
+
+    Args:
+        path (str): Path of the JSONL file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+
+class OpenTelemetrySink:
+    """
+    Reports call records as OpenTelemetry histograms and counters.
+
+    Only the OpenTelemetry API is used; the exporter is whatever meter provider the process has
+    configured (nothing is exported if none is). Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, meter_name="sk_streamlit"):
+        from opentelemetry import metrics
+
+        meter = metrics.get_meter(meter_name)
+        self._queue_wait = meter.create_histogram("chat.queue_wait", unit="s")
+        self._time_to_first_token = meter.create_histogram("chat.time_to_first_token", unit="s")
+        self._duration = meter.create_histogram("chat.duration", unit="s")
+        self._tokens = meter.create_counter("chat.tokens", unit="{token}")
+        self._errors = meter.create_counter("chat.errors", unit="{call}")
+
+    def emit(self, record):
+        attributes = {"service_id": record["service_id"], "kind": record["kind"]}
+        self._queue_wait.record(record["queue_wait"], attributes)
+        if record["time_to_first_token"] is not None:
+            self._time_to_first_token.record(record["time_to_first_token"], attributes)
+        self._duration.record(record["duration"], attributes)
+        self._tokens.add(record["prompt_tokens"], {**attributes, "type": "prompt"})
+        self._tokens.add(record["completion_tokens"], {**attributes, "type": "completion"})
+        if record["status"] != "ok":
+            self._errors.add(1, {**attributes, "status": record["status"]})
+
+
+class MetricsRecorder:
+    """
+    Sends call records to a list of sinks. A failing sink is logged and does not affect the call.
+
+    Each record is a dict with: timestamp, service_id, kind ("stream" or "complete"), status
+    ("ok", "error", "timeout" or "cancelled"), error, queue_wait, time_to_first_token, mean_inter_token_gap,
+    max_inter_token_gap, duration (seconds), prompt_tokens and completion_tokens.
+
+    Args:
+        sinks (list): The sinks to send records to.
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def record(self, record):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logging.error(f"Metrics sink {type(sink).__name__} failed: {e}")
+
+    def records(self):
+        """
+        Return the records held by the first ring buffer sink, or an empty list.
+        """
+        for sink in self.sinks:
+            if isinstance(sink, RingBufferSink):
+                return sink.records()
+        return []
@@ -0,0 +1,356 @@
+# Helper for keeping local Ollama models ready: warm-up, keep-alive pings, residency and model-aware ordering
+
+# Imports
+
+# Standard imports
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+# aiohttp is imported by the methods that talk to Ollama, so a process with no Ollama services
+# never imports it
+
+
+# Return the full name Ollama reports for a model
+def model_name(name):
+    """
+    Return the model name with its tag, as /api/ps lists it ("phi3" -> "phi3:latest").
+    """
+    return name if ":" in name else f"{name}:latest"
+
+
+class ModelGate:
+    """
+    Orders the calls to one Ollama endpoint by model, so models that don't fit in memory
+    together are not reloaded on every turn.
+
+    Calls for a model that is resident, or fits next to the running ones (max_loaded models at
+    once), go first. A call that would load a model waits batch_window seconds first, so that
+    when two models are compared side by side, the resident model answers before the other is
+    loaded, and each turn costs one model load instead of two. Calls from any thread's event
+    loop are supported, like helper_scheduler.ConcurrencyScheduler.
+
+    Args:
+        max_loaded (int): Models the endpoint can hold at once.
+        batch_window (float): Seconds a call that would load a model waits for calls for resident models.
+    """
+
+    def __init__(self, max_loaded=1, batch_window=0.05):
+        self.max_loaded = max_loaded
+        self.batch_window = batch_window
+
+        self._lock = threading.Lock()
+        self._running = {}
+        self._resident = []
+        self._waiters = []
+
+    def resident(self):
+        """
+        Return the models believed resident, least recently used first.
+        """
+        with self._lock:
+            return list(self._resident)
+
+    def set_resident(self, models):
+        """
+        Update the resident models from the endpoint's /api/ps, keeping the known usage order.
+        Models with calls running count as resident, since /api/ps omits a model while it loads.
+        """
+        with self._lock:
+            models = set(models) | set(self._running)
+            self._resident = [model for model in self._resident if model in models] + sorted(models.difference(self._resident))
+            self._wake()
+
+    def _fits(self, model):
+        return model in self._running or len(self._running) < self.max_loaded
+
+    def _take(self, model):
+        # The model becomes the most recently used; beyond max_loaded the least recently used is evicted
+        cold = model not in self._resident
+        self._running[model] = self._running.get(model, 0) + 1
+        if not cold:
+            self._resident.remove(model)
+        self._resident.append(model)
+        del self._resident[:-self.max_loaded]
+        return cold
+
+    def _wake(self):
+        # Must hold the lock; resident models first, the others in arrival order after their batch window
+        now = time.monotonic()
+        for waiter in sorted(self._waiters, key=lambda waiter: (waiter[0] not in self._resident, waiter[3])):
+            model, loop, future, enqueued = waiter
+            if not self._fits(model):
+                continue
+            if model not in self._resident and now - enqueued < self.batch_window:
+                continue
+            self._waiters.remove(waiter)
+            cold = self._take(model)
+            try:
+                loop.call_soon_threadsafe(self._grant, model, future, cold)
+            except RuntimeError:
+                # The waiter's event loop has closed; give the model back
+                self._running[model] -= 1
+                if not self._running[model]:
+                    del self._running[model]
+
+    def _grant(self, model, future, cold):
+        if future.cancelled():
+            self.release(model)
+        else:
+            future.set_result(cold)
+
+    def _wake_later(self):
+        with self._lock:
+            self._wake()
+
+    async def acquire(self, model):
+        """
+        Wait until a call for the model may run.
+
+        Returns:
+            bool: True if the model was not resident, i.e. the call pays a model load.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and model in self._resident and self._fits(model):
+                return self._take(model)
+            waiter = (model, loop, loop.create_future(), time.monotonic())
+            self._waiters.append(waiter)
+            self._wake()
+        loop.call_later(self.batch_window, self._wake_later)
+
+        try:
+            return await waiter[2]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    granted = False
+                else:
+                    granted = waiter[2].done() and not waiter[2].cancelled()
+            if granted:
+                self.release(model)
+            raise
+
+    def release(self, model):
+        """
+        End a call admitted by acquire.
+        """
+        with self._lock:
+            self._running[model] -= 1
+            if not self._running[model]:
+                del self._running[model]
+            self._wake()
+
+
+class OllamaModelManager:
+    """
+    Keeps the local models of the Ollama chat services ready to answer.
+
+    Loading a model costs seconds, and Ollama unloads a model after it has been idle for a
+    while (or to make room for another). The manager:
+
+    - warms the models at startup, up to max_loaded per endpoint, by loading them with an
+      empty prompt;
+    - sends keep-alive pings every ping_interval seconds to the resident models, so they are
+      not unloaded while the app is idle;
+    - polls /api/ps every refresh_interval seconds to track residency, and records when
+      models are loaded or evicted;
+    - orders the calls to each endpoint by model (see ModelGate), so comparing two models that
+      don't fit together doesn't reload both on every turn;
+    - measures the cold-start penalty: time to first token of calls that loaded their model
+      against calls that didn't.
+
+    run() is meant to run for the life of the process on a long-lived event loop.
+
+    Args:
+        services (dict): (endpoint URL, model) per Ollama service ID.
+        keep_alive (str): How long Ollama keeps a model loaded after a warm-up or ping (e.g. "30m").
+        ping_interval (float): Seconds between keep-alive pings.
+        refresh_interval (float): Seconds between residency checks.
+        max_loaded (int): Models an endpoint can hold at once.
+        warm_up (bool): Whether to load the models at startup.
+        events (int): Number of recent load/evict events kept.
+    """
+
+    def __init__(self, services, keep_alive="30m", ping_interval=240.0, refresh_interval=15.0, max_loaded=1, warm_up=True, events=200):
+        self.services = {service_id: (endpoint, model_name(model)) for service_id, (endpoint, model) in services.items()}
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self.refresh_interval = refresh_interval
+        self.warm_up = warm_up
+
+        self._lock = threading.Lock()
+        self._gates = {endpoint: ModelGate(max_loaded) for endpoint, _ in self.services.values()}
+        self._resident = {endpoint: {} for endpoint in self._gates}
+        self._reachable = {}
+        self._events = deque(maxlen=events)
+        self._ttft = {}
+
+    def _event(self, endpoint, model, event, seconds=None, detail=None):
+        with self._lock:
+            self._events.append({"timestamp": time.time(), "endpoint": endpoint, "model": model, "event": event, "seconds": seconds, "detail": detail})
+
+    @asynccontextmanager
+    async def slot(self, service_id):
+        """
+        Async context manager that holds the model's turn on its endpoint; yields True if the
+        call loads the model. Services the manager doesn't know pass straight through (False).
+        """
+        if service_id not in self.services:
+            yield False
+            return
+        async with self.slot_for(*self.services[service_id]) as cold:
+            yield cold
+
+    def observe(self, service_id, cold, ttft):
+        """
+        Record the time to first token of a call, and a cold-start event if it loaded its model.
+        Only calls that went to the model are observed, not answers replayed from a cache.
+        """
+        if service_id not in self.services or ttft is None:
+            return
+        with self._lock:
+            counts = self._ttft.setdefault(service_id, {"cold": [0, 0.0], "warm": [0, 0.0]})
+            counts["cold" if cold else "warm"][0] += 1
+            counts["cold" if cold else "warm"][1] += ttft
+        if cold:
+            endpoint, model = self.services[service_id]
+            self._event(endpoint, model, "cold start", ttft, f"first token of {service_id}")
+
+    async def _load(self, session, endpoint, model, event):
+        # A generate request without a prompt loads the model if needed and sets its keep-alive
+        async with self.slot_for(endpoint, model) as cold:
+            async with session.post(f"{endpoint}/api/generate", json={"model": model, "keep_alive": self.keep_alive}) as response:
+                response.raise_for_status()
+                body = await response.json()
+        load_seconds = (body.get("load_duration") or 0) / 1e9
+        if event == "warm-up" or cold:
+            self._event(endpoint, model, event, load_seconds)
+
+    @asynccontextmanager
+    async def slot_for(self, endpoint, model):
+        """
+        Async context manager that holds a model's turn on an endpoint (see slot).
+        """
+        gate = self._gates[endpoint]
+        cold = await gate.acquire(model)
+        try:
+            yield cold
+        finally:
+            gate.release(model)
+
+    async def refresh(self, session):
+        """
+        Update the resident models of every endpoint from /api/ps and record loads and evictions.
+        """
+        import aiohttp
+
+        for endpoint, gate in self._gates.items():
+            try:
+                async with session.get(f"{endpoint}/api/ps") as response:
+                    response.raise_for_status()
+                    models = {model["name"]: model for model in (await response.json()).get("models", [])}
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                if self._reachable.get(endpoint, True):
+                    logging.warning(f"Ollama endpoint {endpoint} is unreachable: {e}")
+                    self._event(endpoint, None, "unreachable", detail=str(e))
+                self._reachable[endpoint] = False
+                continue
+            self._reachable[endpoint] = True
+
+            with self._lock:
+                previous = self._resident[endpoint]
+                self._resident[endpoint] = models
+            for model in models.keys() - previous.keys():
+                self._event(endpoint, model, "loaded")
+            for model in previous.keys() - models.keys():
+                self._event(endpoint, model, "evicted")
+            gate.set_resident(models)
+
+    async def run(self):
+        """
+        Warm the models, then track residency and send keep-alive pings until cancelled.
+        """
+        import aiohttp
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+            await self.refresh(session)
+            if self.warm_up:
+                for endpoint, gate in self._gates.items():
+                    models = list(dict.fromkeys(model for service_endpoint, model in self.services.values() if service_endpoint == endpoint))
+                    for model in models[:gate.max_loaded]:
+                        await self._safe_load(session, endpoint, model, "warm-up")
+                await self.refresh(session)
+
+            last_ping = time.monotonic()
+            while True:
+                await asyncio.sleep(self.refresh_interval)
+                await self.refresh(session)
+                if time.monotonic() - last_ping >= self.ping_interval:
+                    last_ping = time.monotonic()
+                    for endpoint, gate in self._gates.items():
+                        for model in gate.resident():
+                            if any(model == service_model for _, service_model in self.services.values()):
+                                await self._safe_load(session, endpoint, model, "keep-alive")
+
+    async def _safe_load(self, session, endpoint, model, event):
+        import aiohttp
+
+        try:
+            await self._load(session, endpoint, model, event)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logging.warning(f"Ollama {event} of {model} at {endpoint} failed: {e}")
+            self._event(endpoint, model, f"{event} failed", detail=str(e))
+
+    def residency(self):
+        """
+        Return one dict per configured model with its endpoint, services and residency.
+        """
+        with self._lock:
+            rows = {}
+            for service_id, (endpoint, model) in self.services.items():
+                info = self._resident[endpoint].get(model)
+                row = rows.setdefault((endpoint, model), {
+                    "endpoint": endpoint,
+                    "model": model,
+                    "services": [],
+                    "resident": info is not None,
+                    "size_gb": info["size"] / 1024 ** 3 if info and info.get("size") else None,
+                    "expires_at": info.get("expires_at") if info else None,
+                })
+                row["services"].append(service_id)
+            for row in rows.values():
+                row["services"] = ", ".join(row["services"])
+            return list(rows.values())
+
+    def events(self):
+        """
+        Return the recent load, evict and cold-start events, newest first.
+        """
+        with self._lock:
+            return list(reversed(self._events))
+
+    def cold_start_stats(self):
+        """
+        Return one dict per service with its average time to first token with and without a
+        model load, and the difference (the cold-start penalty).
+        """
+        with self._lock:
+            rows = []
+            for service_id, counts in self._ttft.items():
+                (cold, cold_total), (warm, warm_total) = counts["cold"], counts["warm"]
+                cold_ttft = cold_total / cold if cold else None
+                warm_ttft = warm_total / warm if warm else None
+                rows.append({
+                    "service_id": service_id,
+                    "cold_starts": cold,
+                    "warm_calls": warm,
+                    "avg_cold_ttft_s": cold_ttft,
+                    "avg_warm_ttft_s": warm_ttft,
+                    "penalty_s": cold_ttft - warm_ttft if cold_ttft is not None and warm_ttft is not None else None,
+                })
+            return rows
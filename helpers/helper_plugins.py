@@ -0,0 +1,119 @@
+# Kernel plugins the chat services can call in tool mode (see helper_sk.TOOL_PLUGINS)
+
+# Imports
+
+# Standard imports
+import ast
+import math
+import operator
+from datetime import datetime, date
+from typing import Annotated
+from zoneinfo import ZoneInfo
+
+# Semantic Kernel imports (this module is only imported when the kernel is built)
+from semantic_kernel.functions.kernel_function_decorator import kernel_function
+
+
+# Limits on what the model can ask for, so one call can't tie up a worker: the length of an
+# expression, the size in bits of the integers it computes, the largest factorial and the largest
+# number factorize accepts (trial division up to its square root, about half a million steps)
+_MAX_EXPRESSION_LENGTH = 500
+_MAX_BITS = 4096
+_MAX_FACTORIAL = 300
+_MAX_FACTORIZE = 10 ** 12
+
+
+# Check that an integer operand or result is within _MAX_BITS
+def _check_size(value):
+    if isinstance(value, int) and value.bit_length() > _MAX_BITS:
+        raise ValueError(f"number too large (over {_MAX_BITS} bits)")
+    return value
+
+
+# Check that an operation on integers would stay within _MAX_BITS before computing it
+def _check_operation(op, left, right):
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return
+    if isinstance(op, ast.Pow) and right > 0 and left not in (-1, 0, 1) and left.bit_length() * right > _MAX_BITS:
+        raise ValueError(f"result too large (over {_MAX_BITS} bits)")
+    if isinstance(op, ast.Mult) and left.bit_length() + right.bit_length() > _MAX_BITS:
+        raise ValueError(f"result too large (over {_MAX_BITS} bits)")
+
+
+# Factorial of a bounded argument
+def _factorial(value):
+    if not isinstance(value, int) or value > _MAX_FACTORIAL:
+        raise ValueError(f"factorial takes an integer up to {_MAX_FACTORIAL}")
+    return math.factorial(value)
+
+
+# Operators allowed in arithmetic expressions
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+    ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+
+# Functions and constants allowed in arithmetic expressions
+_NAMES = {name: getattr(math, name) for name in ("sqrt", "log", "log10", "exp", "sin", "cos", "tan", "pi", "e", "gcd")}
+_NAMES.update({"abs": abs, "round": round, "min": min, "max": max, "factorial": _factorial})
+
+
+# Evaluate an arithmetic expression tree
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return _check_size(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        _check_operation(node.op, left, right)
+        return _check_size(_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.Name) and node.id in _NAMES:
+        return _NAMES[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _NAMES and not node.keywords:
+        return _check_size(_NAMES[node.func.id](*(_evaluate(argument) for argument in node.args)))
+    raise ValueError(f"unsupported expression: {ast.dump(node)[:80]}")
+
+
+class MathPlugin:
+    """
+    Exact arithmetic and number theory, which models get wrong. CPU-bound: runs in a process pool.
+    """
+
+    @kernel_function(name="evaluate", description="Evaluate an arithmetic expression, e.g. '(17 ** 3 - 4) / sqrt(2)'.")
+    def evaluate(self, expression: Annotated[str, "The arithmetic expression, in Python syntax."]) -> Annotated[str, "The value of the expression."]:
+        if len(expression) > _MAX_EXPRESSION_LENGTH:
+            raise ValueError(f"expression too long (over {_MAX_EXPRESSION_LENGTH} characters)")
+        return str(_evaluate(ast.parse(expression, mode="eval")))
+
+    @kernel_function(name="factorize", description=f"Return the prime factors of an integer from 2 to {_MAX_FACTORIZE}.")
+    def factorize(self, number: Annotated[int, "The integer to factorize."]) -> Annotated[str, "The prime factors, smallest first."]:
+        number = int(number)
+        if not 2 <= number <= _MAX_FACTORIZE:
+            raise ValueError(f"the number must be from 2 to {_MAX_FACTORIZE}")
+        factors, divisor = [], 2
+        while divisor * divisor <= number:
+            while number % divisor == 0:
+                factors.append(divisor)
+                number //= divisor
+            divisor += 1 if divisor == 2 else 2
+        if number > 1:
+            factors.append(number)
+        return " x ".join(map(str, factors))
+
+
+class TimePlugin:
+    """
+    The current date and time, and date arithmetic. Cheap: runs on the event loop.
+    """
+
+    @kernel_function(name="now", description="Return the current date and time in a time zone.")
+    async def now(self, timezone: Annotated[str, "An IANA time zone, e.g. 'Europe/Paris'."] = "UTC") -> Annotated[str, "The date and time in ISO format."]:
+        return datetime.now(ZoneInfo(timezone)).isoformat(timespec="seconds")
+
+    @kernel_function(name="days_between", description="Return the number of days from one date to another.")
+    async def days_between(self, start: Annotated[str, "The first date, YYYY-MM-DD."], end: Annotated[str, "The second date, YYYY-MM-DD."]) -> Annotated[int, "The number of days."]:
+        return (date.fromisoformat(end) - date.fromisoformat(start)).days
@@ -0,0 +1,388 @@
+# Helper for sharing chat service clients and connection pools across Streamlit sessions
+
+# Imports
+
+# Standard imports
+import os
+import time
+import asyncio
+import threading
+import warnings
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# httpx and aiohttp are imported when the first client of their kind is created, so a process
+# only imports the HTTP stack its services use
+
+# Local imports
+from helpers.helper_lifecycle import attach_response
+
+
+# Connection pool limits per endpoint (overridable from .env)
+POOL_MAX_CONNECTIONS = int(os.getenv("POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("POOL_MAX_KEEPALIVE_CONNECTIONS", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("POOL_KEEPALIVE_EXPIRY", "30"))
+
+
+# aiohttp discourages subclassing ClientSession, but it is the only way to stop Semantic Kernel's
+# Ollama connector from closing a session it was given after every request.
+@lru_cache(maxsize=None)
+def _shared_client_session_class():
+    """
+    Return the aiohttp session class that ignores close() so it can be shared between requests.
+    Use shutdown() to really close it.
+    """
+    import aiohttp
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+
+        class _SharedClientSession(aiohttp.ClientSession):
+            async def close(self):
+                pass
+
+            async def shutdown(self):
+                await super().close()
+
+    return _SharedClientSession
+
+
+# Return the key used to group services that talk to the same endpoint
+def endpoint_key(url):
+    """
+    Return the scheme://host:port part of a URL, used to share one pool per endpoint.
+
+    Args:
+        url (str): The service URL or endpoint.
+
+    Returns:
+        str: The endpoint key.
+    """
+    parts = urlsplit(str(url))
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+class EndpointPool:
+    """
+    Bounded keep-alive connection pool for one endpoint, shared by every session in the process.
+
+    HTTP clients are bound to the event loop they were created on, so the pool hands out one
+    httpx client (Azure OpenAI) or aiohttp session (Ollama) per running event loop, all with the
+    same limits, and records connection statistics across all of them.
+
+    Args:
+        endpoint (str): The endpoint key (see endpoint_key).
+        max_connections (int): Maximum open connections per event loop.
+        max_keepalive_connections (int): Maximum idle connections kept alive per event loop.
+        keepalive_expiry (float): Seconds an idle connection is kept alive.
+    """
+
+    def __init__(self, endpoint, max_connections=POOL_MAX_CONNECTIONS, max_keepalive_connections=POOL_MAX_KEEPALIVE_CONNECTIONS, keepalive_expiry=POOL_KEEPALIVE_EXPIRY):
+        self.endpoint = endpoint
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+
+        # Clients per event loop, guarded by a lock since Streamlit sessions run on separate threads
+        self._lock = threading.Lock()
+        self._clients = {}
+
+        # Connection statistics
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.wait_time = 0.0
+
+    def _record(self, new_connection, wait_time):
+        with self._lock:
+            self.requests += 1
+            if new_connection:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+            self.wait_time += wait_time
+
+    def _get_client(self, kind, create):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Drop clients whose event loop has finished; they can no longer be used
+            for key in [key for key in self._clients if key[0].is_closed()]:
+                del self._clients[key]
+
+            client = self._clients.get((loop, kind))
+            if client is None:
+                client = create()
+                self._clients[(loop, kind)] = client
+            return client
+
+    def httpx_client(self):
+        """
+        Return the shared httpx.AsyncClient for the running event loop.
+        """
+        return self._get_client("httpx", self._create_httpx_client)
+
+    def aiohttp_session(self):
+        """
+        Return the shared aiohttp session for the running event loop.
+        """
+        return self._get_client("aiohttp", self._create_aiohttp_session)
+
+    def _create_httpx_client(self):
+        import httpx
+
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+        # httpcore reports connection events through the "trace" request extension: a request
+        # that opens a TCP connection used a new connection, otherwise it reused one.
+        async def on_request(request):
+            started = time.perf_counter()
+            state = {"new": False, "waited": None}
+
+            async def trace(event_name, info):
+                if state["waited"] is None and (event_name == "connection.connect_tcp.started" or event_name.endswith("send_request_headers.started")):
+                    state["waited"] = time.perf_counter() - started
+                if event_name == "connection.connect_tcp.complete":
+                    state["new"] = True
+                if event_name.endswith("send_request_headers.started"):
+                    self._record(state["new"], state["waited"] or 0.0)
+
+            request.extensions["trace"] = trace
+
+        # Responses are handed to the running generation, which closes them if it is aborted
+        async def on_response(response):
+            attach_response(response)
+
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(limits=limits),
+            limits=limits,
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+
+    def _create_aiohttp_session(self):
+        import aiohttp
+
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.new = False
+            context.wait_time = 0.0
+
+        async def on_queued_start(session, context, params):
+            context.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, context, params):
+            context.wait_time = time.perf_counter() - context.queued_at
+
+        async def on_create_end(session, context, params):
+            context.new = True
+
+        async def on_headers_sent(session, context, params):
+            self._record(context.new, context.wait_time)
+
+        async def on_request_end(session, context, params):
+            attach_response(params.response)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_request_headers_sent.append(on_headers_sent)
+        trace_config.on_request_end.append(on_request_end)
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_expiry)
+        return _shared_client_session_class()(connector=connector, trace_configs=[trace_config])
+
+    def open_connections(self):
+        """
+        Return the number of connections currently open across all event loops.
+        """
+        count = 0
+        with self._lock:
+            clients = list(self._clients.items())
+        for (_, kind), client in clients:
+            if kind == "httpx":
+                pool = getattr(client._transport, "_pool", None)
+                count += len(getattr(pool, "connections", []))
+            else:
+                connector = client.connector
+                if connector is not None and not connector.closed:
+                    count += sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+                    count += len(getattr(connector, "_acquired", ()))
+        return count
+
+    async def close_loop_clients(self):
+        """
+        Close the clients created for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = [(key[1], self._clients.pop(key)) for key in list(self._clients) if key[0] is loop]
+        for kind, client in clients:
+            if kind == "httpx":
+                await client.aclose()
+            else:
+                await client.shutdown()
+
+    def stats(self):
+        """
+        Return the pool statistics as a dict.
+        """
+        with self._lock:
+            requests = self.requests
+            reused = self.reused_connections
+            new = self.new_connections
+            wait_time = self.wait_time
+        return {
+            "endpoint": self.endpoint,
+            "open_connections": self.open_connections(),
+            "requests": requests,
+            "new_connections": new,
+            "reused_connections": reused,
+            "reuse_ratio": reused / requests if requests else 0.0,
+            "avg_wait_ms": wait_time / requests * 1000 if requests else 0.0,
+        }
+
+
+class ServiceRegistry:
+    """
+    Process-wide registry of chat services.
+
+    Services are registered once with a factory that builds the Semantic Kernel service from a
+    shared EndpointPool. The service objects (and a kernel holding the registered plugins) are
+    built lazily per running event loop, so every session on the same loop shares the same
+    clients.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factories = {}
+        self._options = {}
+        self._pools = {}
+        self._services = {}
+        self._kernels = {}
+        self._plugins = {}
+
+    def register(self, service_id, url, factory, **options):
+        """
+        Register a chat service.
+
+        Args:
+            service_id (str): The service ID.
+            url (str): The endpoint URL the service talks to; services on the same endpoint share a pool.
+            factory (callable): Called as factory(pool) to build the service for the running loop.
+            **options: Per-service settings (e.g. history_token_budget), see get_options.
+        """
+        key = endpoint_key(url)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = EndpointPool(key)
+            self._factories[service_id] = (self._pools[key], factory)
+            self._options[service_id] = options
+
+    def register_plugin(self, plugin_name, factory):
+        """
+        Register a kernel plugin.
+
+        Args:
+            plugin_name (str): The plugin name the model calls its functions under.
+            factory (callable): Called with no arguments to build the plugin object when a kernel is built.
+        """
+        with self._lock:
+            self._plugins[plugin_name] = factory
+
+    def plugin_names(self):
+        """
+        Return the list of registered plugin names.
+        """
+        return list(self._plugins)
+
+    def get_options(self, service_id):
+        """
+        Return the per-service settings given at registration, or an empty dict.
+        """
+        return self._options.get(service_id, {})
+
+    def service_ids(self):
+        """
+        Return the list of registered service IDs, in registration order.
+        """
+        return list(self._factories)
+
+    def get_pool(self, service_id):
+        """
+        Return the EndpointPool used by a service.
+        """
+        return self._factories[service_id][0]
+
+    def get_service(self, service_id):
+        """
+        Return the chat service for the running event loop, building it on first use.
+
+        Args:
+            service_id (str): The service ID.
+
+        Returns:
+            The chat service, or None if the service ID is not registered.
+        """
+        if service_id not in self._factories:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._purge_closed_loops()
+            services = self._services.setdefault(loop, {})
+            if service_id not in services:
+                pool, factory = self._factories[service_id]
+                services[service_id] = factory(pool)
+            return services[service_id]
+
+    def get_kernel(self):
+        """
+        Return a kernel with every registered plugin added, for the running event loop. The chat
+        services are not added: the kernel only runs the plugins' functions, and a service is
+        built on its first get_service.
+        """
+        # Imported here so the registry itself does not depend on Semantic Kernel
+        import semantic_kernel as sk
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            kernel = self._kernels.get(loop)
+        if kernel is None:
+            kernel = sk.Kernel()
+            for plugin_name, factory in list(self._plugins.items()):
+                kernel.add_plugin(factory(), plugin_name=plugin_name)
+            with self._lock:
+                kernel = self._kernels.setdefault(loop, kernel)
+        return kernel
+
+    def _purge_closed_loops(self):
+        for closed_loop in [l for l in self._services if l.is_closed()]:
+            del self._services[closed_loop]
+        for closed_loop in [l for l in self._kernels if l.is_closed()]:
+            del self._kernels[closed_loop]
+
+    async def close_loop_clients(self):
+        """
+        Close the services and clients built for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._services.pop(loop, None)
+            self._kernels.pop(loop, None)
+            pools = list(self._pools.values())
+        for pool in pools:
+            await pool.close_loop_clients()
+
+    def pool_stats(self):
+        """
+        Return the statistics of every endpoint pool as a list of dicts.
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        return [pool.stats() for pool in pools]
@@ -0,0 +1,222 @@
+# Helper for routing each request to the chat service that currently fits a latency/cost policy best
+
+# Imports
+
+# Standard imports
+import time
+import threading
+from collections import deque
+
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ServiceHealth:
+    """
+    Rolling statistics and circuit breaker state of one chat service.
+
+    Time to first token, tokens per second and error rate are exponentially weighted moving
+    averages (EWMA), so recent calls count the most.
+    """
+
+    def __init__(self, service_id):
+        self.service_id = service_id
+        self.samples = 0
+        self.ttft = None
+        self.tokens_per_second = None
+        self.error_rate = 0.0
+
+        # Circuit breaker
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def as_dict(self):
+        return {
+            "service_id": self.service_id,
+            "samples": self.samples,
+            "ewma_ttft_s": self.ttft,
+            "ewma_tokens_per_s": self.tokens_per_second,
+            "ewma_error_rate": self.error_rate,
+            "breaker": self.state,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class AdaptiveRouter:
+    """
+    Picks a chat service per request from rolling per-service statistics.
+
+    Each candidate is scored by its expected response time, ttft + expected_tokens / tokens_per_s,
+    inflated by its error rate, plus cost_weight times its cost per 1K tokens (from the costs
+    dict); the lowest score wins. Services with fewer than min_samples observations are tried
+    first, so every service gets measured.
+
+    A circuit breaker steers away from unhealthy services: after failure_threshold consecutive
+    failures a service is skipped for cooldown seconds, then a single trial request is let
+    through (half open); its success closes the breaker, its failure opens it again.
+
+    The router learns from every model call: it is a metrics sink (see helper_metrics) and
+    observes each call record. Recent decisions are kept for inspection.
+
+    Args:
+        costs (dict): Cost per 1K completion tokens per service ID (default 0).
+        cost_weight (float): Seconds of expected latency one unit of cost is worth (0 = latency only).
+        expected_tokens (int): Completion tokens assumed per response.
+        alpha (float): EWMA weight of the newest observation.
+        min_samples (int): Observations needed before a service is scored.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        cooldown (float): Seconds the breaker stays open before a trial request.
+        decisions (int): Number of recent decisions kept.
+    """
+
+    def __init__(self, costs=None, cost_weight=0.0, expected_tokens=300, alpha=0.2, min_samples=3, failure_threshold=3, cooldown=30.0, decisions=200):
+        self.costs = dict(costs or {})
+        self.cost_weight = cost_weight
+        self.expected_tokens = expected_tokens
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._health = {}
+        self._decisions = deque(maxlen=decisions)
+
+    def _get_health(self, service_id):
+        # Must hold the lock
+        health = self._health.get(service_id)
+        if health is None:
+            health = self._health[service_id] = ServiceHealth(service_id)
+        return health
+
+    def _ewma(self, current, value):
+        return value if current is None else self.alpha * value + (1 - self.alpha) * current
+
+    def observe(self, service_id, ok, ttft=None, tokens_per_second=None):
+        """
+        Update a service's statistics and breaker with the outcome of one call.
+
+        Args:
+            service_id (str): The service ID.
+            ok (bool): True if the call succeeded, False for an error or timeout.
+            ttft (float): Seconds to the first token, if any.
+            tokens_per_second (float): Completion tokens per second after the first token, if known.
+        """
+        with self._lock:
+            health = self._get_health(service_id)
+            health.samples += 1
+            health.error_rate = self._ewma(health.error_rate, 0.0 if ok else 1.0)
+            if ttft is not None:
+                health.ttft = self._ewma(health.ttft, ttft)
+            if tokens_per_second is not None:
+                health.tokens_per_second = self._ewma(health.tokens_per_second, tokens_per_second)
+
+            health.trial_in_flight = False
+            if ok:
+                health.consecutive_failures = 0
+                health.state = CLOSED
+            else:
+                health.consecutive_failures += 1
+                if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                    health.state = OPEN
+                    health.opened_at = time.monotonic()
+
+    def emit(self, record):
+        """
+        Observe a metrics record (see helper_metrics.MetricsRecorder). Cancelled and cached calls
+        say nothing about the service and are ignored.
+        """
+        if record["status"] == "cancelled" or record.get("cached"):
+            # A cancelled trial request frees the half-open breaker for another trial
+            self.release(record["service_id"])
+            return
+        ttft = record["time_to_first_token"]
+        tokens_per_second = None
+        if ttft is not None and record["completion_tokens"] > 1:
+            tokens_per_second = record["completion_tokens"] / max(record["duration"] - ttft, 1e-3)
+        self.observe(record["service_id"], record["status"] == "ok", ttft, tokens_per_second)
+
+    def release(self, service_id):
+        """
+        End the trial request of a half-open service, if one is in flight, without observing an
+        outcome, so the next request can be the trial. Called when a routed request ends, since
+        one that never reached the model (cancelled while queued, or failed building its
+        prompt) records no call.
+        """
+        with self._lock:
+            self._get_health(service_id).trial_in_flight = False
+
+    def _score(self, health):
+        # Expected seconds for a response, inflated by the error rate, plus the weighted cost
+        ttft = health.ttft if health.ttft is not None else 0.0
+        generation = self.expected_tokens / health.tokens_per_second if health.tokens_per_second else 0.0
+        cost = self.costs.get(health.service_id, 0.0) * self.expected_tokens / 1000
+        return (ttft + generation) / max(1.0 - health.error_rate, 0.05) + self.cost_weight * cost
+
+    def choose(self, candidates):
+        """
+        Pick the service for a request.
+
+        Args:
+            candidates (list): The service IDs to choose from, in preference order for ties.
+
+        Returns:
+            dict: The decision: service_id (None if every breaker is open), reason, and the
+                score and breaker state of every candidate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            rows, available = [], []
+            for service_id in candidates:
+                health = self._get_health(service_id)
+
+                # Let a single trial request through once the cooldown has passed
+                if health.state == OPEN and now - health.opened_at >= self.cooldown:
+                    health.state = HALF_OPEN
+                usable = health.state == CLOSED or (health.state == HALF_OPEN and not health.trial_in_flight)
+                score = self._score(health) if health.samples >= self.min_samples else None
+                rows.append({"service_id": service_id, "breaker": health.state, "samples": health.samples, "score": score})
+                if usable:
+                    available.append((health, score))
+
+            if not available:
+                service_id, reason = None, "all circuit breakers open"
+            else:
+                # Send the trial request of a half-open service, then measure unscored services,
+                # then take the best score
+                trials = [health for health, score in available if health.state == HALF_OPEN]
+                unscored = [health for health, score in available if score is None]
+                if trials:
+                    chosen, reason = trials[0], "trial after cooldown"
+                elif unscored:
+                    chosen = min(unscored, key=lambda health: health.samples)
+                    reason = "exploring: too few samples"
+                else:
+                    chosen = min(available, key=lambda item: item[1])[0]
+                    reason = "lowest expected latency/cost"
+                if chosen.state == HALF_OPEN:
+                    chosen.trial_in_flight = True
+                service_id = chosen.service_id
+
+            decision = {"timestamp": time.time(), "service_id": service_id, "reason": reason, "candidates": rows}
+            self._decisions.append(decision)
+            return decision
+
+    def decisions(self):
+        """
+        Return the recent routing decisions, newest first.
+        """
+        with self._lock:
+            return list(reversed(self._decisions))
+
+    def health(self):
+        """
+        Return the statistics and breaker state of every service seen, as a list of dicts.
+        """
+        with self._lock:
+            return [health.as_dict() for health in self._health.values()]
@@ -0,0 +1,144 @@
+# Helper for bounding how many model calls run at once, overall and per endpoint
+
+# Imports
+
+# Standard imports
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class ConcurrencyScheduler:
+    """
+    Admits model calls under a global concurrency cap and a cap per endpoint.
+
+    Calls that can't run yet wait in a FIFO queue; a call for an endpoint with free capacity is
+    not held up by calls queued for a busy endpoint. The scheduler is shared by every session in
+    the process. Streamlit sessions run their own event loops on their own threads, so the state
+    is guarded by a thread lock and waiters are woken on their own loop.
+
+    Args:
+        max_concurrency (int): Maximum calls running at once across all endpoints.
+        default_endpoint_limit (int): Maximum calls running at once per endpoint.
+        endpoint_limits (dict): Per-endpoint overrides of default_endpoint_limit.
+    """
+
+    def __init__(self, max_concurrency=8, default_endpoint_limit=4, endpoint_limits=None):
+        self.max_concurrency = max_concurrency
+        self.default_endpoint_limit = default_endpoint_limit
+        self.endpoint_limits = dict(endpoint_limits or {})
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._running_per_endpoint = {}
+        self._waiters = deque()
+
+        # Statistics
+        self.admitted = 0
+        self.queued = 0
+        self.wait_time = 0.0
+
+    def _has_capacity(self, endpoint):
+        limit = self.endpoint_limits.get(endpoint, self.default_endpoint_limit)
+        return self._running < self.max_concurrency and self._running_per_endpoint.get(endpoint, 0) < limit
+
+    def _take(self, endpoint):
+        self._running += 1
+        self._running_per_endpoint[endpoint] = self._running_per_endpoint.get(endpoint, 0) + 1
+        self.admitted += 1
+
+    def _release(self, endpoint):
+        with self._lock:
+            self._running -= 1
+            self._running_per_endpoint[endpoint] -= 1
+            self._wake()
+
+    def _wake(self):
+        # Admit queued calls in FIFO order, skipping calls whose endpoint is still full
+        for waiter in list(self._waiters):
+            if self._running >= self.max_concurrency:
+                break
+            endpoint, loop, future = waiter
+            if self._has_capacity(endpoint):
+                self._waiters.remove(waiter)
+                self._take(endpoint)
+                try:
+                    loop.call_soon_threadsafe(self._grant, endpoint, future)
+                except RuntimeError:
+                    # The waiter's event loop has closed; give the slot back
+                    self._running -= 1
+                    self._running_per_endpoint[endpoint] -= 1
+
+    def _grant(self, endpoint, future):
+        if future.cancelled():
+            self._release(endpoint)
+        else:
+            future.set_result(None)
+
+    async def acquire(self, endpoint):
+        """
+        Wait until a call to the endpoint may run, and take its slot.
+
+        Returns:
+            float: The seconds spent waiting in the queue.
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._has_capacity(endpoint):
+                self._take(endpoint)
+                return 0.0
+            waiter = (endpoint, loop, loop.create_future())
+            self._waiters.append(waiter)
+            self.queued += 1
+            self._wake()
+
+        try:
+            await waiter[2]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    granted = False
+                else:
+                    granted = waiter[2].done() and not waiter[2].cancelled()
+            if granted:
+                self._release(endpoint)
+            raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.wait_time += waited
+        return waited
+
+    def release(self, endpoint):
+        """
+        Give back the slot taken by acquire.
+        """
+        self._release(endpoint)
+
+    @asynccontextmanager
+    async def slot(self, endpoint):
+        """
+        Async context manager that holds a slot for the endpoint; yields the queue wait in seconds.
+        """
+        waited = await self.acquire(endpoint)
+        try:
+            yield waited
+        finally:
+            self.release(endpoint)
+
+    def stats(self):
+        """
+        Return the scheduler statistics as a dict.
+        """
+        with self._lock:
+            return {
+                "running": self._running,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "avg_wait_ms": self.wait_time / self.queued * 1000 if self.queued else 0.0,
+            }
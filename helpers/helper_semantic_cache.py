@@ -0,0 +1,288 @@
+# Helper for answering paraphrased prompts from a cache of earlier responses, by embedding similarity
+
+# Imports
+
+# Standard imports
+import re
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+# Third-party imports
+import numpy as np
+
+
+# Words dropped when normalizing a prompt
+STOP_WORDS = frozenset("a an and are can could do does for i in is it me my of on or please the this that to would you your".split())
+
+# Share of the similarity that comes from the recent history rather than the prompt itself
+CONTEXT_WEIGHT = 0.25
+
+
+# Normalize a prompt before it is embedded
+def normalize_text(text):
+    """
+    Return the text lowercased, without punctuation, stop words and repeated whitespace.
+    """
+    words = re.sub(r"[^\w\s]", " ", str(text or "").lower()).split()
+    return " ".join(word for word in words if word not in STOP_WORDS)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free local embeddings: hashed words, word pairs and character trigrams.
+
+    Works offline and costs microseconds, but only recognizes prompts worded alike (case,
+    punctuation, filler words, small typos); use a sentence-transformers model for real
+    paraphrases.
+
+    Args:
+        dimensions (int): Length of the embedding vectors.
+    """
+
+    def __init__(self, dimensions=1024):
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        """
+        Return the L2-normalized embeddings of the texts as a (len(texts), dimensions) float32 array.
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = text.split()
+            features = [(f"w:{word}", 1.0) for word in words]
+            features += [(f"b:{first} {second}", 1.0) for first, second in zip(words, words[1:])]
+            for word in words:
+                padded = f"#{word}#"
+                features += [(f"c:{padded[i:i + 3]}", 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, digest % self.dimensions] += weight if digest & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Local embeddings from a sentence-transformers model, which run offline once the model is
+    downloaded. Requires the sentence-transformers package.
+
+    Args:
+        model_name (str): The model name or local path.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name)
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        """
+        Return the L2-normalized embeddings of the texts as a float32 array.
+        """
+        return np.asarray(self._model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+class AzureOpenAIEmbedder:
+    """
+    Embeddings from an Azure OpenAI embedding deployment.
+
+    Args:
+        deployment_name (str): The embedding deployment (e.g. text-embedding-3-small).
+        endpoint (str): The Azure OpenAI endpoint.
+        api_key (str): The API key.
+        api_version (str): The API version.
+    """
+
+    def __init__(self, deployment_name, endpoint, api_key, api_version="2024-02-01"):
+        from openai import AzureOpenAI
+
+        self.deployment_name = deployment_name
+        self._client = AzureOpenAI(azure_endpoint=endpoint, api_key=api_key, api_version=api_version)
+
+    def embed(self, texts):
+        """
+        Return the L2-normalized embeddings of the texts as a float32 array.
+        """
+        response = self._client.embeddings.create(model=self.deployment_name, input=list(texts))
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorIndex:
+    """
+    Fixed-capacity matrix of unit vectors with their responses, searched by cosine similarity.
+
+    The vectors live in one NumPy matrix, so a search is a single matrix product. The matrix
+    doubles as entries are added, up to `capacity` rows; when the index is full, the least
+    recently used entry is replaced.
+
+    Args:
+        dimensions (int): Length of the vectors.
+        capacity (int): Maximum entries.
+    """
+
+    def __init__(self, dimensions, capacity, initial_rows=16):
+        self.capacity = capacity
+        self.count = 0
+        rows = min(capacity, initial_rows)
+        self.vectors = np.zeros((rows, dimensions), dtype=np.float32)
+        self.created = np.zeros(rows)
+        self.accessed = np.zeros(rows)
+        self.responses = [None] * rows
+
+    def _grow(self):
+        # Double the rows, up to capacity
+        rows = min(self.capacity, 2 * len(self.vectors))
+        extra = rows - len(self.vectors)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.created = np.concatenate([self.created, np.zeros(extra)])
+        self.accessed = np.concatenate([self.accessed, np.zeros(extra)])
+        self.responses.extend([None] * extra)
+
+    def search(self, queries, min_created=0.0):
+        """
+        Return (best_rows, best_scores) for a (n, dimensions) array of unit query vectors; entries
+        created before min_created are ignored (score -1).
+        """
+        if self.count == 0:
+            return np.full(len(queries), -1), np.full(len(queries), -1.0)
+        scores = queries @ self.vectors[:self.count].T
+        scores[:, self.created[:self.count] < min_created] = -1.0
+        rows = scores.argmax(axis=1)
+        return rows, scores[np.arange(len(queries)), rows]
+
+    def add(self, vector, response, now):
+        """
+        Add an entry, replacing the least recently used one when the index is full.
+        """
+        if self.count < self.capacity:
+            if self.count == len(self.vectors):
+                self._grow()
+            row = self.count
+            self.count += 1
+        else:
+            row = int(self.accessed.argmin())
+        self.vectors[row] = vector
+        self.created[row] = now
+        self.accessed[row] = now
+        self.responses[row] = response
+        return row
+
+
+class SemanticCache:
+    """
+    Cache of responses looked up by the meaning of the prompt rather than its exact text.
+
+    The normalized prompt and the recent history are embedded separately and joined into one
+    unit vector, weighted so the prompt decides most of the similarity (see CONTEXT_WEIGHT). A
+    stored response is returned when its cosine similarity reaches `threshold`. Each scope (a
+    service plus the system message and settings) has its own index of at most `capacity`
+    entries. Scopes are kept in least recently used order, and when all of them together hold
+    more than `max_entries` entries the least recently used scopes are dropped whole (never the
+    one being stored to). The cache is thread-safe and meant to be shared by every session in
+    the process.
+
+    Args:
+        embedder: Object with an embed(texts) method returning unit vectors (e.g. HashingEmbedder).
+        threshold (float): Minimum cosine similarity for a hit.
+        capacity (int): Maximum entries per scope.
+        ttl (float): Seconds an entry stays valid.
+        max_entries (int): Maximum entries across all scopes.
+    """
+
+    def __init__(self, embedder, threshold=0.9, capacity=2000, ttl=24 * 3600, max_entries=20000):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._entries = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.hit_similarity = 0.0
+        self.evicted_scopes = 0
+
+    def embed(self, prompts, contexts):
+        """
+        Return the query vectors of (prompt, recent history) pairs, one row per pair.
+        """
+        texts = [normalize_text(text) or "-" for text in list(prompts) + list(contexts)]
+        vectors = self.embedder.embed(texts)
+        prompt_vectors, context_vectors = vectors[:len(prompts)], vectors[len(prompts):]
+        return np.hstack([prompt_vectors * np.sqrt(1 - CONTEXT_WEIGHT), context_vectors * np.sqrt(CONTEXT_WEIGHT)])
+
+    def lookup(self, scope, prompt, context=""):
+        """
+        Return (response, similarity, vector) for the most similar stored entry of the scope, with
+        response None on a miss. Pass the vector back to store to avoid embedding twice.
+        """
+        vector = self.embed([prompt], [context])[0]
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is not None:
+                self._indexes.move_to_end(scope)
+                rows, scores = index.search(vector[np.newaxis], min_created=now - self.ttl)
+                row, score = int(rows[0]), float(scores[0])
+                if score >= self.threshold:
+                    index.accessed[row] = now
+                    self.hits += 1
+                    self.hit_similarity += score
+                    return index.responses[row], score, vector
+            self.misses += 1
+            return None, None, vector
+
+    def store(self, scope, prompt, context, response, vector=None):
+        """
+        Store a response for the prompt and recent history in the scope's index.
+        """
+        if not response:
+            return
+        if vector is None:
+            vector = self.embed([prompt], [context])[0]
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                index = self._indexes[scope] = VectorIndex(len(vector), self.capacity)
+            self._indexes.move_to_end(scope)
+            count = index.count
+            index.add(vector, response, time.time())
+            self._entries += index.count - count
+            self._evict(keep=scope)
+
+    def _evict(self, keep):
+        # Drop the least recently used scopes while over max_entries; must hold the lock
+        for scope in list(self._indexes):
+            if self._entries <= self.max_entries:
+                break
+            if scope == keep:
+                continue
+            self._entries -= self._indexes.pop(scope).count
+            self.evicted_scopes += 1
+
+    def stats(self):
+        """
+        Return the cache counters as a dict.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "embedder": type(self.embedder).__name__,
+                "scopes": len(self._indexes),
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "evicted_scopes": self.evicted_scopes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "avg_hit_similarity": self.hit_similarity / self.hits if self.hits else 0.0,
+            }
@@ -5,17 +5,40 @@
 # Standard imports
 import os
 import json
+import time
+import uuid
+import asyncio
+import random
+import logging
+import importlib
+import contextvars
+from functools import partial
+from contextlib import nullcontext
+from collections import namedtuple
 from dotenv import load_dotenv
 
 # Streamlit imports
 import streamlit as st
 
-# SK imports
-import semantic_kernel as sk
-from semantic_kernel.contents.chat_history import ChatHistory
-import semantic_kernel.connectors.ai.open_ai as sk_aoai
-import semantic_kernel.connectors.ai.ollama as sk_ollama
-from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+# Semantic Kernel and its connectors take seconds to import, so they are imported on first use
+# (see _import) rather than here; a session that never calls a model never imports them. The
+# same goes for the service registry (httpx, aiohttp), the Ollama model manager and the semantic
+# cache (numpy), which are imported by the get_* factories that build them.
+
+# Local imports
+from helpers.helper_stream import StreamingRenderer, DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_TOKENS
+from helpers.helper_history import build_prompt_history, count_tokens, message_tokens
+from helpers.helper_compact_history import CompactHistory
+from helpers.helper_cache import CompletionCache, request_key, replay_stream
+from helpers.helper_hedge import HedgeGate, HedgeStats, estimate_latency_saved
+from helpers.helper_router import AdaptiveRouter
+from helpers.helper_scheduler import ConcurrencyScheduler
+from helpers.helper_worker import BackgroundWorker
+from helpers.helper_lifecycle import GenerationTracker, current_generation
+from helpers.helper_admission import AdmissionController, RETRYABLE_STATUS_CODES, error_status
+from helpers.helper_metrics import MetricsRecorder, RingBufferSink, JsonlSink, OpenTelemetrySink
+from helpers.helper_history_store import InMemoryHistoryStore, SqliteHistoryStore
+from helpers.helper_tools import ToolExecutor, ToolCall, tool_definitions
 
 
 # Load settings and keys from .env
@@ -23,107 +46,970 @@ from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecut
 # Assign environment settings and keys to variables
 load_dotenv(override=True)
 
-# gpt-4
-GPT_4_SERVICE_ID = os.getenv("GPT_4_SERVICE_ID")
-GPT_4_AOAI_API_KEY = os.getenv("GPT_4_AOAI_API_KEY")
-GPT_4_AOAI_ENDPOINT = os.getenv("GPT_4_AOAI_ENDPOINT")
-GPT_4_AOAI_API_VERSION = os.getenv("GPT_4_AOAI_API_VERSION")
-GPT_4_AOAI_DEPLOYMENT_NAME = os.getenv("GPT_4_AOAI_DEPLOYMENT_NAME")
+# Path of an optional TOML file listing more chat services (see load_service_specs)
+SERVICES_CONFIG = os.getenv("SERVICES_CONFIG", "services.toml")
+
+# Whether turns evicted from the history window are summarized
+SUMMARIZE_HISTORY = os.getenv("SUMMARIZE_HISTORY", "false").lower() == "true"
+
+# Streaming timeouts in seconds (local Ollama models get longer ones to allow for model loads)
+FIRST_TOKEN_TIMEOUT = float(os.getenv("FIRST_TOKEN_TIMEOUT", "30"))
+STREAM_TIMEOUT = float(os.getenv("STREAM_TIMEOUT", "120"))
+OLLAMA_FIRST_TOKEN_TIMEOUT = float(os.getenv("OLLAMA_FIRST_TOKEN_TIMEOUT", "120"))
+OLLAMA_STREAM_TIMEOUT = float(os.getenv("OLLAMA_STREAM_TIMEOUT", "300"))
+
+# Seconds without a first token from the primary service before a hedged request is sent to the backup service
+HEDGE_AFTER = float(os.getenv("HEDGE_AFTER", "2.0"))
+
+# Automatic routing: seconds of latency one unit of cost (per 1K tokens) is worth, assumed reply length,
+# and the circuit breaker (consecutive failures to open it, seconds before a trial request)
+ROUTER_COST_WEIGHT = float(os.getenv("ROUTER_COST_WEIGHT", "0"))
+ROUTER_EXPECTED_TOKENS = int(os.getenv("ROUTER_EXPECTED_TOKENS", "300"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))
+
+# Call metrics: records kept in memory for the Performance page, plus optional JSONL file and OpenTelemetry
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "5000"))
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "")
+METRICS_OPENTELEMETRY = os.getenv("METRICS_OPENTELEMETRY", "false").lower() == "true"
+
+# Chat history store: "memory" (this process only) or "sqlite" (shared file), memory cap and idle eviction
+HISTORY_STORE = os.getenv("HISTORY_STORE", "memory").lower()
+HISTORY_STORE_PATH = os.getenv("HISTORY_STORE_PATH", ".cache/histories.sqlite")
+HISTORY_MEMORY_CAP_MB = float(os.getenv("HISTORY_MEMORY_CAP_MB", "256"))
+HISTORY_IDLE_TTL = float(os.getenv("HISTORY_IDLE_TTL", "3600"))
+HISTORY_RETENTION = float(os.getenv("HISTORY_RETENTION", str(7 * 24 * 3600)))
+
+# Concurrent model calls allowed overall and per endpoint (local Ollama models share one machine)
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", "16"))
+ENDPOINT_CONCURRENT_CALLS = int(os.getenv("ENDPOINT_CONCURRENT_CALLS", "8"))
+OLLAMA_ENDPOINT_CONCURRENT_CALLS = int(os.getenv("OLLAMA_ENDPOINT_CONCURRENT_CALLS", "1"))
+
+# Azure OpenAI quota per deployment (0 = no client-side limit), and retries of rate-limited or failed
+# calls that produced no output (the OpenAI client's own retries are off so sessions back off together)
+AZURE_REQUESTS_PER_MINUTE = int(os.getenv("AZURE_REQUESTS_PER_MINUTE", "0"))
+AZURE_TOKENS_PER_MINUTE = int(os.getenv("AZURE_TOKENS_PER_MINUTE", "0"))
+MODEL_CALL_RETRIES = int(os.getenv("MODEL_CALL_RETRIES", "2"))
+
+# Local Ollama models: warm-up at startup, keep-alive pings and residency tracking (true/false), how long
+# Ollama keeps a model loaded, seconds between pings and residency checks, and models an endpoint holds at once
+OLLAMA_MODEL_MANAGER = os.getenv("OLLAMA_MODEL_MANAGER", "true").lower() == "true"
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PING_INTERVAL = float(os.getenv("OLLAMA_PING_INTERVAL", "240"))
+OLLAMA_PS_INTERVAL = float(os.getenv("OLLAMA_PS_INTERVAL", "15"))
+OLLAMA_MAX_LOADED_MODELS = int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "1"))
+
+# Seconds a finished background generation is kept for a session that hasn't come back to show it
+BACKGROUND_RESULT_TTL = float(os.getenv("BACKGROUND_RESULT_TTL", "3600"))
 
-# gpt-3.5
-GPT_3_5_SERVICE_ID = os.getenv("GPT_3_5_SERVICE_ID")
-GPT_3_5_AOAI_API_KEY = os.getenv("GPT_3_5_AOAI_API_KEY")
-GPT_3_5_AOAI_ENDPOINT = os.getenv("GPT_3_5_AOAI_ENDPOINT")
-GPT_3_5_AOAI_API_VERSION = os.getenv("GPT_3_5_AOAI_API_VERSION")
-GPT_3_5_AOAI_DEPLOYMENT_NAME = os.getenv("GPT_3_5_AOAI_DEPLOYMENT_NAME")
+# Generation lifecycle: seconds a session may have no open tab before its generations are cancelled, and how often that is checked
+GENERATION_ORPHAN_GRACE = float(os.getenv("GENERATION_ORPHAN_GRACE", "30"))
+GENERATION_REAP_INTERVAL = float(os.getenv("GENERATION_REAP_INTERVAL", "5"))
 
-# phi-3
-PHI3_MINI_OLLAMA_SERVICE_ID = os.getenv("PHI3_MINI_OLLAMA_SERVICE_ID")
-PHI3_MINI_OLLAMA_MODEL_ID = os.getenv("PHI3_MINI_OLLAMA_MODEL_ID")
-PHI3_MINI_OLLAMA_URL = os.getenv("PHI3_MINI_OLLAMA_URL")
+# Completion cache for identical requests (opt-in)
+COMPLETION_CACHE = os.getenv("COMPLETION_CACHE", "false").lower() == "true"
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", ".cache/completions.sqlite")
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "86400"))
+COMPLETION_CACHE_MEMORY_ENTRIES = int(os.getenv("COMPLETION_CACHE_MEMORY_ENTRIES", "256"))
+COMPLETION_CACHE_DISK_ENTRIES = int(os.getenv("COMPLETION_CACHE_DISK_ENTRIES", "10000"))
 
-# mixtral
-MIXTRAL_8x7B_OLLAMA_SERVICE_ID = os.getenv("MIXTRAL_8x7B_OLLAMA_SERVICE_ID")
-MIXTRAL_8x7B_OLLAMA_MODEL_ID = os.getenv("MIXTRAL_8x7B_OLLAMA_MODEL_ID")
-MIXTRAL_8x7B_OLLAMA_URL = os.getenv("MIXTRAL_8x7B_OLLAMA_URL")
+# Semantic cache answering paraphrased prompts (opt-in); embeddings: "hashing" (local, near-duplicates only),
+# "sentence_transformers" (local model, offline once downloaded) or "azure_openai" (embedding deployment)
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_EMBEDDINGS = os.getenv("SEMANTIC_CACHE_EMBEDDINGS", "hashing").lower()
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_CACHE_AOAI_ENDPOINT = os.getenv("SEMANTIC_CACHE_AOAI_ENDPOINT")
+SEMANTIC_CACHE_AOAI_API_KEY = os.getenv("SEMANTIC_CACHE_AOAI_API_KEY")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "2000"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+SEMANTIC_CACHE_HISTORY_MESSAGES = int(os.getenv("SEMANTIC_CACHE_HISTORY_MESSAGES", "2"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
 
+# Tool calling: model rounds before the model must answer in text, default seconds per tool call, pool sizes
+# for CPU-bound plugins, and memoized tool results (entries and seconds they stay valid)
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "10"))
+TOOL_THREAD_WORKERS = int(os.getenv("TOOL_THREAD_WORKERS", "8"))
+TOOL_PROCESS_WORKERS = int(os.getenv("TOOL_PROCESS_WORKERS", "2"))
+TOOL_CACHE_ENTRIES = int(os.getenv("TOOL_CACHE_ENTRIES", "1024"))
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+
+# System message used to summarize the turns evicted from the history window
+HISTORY_SUMMARY_SYSTEM_MESSAGE = "Summarize the conversation below in a few sentences. Keep facts, names, decisions and open questions. Reply with the summary only."
+
+# The process-wide objects a generation uses (see get_resources)
+Resources = namedtuple("Resources", "registry completion_cache semantic_cache scheduler admission_controller model_manager metrics router hedge_stats tool_executor")
+
+# A streaming request ready to send (see prepare_streaming_request)
+StreamingRequest = namedtuple("StreamingRequest", "chat_settings chat use_tools cached save")
+
+# The Resources passed to the running generation (inherited by the tasks it starts)
+_resources = contextvars.ContextVar("resources", default=None)
+
+
+
+# Import a module on first use
+def _import(module_name):
+    """
+    Return the named module, importing it on first use (later calls are a dict lookup).
+    """
+    return importlib.import_module(module_name)
 
 
 # Return a new chat history
 def new_chat_history():
     """
-    Return a new chat history.
+    Return a new chat history (a CompactHistory, see helper_compact_history).
     """
-    return ChatHistory()
+    return CompactHistory()
 
 
-# Initialize the application chat services.
-def initialize_chat_services():
+# Get the process-wide chat history store
+@st.cache_resource
+def get_history_store():
     """
-    Initialize the chat services for the application.
+    Return the store that holds the chat histories of all sessions (see HISTORY_STORE).
+    """
+    max_bytes = int(HISTORY_MEMORY_CAP_MB * 1024 * 1024)
+    if HISTORY_STORE == "sqlite":
+        return SqliteHistoryStore(HISTORY_STORE_PATH, max_bytes=max_bytes, idle_ttl=HISTORY_IDLE_TTL, retention=HISTORY_RETENTION)
+    return InMemoryHistoryStore(max_bytes=max_bytes, idle_ttl=HISTORY_IDLE_TTL)
+
 
-    For each model (chat service) that is to be initialized, the following steps are taken:
+# Get the ID of the current session
+def get_session_id():
+    """
+    Return the ID the current session's chat histories are stored under.
 
-    1. Create the chat service.
-    2. Add the chat service to the kernel.
-    3. Add the chat service to the session state.
-    4. Add the service name to the chat_services list in the session state.
+    The ID is kept in the "sid" query parameter, so a browser reconnect, or a request served by
+    another server replica sharing the history store, finds the same conversations.
+    """
+    session_id = st.query_params.get("sid")
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        st.query_params["sid"] = session_id
+    return session_id
 
-    Each chat service is stored in the session state with the service name as a key.
-    A list of chat services is stored in the session state as chat_services.
 
+# Get a chat history of the current session
+def get_chat_history(name):
+    """
+    Return the chat history stored under the name for the current session, loading it on
+    demand and creating it on first use.
+    """
+    store = get_history_store()
+    chat_history = store.get(get_session_id(), name)
+    if chat_history is None:
+        chat_history = new_chat_history()
+        store.put(get_session_id(), name, chat_history)
+    return chat_history
+
+
+# Save a chat history of the current session
+def save_chat_history(name, chat_history):
+    """
+    Save a chat history under the name for the current session.
+    """
+    get_history_store().put(get_session_id(), name, chat_history)
+
+
+# Reset a chat history of the current session
+def reset_chat_history(name):
+    """
+    Remove the chat history stored under the name for the current session, and cancel its
+    background generation, if any.
+    """
+    cancel_generation(name, "reset")
+    get_generation_worker().cancel(get_session_id(), name)
+    get_history_store().delete(get_session_id(), name)
+
+
+# Build the Azure OpenAI chat service on a shared connection pool
+def _create_azure_chat_service(pool, service_id, deployment_name, endpoint, api_key, api_version=None):
+    """
+    Create an Azure OpenAI chat service whose HTTP client comes from the endpoint's shared pool.
+    """
+    openai = _import("openai")
+    sk_aoai = _import("semantic_kernel.connectors.ai.open_ai")
+    async_client = openai.AsyncAzureOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version or _import("semantic_kernel.connectors.ai.open_ai.const").DEFAULT_AZURE_API_VERSION,
+        http_client=pool.httpx_client(),
+        max_retries=0, # Retried by run_streaming_response, through the admission controller
+    )
+    return sk_aoai.AzureChatCompletion(service_id=service_id, deployment_name=deployment_name, async_client=async_client)
+
+
+# Build the Ollama chat service on a shared connection pool
+def _create_ollama_chat_service(pool, service_id, ai_model_id, url):
+    """
+    Create an Ollama chat service whose aiohttp session comes from the endpoint's shared pool.
+    """
+    sk_ollama = _import("semantic_kernel.connectors.ai.ollama")
+    return sk_ollama.OllamaChatCompletion(service_id=service_id, ai_model_id=ai_model_id, url=url, session=pool.aiohttp_session())
+
+
+# Chat service providers: the factory, the spec field holding the URL, the required spec fields
+# and the default per-service options
+PROVIDERS = {
+    "azure_openai": {
+        "factory": _create_azure_chat_service,
+        "url_field": "endpoint",
+        "model_field": "deployment_name",
+        "required": ("service_id", "deployment_name", "endpoint", "api_key"),
+        "options": {"first_token_timeout": FIRST_TOKEN_TIMEOUT, "stream_timeout": STREAM_TIMEOUT,
+                    "requests_per_minute": AZURE_REQUESTS_PER_MINUTE, "tokens_per_minute": AZURE_TOKENS_PER_MINUTE},
+    },
+    "ollama": {
+        "factory": _create_ollama_chat_service,
+        "url_field": "url",
+        "model_field": "ai_model_id",
+        "required": ("service_id", "ai_model_id", "url"),
+        "options": {"first_token_timeout": OLLAMA_FIRST_TOKEN_TIMEOUT, "stream_timeout": OLLAMA_STREAM_TIMEOUT, "endpoint_concurrency": OLLAMA_ENDPOINT_CONCURRENT_CALLS},
+    },
+}
+
+# Per-service options a spec may set
+SERVICE_OPTIONS = ("history_token_budget", "summarize_history", "first_token_timeout", "stream_timeout", "endpoint_concurrency", "hedge_after", "cost_per_1k_tokens",
+                   "requests_per_minute", "tokens_per_minute")
+
+# Chat services configured with .env variables: the provider, the spec field read from each
+# variable, and the default history token budget
+ENV_SERVICE_SPECS = [
+    # AOAI GPT-4
+    {"provider": "azure_openai", "history_token_budget": ("GPT_4_HISTORY_TOKEN_BUDGET", 16000), "fields": {
+        "service_id": "GPT_4_SERVICE_ID", "api_key": "GPT_4_AOAI_API_KEY", "endpoint": "GPT_4_AOAI_ENDPOINT",
+        "api_version": "GPT_4_AOAI_API_VERSION", "deployment_name": "GPT_4_AOAI_DEPLOYMENT_NAME"}},
+
+    # AOAI GPT-3.5
+    {"provider": "azure_openai", "history_token_budget": ("GPT_3_5_HISTORY_TOKEN_BUDGET", 8000), "fields": {
+        "service_id": "GPT_3_5_SERVICE_ID", "api_key": "GPT_3_5_AOAI_API_KEY", "endpoint": "GPT_3_5_AOAI_ENDPOINT",
+        "api_version": "GPT_3_5_AOAI_API_VERSION", "deployment_name": "GPT_3_5_AOAI_DEPLOYMENT_NAME"}},
+
+    # OLLAMA PHI-3
+    {"provider": "ollama", "history_token_budget": ("PHI3_MINI_HISTORY_TOKEN_BUDGET", 2000), "fields": {
+        "service_id": "PHI3_MINI_OLLAMA_SERVICE_ID", "ai_model_id": "PHI3_MINI_OLLAMA_MODEL_ID", "url": "PHI3_MINI_OLLAMA_URL"}},
+
+    # OLLAMA MIXTRAL 8x7B
+    {"provider": "ollama", "history_token_budget": ("MIXTRAL_8x7B_HISTORY_TOKEN_BUDGET", 16000), "fields": {
+        "service_id": "MIXTRAL_8x7B_OLLAMA_SERVICE_ID", "ai_model_id": "MIXTRAL_8x7B_OLLAMA_MODEL_ID", "url": "MIXTRAL_8x7B_OLLAMA_URL"}},
+]
+
+
+# Kernel plugins the models can call in tool mode: the plugin class (imported when the kernel is
+# built), how its functions run (async on the event loop, or in a thread or process pool), the
+# seconds a call may take and whether its results are memoized
+TOOL_PLUGINS = [
+    {"plugin_name": "math", "class": "helpers.helper_plugins.MathPlugin", "mode": "process", "timeout": 5, "memoize": True},
+    {"plugin_name": "time", "class": "helpers.helper_plugins.TimePlugin", "mode": "async", "timeout": 2, "memoize": False},
+]
+
+# Providers whose connectors support tool calls
+TOOL_PROVIDERS = ("azure_openai",)
+
+
+# Build a plugin object from its class path
+def _create_plugin(class_path):
+    """
+    Return a new instance of the plugin class at "module.Class", importing the module on first use.
+    """
+    module_name, class_name = class_path.rsplit(".", 1)
+    return getattr(_import(module_name), class_name)()
+
+
+# Read the chat service specs from .env and the services TOML file
+def load_service_specs(config_path=SERVICES_CONFIG):
+    """
+    Return the list of chat service specs, from the .env variables (ENV_SERVICE_SPECS) followed
+    by the [[services]] tables of the TOML file at config_path, if it exists.
+
+    A spec is a dict with a provider (a key of PROVIDERS), the provider's fields (service_id,
+    endpoint, ...) and optional per-service options (SERVICE_OPTIONS). In the TOML file, a field
+    ending in "_env" is read from that environment variable, so keys can stay in .env:
+
+        [[services]]
+        provider = "azure_openai"
+        service_id = "gpt-4o"
+        deployment_name = "gpt-4o"
+        endpoint = "https://example.openai.azure.com/"
+        api_key_env = "GPT_4O_AOAI_API_KEY"
+        history_token_budget = 16000
+    """
+    specs = []
+    for env_spec in ENV_SERVICE_SPECS:
+        spec = {"provider": env_spec["provider"]}
+        spec.update({field: os.getenv(variable) for field, variable in env_spec["fields"].items()})
+        variable, default = env_spec["history_token_budget"]
+        spec["history_token_budget"] = int(os.getenv(variable, str(default)))
+        specs.append(spec)
+
+    if config_path and os.path.exists(config_path):
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(config_path, "rb") as file:
+            config = tomllib.load(file)
+        for table in config.get("services", []):
+            spec = {}
+            for field, value in table.items():
+                if field.endswith("_env"):
+                    spec[field[:-len("_env")]] = os.getenv(value)
+                else:
+                    spec[field] = value
+            specs.append(spec)
+
+    return specs
+
+
+# Get the process-wide chat service registry
+@st.cache_resource
+def get_service_registry():
+    """
+    Return the chat service registry shared by every session in the server process.
+
+    The registry is built once (cached with st.cache_resource) from the service specs (see
+    load_service_specs); specs missing a required field are skipped. Registering a service
+    only records its factory: the provider's connector is imported and the service is built
+    when it is first used, and services on the same endpoint share one bounded keep-alive
+    connection pool.
+    """
+    registry = _import("helpers.helper_pool").ServiceRegistry()
+    for spec in load_service_specs():
+        provider = PROVIDERS.get(spec.get("provider"))
+        if provider is None:
+            logging.error(f"Chat service {spec.get('service_id')}: unknown provider {spec.get('provider')!r}.")
+            continue
+        if not all(spec.get(field) for field in provider["required"]):
+            continue
+        fields = {field: value for field, value in spec.items() if field != "provider" and field not in SERVICE_OPTIONS}
+        options = {"provider": spec["provider"], "model": spec[provider["model_field"]], "summarize_history": SUMMARIZE_HISTORY, **provider["options"]}
+        options.update({option: spec[option] for option in SERVICE_OPTIONS if option in spec})
+        registry.register(spec["service_id"], spec[provider["url_field"]], partial(provider["factory"], **fields), **options)
+
+    for plugin in TOOL_PLUGINS:
+        registry.register_plugin(plugin["plugin_name"], partial(_create_plugin, plugin["class"]))
+
+    return registry
+
+
+# Initialize the application chat services.
+def initialize_chat_services():
+    """
+    Initialize the chat services for the session.
+
+    The chat services themselves live in the process-wide registry (see get_service_registry);
+    the session only keeps the list of available service names as chat_services.
+    Use get_chat_service to get a service by name.
     """
 
     # Initialize only if not already initialized
     if "chat_services" not in st.session_state:
+        st.session_state.chat_services = get_service_registry().service_ids()
 
-        # Initialize the kernel
-        if "kernel" not in st.session_state:  
-            st.session_state.kernel = sk.Kernel()
-
-        # Initialize list of chat services
-        st.session_state.chat_services = []
-
-        # AOAI GPT-4
-        # Create the chat service and add it to the kernel, then add the service to the session state, and the service name to the chat_services list
-        if GPT_4_SERVICE_ID and GPT_4_AOAI_API_KEY and GPT_4_AOAI_ENDPOINT and GPT_4_AOAI_DEPLOYMENT_NAME:
-            chat_service = sk_aoai.AzureChatCompletion(service_id=GPT_4_SERVICE_ID, deployment_name=GPT_4_AOAI_DEPLOYMENT_NAME, endpoint=GPT_4_AOAI_ENDPOINT, api_key=GPT_4_AOAI_API_KEY)
-            st.session_state.kernel.add_service(chat_service)
-            st.session_state[f"{GPT_4_SERVICE_ID}_service"] = chat_service
-            st.session_state.chat_services.append(GPT_4_SERVICE_ID)
-
-        # AOAI GPT-3.5
-        # Create the chat service and add it to the kernel, then add the service to the session state, and the service name to the chat_services list
-        if GPT_3_5_SERVICE_ID and GPT_3_5_AOAI_API_KEY and GPT_3_5_AOAI_ENDPOINT and GPT_3_5_AOAI_DEPLOYMENT_NAME:
-            chat_service = sk_aoai.AzureChatCompletion(service_id=GPT_3_5_SERVICE_ID, deployment_name=GPT_3_5_AOAI_DEPLOYMENT_NAME, endpoint=GPT_3_5_AOAI_ENDPOINT, api_key=GPT_3_5_AOAI_API_KEY)
-            st.session_state.kernel.add_service(chat_service)
-            st.session_state[f"{GPT_3_5_SERVICE_ID}_service"] = chat_service
-            st.session_state.chat_services.append(GPT_3_5_SERVICE_ID)
-
-        # OLLAMA PHI-3
-        # Create the chat service and add it to the kernel, then add the service to the session state, and the service name to the chat_services list
-        if PHI3_MINI_OLLAMA_SERVICE_ID and PHI3_MINI_OLLAMA_MODEL_ID and PHI3_MINI_OLLAMA_URL:
-            chat_service = sk_ollama.OllamaChatCompletion(service_id=PHI3_MINI_OLLAMA_SERVICE_ID,  ai_model_id=PHI3_MINI_OLLAMA_MODEL_ID, url=PHI3_MINI_OLLAMA_URL)
-            st.session_state.kernel.add_service(chat_service)
-            st.session_state[f"{PHI3_MINI_OLLAMA_SERVICE_ID}_service"] = chat_service
-            st.session_state.chat_services.append(PHI3_MINI_OLLAMA_SERVICE_ID)
-
-        # OLLAMA MIXTRAL 8x7B
-        # Create the chat service and add it to the kernel, then add the service to the session state, and the service name to the chat_services list
-        if MIXTRAL_8x7B_OLLAMA_SERVICE_ID and MIXTRAL_8x7B_OLLAMA_MODEL_ID and MIXTRAL_8x7B_OLLAMA_URL:
-            chat_service = sk_ollama.OllamaChatCompletion(service_id=MIXTRAL_8x7B_OLLAMA_SERVICE_ID,  ai_model_id=MIXTRAL_8x7B_OLLAMA_MODEL_ID, url=MIXTRAL_8x7B_OLLAMA_URL)
-            st.session_state.kernel.add_service(chat_service)
-            st.session_state[f"{MIXTRAL_8x7B_OLLAMA_SERVICE_ID}_service"] = chat_service
-            st.session_state.chat_services.append(MIXTRAL_8x7B_OLLAMA_SERVICE_ID)
+        # Start warming the local models with the first session
+        get_model_manager()
 
 
+# Get a chat service by name
+def get_chat_service(service_id):
+    """
+    Return the shared chat service for the given service ID, or None if it is not configured.
+    """
+    return _current_resources().registry.get_service(service_id)
+
+
+# Get the kernel with the tool plugins added
+def get_kernel():
+    """
+    Return the shared kernel with the tool plugins added, which runs the models' tool calls.
+    """
+    return _current_resources().registry.get_kernel()
+
+
+# Get the process-wide tool executor
+@st.cache_resource
+def get_tool_executor():
+    """
+    Return the executor that runs the models' tool calls, configured from TOOL_PLUGINS (see
+    helper_tools.ToolExecutor).
+    """
+    plugin_options = {plugin["plugin_name"]: {"mode": plugin["mode"], "timeout": plugin["timeout"], "memoize": plugin["memoize"]} for plugin in TOOL_PLUGINS}
+    preload = {plugin["class"].rsplit(".", 1)[0] for plugin in TOOL_PLUGINS if plugin["mode"] == "process"}
+    return ToolExecutor(plugin_options, default_timeout=TOOL_TIMEOUT, max_threads=TOOL_THREAD_WORKERS, max_processes=TOOL_PROCESS_WORKERS,
+                        cache_entries=TOOL_CACHE_ENTRIES, cache_ttl=TOOL_CACHE_TTL, preload=sorted(preload))
+
+
+# Check whether a service can call tools
+def supports_tools(service_id):
+    """
+    Return whether the service's connector supports tool calls (see TOOL_PROVIDERS).
+    """
+    return _current_resources().registry.get_options(service_id).get("provider") in TOOL_PROVIDERS
+
+
+# Close the clients used by the current script run
+async def release_event_loop_clients():
+    """
+    Close the shared clients created for the running event loop.
+
+    Clients are bound to the event loop that created them, so they must be closed before the
+    loop ends (e.g. at the end of an asyncio.run of a batch script). The Streamlit app runs its
+    model calls on the background worker's loop instead, whose clients live for the process.
+    """
+    await get_service_registry().close_loop_clients()
+
+
+# Get the process-wide completion cache
+@st.cache_resource
+def get_completion_cache():
+    """
+    Return the completion cache shared by every session, or None if caching is not enabled
+    (set COMPLETION_CACHE="true" in .env to enable it).
+    """
+    if not COMPLETION_CACHE:
+        return None
+    return CompletionCache(
+        path=COMPLETION_CACHE_PATH or None,
+        max_memory_entries=COMPLETION_CACHE_MEMORY_ENTRIES,
+        max_disk_entries=COMPLETION_CACHE_DISK_ENTRIES,
+        ttl=COMPLETION_CACHE_TTL,
+    )
+
+
+# Get the process-wide semantic cache
+@st.cache_resource
+def get_semantic_cache():
+    """
+    Return the semantic cache shared by every session, or None if it is not enabled (set
+    SEMANTIC_CACHE="true" in .env) or its embeddings are not available.
+    """
+    if not SEMANTIC_CACHE:
+        return None
+    semantic_cache = _import("helpers.helper_semantic_cache")
+    try:
+        if SEMANTIC_CACHE_EMBEDDINGS == "sentence_transformers":
+            embedder = semantic_cache.SentenceTransformerEmbedder(SEMANTIC_CACHE_EMBEDDING_MODEL)
+        elif SEMANTIC_CACHE_EMBEDDINGS == "azure_openai":
+            embedder = semantic_cache.AzureOpenAIEmbedder(SEMANTIC_CACHE_EMBEDDING_MODEL, SEMANTIC_CACHE_AOAI_ENDPOINT, SEMANTIC_CACHE_AOAI_API_KEY)
+        else:
+            embedder = semantic_cache.HashingEmbedder()
+    except ImportError as e:
+        logging.error(f"SEMANTIC_CACHE is enabled but its {SEMANTIC_CACHE_EMBEDDINGS} embeddings are not available: {e}")
+        return None
+    return semantic_cache.SemanticCache(embedder, threshold=SEMANTIC_CACHE_THRESHOLD, capacity=SEMANTIC_CACHE_CAPACITY, ttl=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_MAX_ENTRIES)
+
+
+# Get the process-wide concurrency scheduler
+@st.cache_resource
+def get_scheduler():
+    """
+    Return the scheduler that bounds concurrent model calls across all sessions, overall
+    (MAX_CONCURRENT_CALLS) and per endpoint (ENDPOINT_CONCURRENT_CALLS, or the service's
+    endpoint_concurrency option).
+    """
+    registry = get_service_registry()
+    endpoint_limits = {}
+    for service_id in registry.service_ids():
+        limit = registry.get_options(service_id).get("endpoint_concurrency")
+        if limit:
+            endpoint_limits[registry.get_pool(service_id).endpoint] = limit
+    return ConcurrencyScheduler(MAX_CONCURRENT_CALLS, ENDPOINT_CONCURRENT_CALLS, endpoint_limits)
+
+
+# Get the process-wide admission controller
+@st.cache_resource
+def get_admission_controller():
+    """
+    Return the controller that keeps model calls within each deployment's quota across all
+    sessions, from the services' requests_per_minute and tokens_per_minute options
+    (AZURE_REQUESTS_PER_MINUTE and AZURE_TOKENS_PER_MINUTE for Azure OpenAI services). Each
+    service is one deployment, so quotas are keyed by service ID.
+    """
+    registry = get_service_registry()
+    limits = {}
+    for service_id in registry.service_ids():
+        options = registry.get_options(service_id)
+        limits[service_id] = (options.get("requests_per_minute"), options.get("tokens_per_minute"))
+    return AdmissionController(limits)
+
+
+# Estimate the tokens a request counts against the quota
+def estimate_request_tokens(service_id, system_message, chat_history, user_input, max_tokens=2000):
+    """
+    Return the estimated prompt tokens of a request (within the service's history token budget)
+    plus its max_tokens, which is what the deployment's tokens-per-minute quota is charged.
+    """
+    prompt_tokens = sum(message_tokens(message) for message in chat_history.messages) if chat_history else 0
+    token_budget = _current_resources().registry.get_options(service_id).get("history_token_budget")
+    if token_budget:
+        prompt_tokens = min(prompt_tokens, token_budget)
+    return prompt_tokens + count_tokens(system_message or "") + count_tokens(user_input or "") + max_tokens
+
+
+# Get the process-wide background generation worker
+@st.cache_resource
+def get_generation_worker():
+    """
+    Return the worker that runs generations on its own event loop thread: the process's
+    long-lived event loop, on which the chat services and their connection pools are built
+    once and shared (see run_generation), and on which generations can outlive Streamlit
+    reruns (see start_background_response).
+    """
+    return BackgroundWorker(idle_ttl=BACKGROUND_RESULT_TTL)
+
+
+# Get the process-wide generation tracker
+@st.cache_resource
+def get_generation_tracker():
+    """
+    Return the tracker that gives every generation an ID and a cancellation token, cancels
+    superseded generations, and counts the tokens they wasted and saved (see
+    helper_lifecycle.GenerationTracker).
+
+    Generations of sessions with no open tab for GENERATION_ORPHAN_GRACE seconds are cancelled
+    by a reaper on the background worker's event loop.
+    """
+    tracker = GenerationTracker(orphan_grace=GENERATION_ORPHAN_GRACE, expected_tokens=ROUTER_EXPECTED_TOKENS)
+    get_generation_worker().submit(tracker.run_reaper(_is_tab_connected, GENERATION_REAP_INTERVAL))
+    return tracker
+
+
+# Check whether a browser tab is still connected
+def _is_tab_connected(client_id):
+    """
+    Return whether the Streamlit session (browser tab) is connected; True when running
+    without the Streamlit server (e.g. under AppTest), where it can't be known.
+    """
+    runtime = _import("streamlit.runtime")
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(client_id)
+
+
+# Record the browser tab showing the current session
+def touch_session():
+    """
+    Record that the current browser tab shows the session, so the session's background
+    generations are not cancelled as orphaned while it stays connected.
+    """
+    ctx = _import("streamlit.runtime.scriptrunner").get_script_run_ctx()
+    if ctx is not None:
+        get_generation_tracker().touch(get_session_id(), ctx.session_id)
+
+
+# Cancel the generation of a chat history
+def cancel_generation(history_name, reason="cancelled", wait=None):
+    """
+    Cancel the current session's running generation for the chat history, if any, and close
+    its HTTP connections.
+
+    Args:
+        history_name (str): The chat history name.
+        reason (str): Why it is cancelled ("superseded", "reset", ...), as counted in the tracker.
+        wait (float): Seconds to wait for the generation to end, or None not to wait.
+
+    Returns:
+        GenerationToken: The cancelled generation's token, or None.
+    """
+    return get_generation_tracker().cancel(get_session_id(), history_name, reason, wait)
+
+
+# Run a generation of the script run in its own task, under a cancellation token
+async def run_generation(history_name, service_id, generate, response_holder):
+    """
+    Run a generation of the current script run on the background worker's event loop and
+    render it into the response holder (see BackgroundWorker.run). The chat services, HTTP
+    clients and connection pools live on that loop for the whole process, so a turn reuses
+    the warm connections of earlier turns, reruns and sessions.
+
+    The generation is tracked under the chat history name by the generation tracker: a newer
+    generation for the same chat history cancels it and closes its HTTP connections, and so
+    does Streamlit stopping the script run.
+
+    Args:
+        history_name (str): The chat history the generation answers.
+        service_id (str): The service generating the response (or "auto").
+        generate (callable): Called on the worker's loop with the response holder to write to;
+            returns the generation coroutine (e.g. run_streaming_response). Chat services must be
+            looked up inside it (get_chat_service), since they are bound to the loop they were built on.
+            The process-wide objects it uses are resolved here, on the script thread (see get_resources).
+        response_holder: The placeholder of the script run the response is shown in.
+
+    Returns:
+        dict: The coroutine's result, or, if the tracker cancelled it, a result with no output
+            and the cancellation reason as its status.
+    """
+    session_id = get_session_id()
+    tracker = get_generation_tracker()
+    resources = get_resources()
+
+    async def tracked(buffer):
+        _resources.set(resources)
+        started = time.perf_counter()
+        async with tracker.generation(session_id, history_name, service_id) as token:
+            try:
+                return await generate(buffer)
+            except asyncio.CancelledError:
+                if token.reason in (None, "interrupted"):
+                    # Not cancelled by the tracker: the script run awaiting the generation has stopped
+                    token.cancel("interrupted")
+                    raise
+        return {"output": "", "status": token.reason, "error": None, "time_to_first_token": None,
+                "total_time": time.perf_counter() - started, "service_id": service_id}
+
+    return await get_generation_worker().run(tracked, response_holder)
+
+
+# Get the process-wide Ollama model manager
+@st.cache_resource
+def get_model_manager():
+    """
+    Return the manager that keeps the Ollama services' models ready and orders the calls to
+    each Ollama endpoint by model (see helper_ollama.OllamaModelManager).
+
+    Unless OLLAMA_MODEL_MANAGER is "false", the manager warms the models and then tracks
+    residency and sends keep-alive pings on the background worker's event loop.
+    """
+    registry = get_service_registry()
+    services = {
+        service_id: (registry.get_pool(service_id).endpoint, registry.get_options(service_id)["model"])
+        for service_id in registry.service_ids()
+        if registry.get_options(service_id).get("provider") == "ollama"
+    }
+    manager = _import("helpers.helper_ollama").OllamaModelManager(services, keep_alive=OLLAMA_KEEP_ALIVE, ping_interval=OLLAMA_PING_INTERVAL,
+                                                                   refresh_interval=OLLAMA_PS_INTERVAL, max_loaded=OLLAMA_MAX_LOADED_MODELS)
+    if OLLAMA_MODEL_MANAGER and services:
+        get_generation_worker().submit(manager.run())
+    return manager
+
+
+# Get the process-wide hedging statistics
+@st.cache_resource
+def get_hedge_stats():
+    """
+    Return the hedged request counters shared by every session (see run_hedged_streaming_response).
+    """
+    return HedgeStats()
+
+
+# Get the process-wide adaptive router
+@st.cache_resource
+def get_router():
+    """
+    Return the router that picks a chat service per request in automatic mode (see
+    run_routed_streaming_response). Service costs come from the cost_per_1k_tokens option.
+    """
+    registry = get_service_registry()
+    costs = {service_id: registry.get_options(service_id).get("cost_per_1k_tokens", 0.0) for service_id in registry.service_ids()}
+    return AdaptiveRouter(costs, cost_weight=ROUTER_COST_WEIGHT, expected_tokens=ROUTER_EXPECTED_TOKENS, failure_threshold=ROUTER_FAILURE_THRESHOLD, cooldown=ROUTER_COOLDOWN)
 
-# Generate streaming response
-async def generate_streaming_response(response_holder, chat_service, system_message, chat_history, user_input, **kwargs):
 
+# Get the process-wide metrics recorder
+@st.cache_resource
+def get_metrics():
+    """
+    Return the recorder that every chat call reports its latency and token counts to.
+
+    Records always go to an in-memory ring buffer (METRICS_BUFFER_SIZE) and to the adaptive
+    router (see get_router), and also to a JSONL
+    file if METRICS_JSONL_PATH is set and to OpenTelemetry if METRICS_OPENTELEMETRY is "true".
+    """
+    sinks = [RingBufferSink(METRICS_BUFFER_SIZE), get_router()]
+    if METRICS_JSONL_PATH:
+        sinks.append(JsonlSink(METRICS_JSONL_PATH))
+    if METRICS_OPENTELEMETRY:
+        try:
+            sinks.append(OpenTelemetrySink())
+        except ImportError:
+            logging.error("METRICS_OPENTELEMETRY is enabled but opentelemetry-api is not installed.")
+    return MetricsRecorder(sinks)
+
+
+# Resolve the process-wide objects a generation uses
+def get_resources():
+    """
+    Return the Resources a generation uses, from the st.cache_resource getters.
+
+    Streamlit's cache functions expect to be called from a script run, so this is called on the
+    script thread and the result is passed into the generation run on the background worker's
+    thread (see run_generation and start_background_response), which never calls the getters.
+    """
+    return Resources(
+        registry=get_service_registry(),
+        completion_cache=get_completion_cache(),
+        semantic_cache=get_semantic_cache(),
+        scheduler=get_scheduler(),
+        admission_controller=get_admission_controller(),
+        model_manager=get_model_manager(),
+        metrics=get_metrics(),
+        router=get_router(),
+        hedge_stats=get_hedge_stats(),
+        tool_executor=get_tool_executor(),
+    )
+
+
+# Return the Resources of the running generation
+def _current_resources():
+    """
+    Return the Resources passed to the running generation or, outside one (a script run, or a
+    batch script running its own event loop), the ones get_resources returns.
+    """
+    resources = _resources.get()
+    return resources if resources is not None else get_resources()
+
+
+# Record the metrics of a chat call
+def _record_call(service_id, kind, chat, output, started, status, error=None, queue_wait=0.0, renderer=None, cached=False):
+    """
+    Send the record of one chat call to the metrics recorder.
+    """
+    _current_resources().metrics.record({
+        "timestamp": time.time(),
+        "service_id": service_id,
+        "kind": kind,
+        "status": status,
+        "error": error,
+        "cached": cached,
+        "queue_wait": queue_wait or 0.0,
+        "time_to_first_token": renderer.time_to_first_token if renderer else None,
+        "mean_inter_token_gap": renderer.mean_inter_token_gap if renderer else None,
+        "max_inter_token_gap": renderer.gap_max if renderer else None,
+        "duration": time.perf_counter() - started,
+        "prompt_tokens": sum(message_tokens(message) for message in chat.messages),
+        "completion_tokens": count_tokens(output or ""),
+    })
+
+
+# Get the endpoint a service talks to
+def get_service_endpoint(service_id):
+    """
+    Return the endpoint key of a registered service (the service ID itself if it is not registered).
+    """
+    registry = _current_resources().registry
+    return registry.get_pool(service_id).endpoint if service_id in registry.service_ids() else service_id
+
+
+# Return the cache key for a request
+def _completion_cache_key(service_id, messages, chat_settings):
+    """
+    Return the completion cache key for the prompt messages and the settings that affect the output.
+    """
+    settings = {
+        "max_tokens": chat_settings.max_tokens,
+        "temperature": chat_settings.temperature,
+        "top_p": chat_settings.top_p,
+        "frequency_penalty": chat_settings.frequency_penalty,
+        "presence_penalty": chat_settings.presence_penalty,
+    }
+    return request_key(service_id, messages, settings)
+
+
+# Look up a request in the completion and semantic caches
+async def _lookup_caches(service_id, chat, chat_settings, use_cache=True):
+    """
+    Return (output, save): the cached response for the request or None, and a function that
+    stores a fresh response in the caches.
+
+    The exact-match completion cache is checked first, then the semantic cache, which compares
+    the last user message and the recent history with earlier requests to the same service with
+    the same system message and settings.
+    """
+    resources = _current_resources()
+    cache = resources.completion_cache if use_cache else None
+    semantic_cache = resources.semantic_cache if use_cache else None
+    cache_key = _completion_cache_key(service_id, chat.messages, chat_settings) if cache else None
+    output = cache.get(cache_key) if cache else None
+
+    # Only a request ending in a user message is looked up by meaning
+    def role(message):
+        return getattr(message.role, "value", message.role)
+
+    messages = [message for message in chat.messages if role(message) != "system"]
+    if not messages or role(messages[-1]) != "user":
+        semantic_cache = None
+    if semantic_cache is not None:
+        system_messages = [message for message in chat.messages if role(message) == "system"]
+        scope = f"{service_id}:{_completion_cache_key(service_id, system_messages, chat_settings)}"
+        prompt = str(messages[-1].content or "")
+        recent = messages[-1 - SEMANTIC_CACHE_HISTORY_MESSAGES:-1] if SEMANTIC_CACHE_HISTORY_MESSAGES else []
+        context = "\n".join(str(message.content or "") for message in recent)
+
+    vector = None
+    if output is None and semantic_cache is not None:
+        # Embeddings may call a model, so they run off the event loop
+        output, _, vector = await asyncio.to_thread(semantic_cache.lookup, scope, prompt, context)
+
+    def save(response):
+        if cache:
+            cache.put(cache_key, response)
+        if semantic_cache is not None:
+            semantic_cache.store(scope, prompt, context, response, vector)
+
+    return output, save
+
+
+# Stream the text of a chat completion
+async def _stream_text(chat_service, chat, chat_settings):
+    """
+    Yield the text chunks of a streaming chat completion.
+
+    The tokens sent and received are counted on the running generation's token, and if the
+    stream ends early (cancelled, timed out or abandoned), its HTTP response is closed so the
+    provider stops generating.
+    """
+    token = current_generation()
+    if token is not None:
+        token.add_prompt(sum(message_tokens(message) for message in chat.messages))
+    completion = chat_service.complete_chat_stream(chat_history=chat, settings=chat_settings)
+    finished = False
+    try:
+        async for message in completion:
+            text = str(message[0])
+            if token is not None:
+                token.add_output(count_tokens(text))
+            yield text
+        finished = True
+    finally:
+        if token is not None and not finished:
+            await token.abort_stream()
+        await completion.aclose()
+
+
+# Return the tool calls of a model message
+def _tool_calls(message):
+    """
+    Return the function calls of a chat message as (FunctionCallContent, ToolCall) pairs.
+    """
+    FunctionCallContent = _import("semantic_kernel.contents.function_call_content").FunctionCallContent
+    calls = []
+    for item in getattr(message, "items", None) or []:
+        if not isinstance(item, FunctionCallContent):
+            continue
+        plugin_name, _, function_name = (item.name or "").partition("-")
+        try:
+            arguments = json.loads(item.arguments) if item.arguments else {}
+        except json.JSONDecodeError:
+            arguments = None
+        calls.append((item, ToolCall(item.id, plugin_name, function_name, arguments if isinstance(arguments, dict) else None)))
+    return calls
+
+
+# Complete a chat in which the model may call the kernel's plugins
+async def _tool_calling_text(chat_service, chat, chat_settings):
+    """
+    Yield the text of a chat completion in which the model may call the kernel's plugins.
+
+    Each round, the model's tool calls run concurrently through the tool executor (see
+    get_tool_executor) and their results are added to the chat, until the model answers in text.
+    After TOOL_MAX_ROUNDS rounds the tools are withdrawn, so the model has to answer. The rounds
+    are not streamed; the answer is yielded in one chunk. Tokens are counted on the running
+    generation's token, as in _stream_text.
+    """
+    ChatHistory = _import("semantic_kernel.contents.chat_history").ChatHistory
+    FunctionResultContent = _import("semantic_kernel.contents.function_result_content").FunctionResultContent
+    kernel = get_kernel()
+    executor = _current_resources().tool_executor
+    token = current_generation()
+
+    # The tool messages go in a copy of the prompt; the prompt may be a read-only view of the chat history
+    chat = ChatHistory.model_construct(messages=list(chat.messages))
+    tools = tool_definitions(kernel)
+    settings = chat_settings.model_copy(update={"stream": False, "tools": tools, "tool_choice": "auto"})
+
+    for tool_round in range(TOOL_MAX_ROUNDS + 1):
+        if tool_round == TOOL_MAX_ROUNDS:
+            settings = settings.model_copy(update={"tools": None, "tool_choice": None})
+        if token is not None:
+            token.add_prompt(sum(message_tokens(message) for message in chat.messages))
+        message = (await chat_service.complete_chat(chat_history=chat, settings=settings))[0]
+        if token is not None:
+            token.add_output(count_tokens(str(message.content or "")))
+
+        calls = _tool_calls(message) if tool_round < TOOL_MAX_ROUNDS else []
+        if not calls:
+            yield str(message.content or "")
+            return
+
+        # Run the turn's tool calls together and answer each of them
+        chat.messages.append(message)
+        results = await executor.run(kernel, [call for _, call in calls])
+        for (item, _), result in zip(calls, results):
+            # A fresh metadata dict: Semantic Kernel's default one is shared and updated in place
+            chat.messages.append(FunctionResultContent.from_function_call_content_and_result(item, result, metadata={}).to_chat_message_content())
+
+
+# Get connection pool statistics
+def get_pool_stats():
+    """
+    Return the connection pool statistics for every endpoint.
+    """
+    return get_service_registry().pool_stats()
+
+
+
+# Summarize chat messages evicted from the history window
+async def summarize_messages(chat_service, summary, messages):
+    """
+    Fold chat messages into a rolling summary using the chat service itself.
+
+    Args:
+        chat_service: The chat service used to write the summary.
+        summary (str): The summary so far (may be empty).
+        messages (list): The messages to add to the summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+    chat = _import("semantic_kernel.contents.chat_history").ChatHistory(system_message=HISTORY_SUMMARY_SYSTEM_MESSAGE)
+    chat.add_user_message(f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}")
+    chat_settings = _import("semantic_kernel.connectors.ai.open_ai").AzureChatPromptExecutionSettings(
+        service_id=chat_service.service_id,
+        max_tokens=300,
+        temperature=0.0,
+        stream=False,
+    )
+    completions = await chat_service.complete_chat(chat_history=chat, settings=chat_settings)
+    return completions[0].content or summary
+
+
+# Build the chat history sent to the model
+async def prepare_prompt_history(chat_service, system_message, chat_history, **kwargs):
+    """
+    Build the chat history for the prompt: the system message plus as much of the chat history
+    as fits in the service's token budget, with evicted turns optionally summarized.
+
+    The budget and summarization come from the service's registry entry and can be overridden
+    with the history_token_budget and summarize_history kwargs.
+    """
+    options = _current_resources().registry.get_options(chat_service.service_id)
+    token_budget = kwargs.get("history_token_budget", options.get("history_token_budget"))
+    summarize = None
+    if kwargs.get("summarize_history", options.get("summarize_history")):
+        summarize = partial(summarize_messages, chat_service)
+    return await build_prompt_history(chat_history, system_message, token_budget=token_budget, summarize=summarize)
+
+
+# Prepare a streaming request
+async def prepare_streaming_request(chat_service, system_message, chat_history, **kwargs):
+    """
+    Build the chat settings and the prompt of a streaming request and look it up in the
+    completion and semantic caches.
+
+    run_streaming_response prepares the request before waiting for quota or a concurrency slot,
+    so a cached answer waits for neither, and passes it on to generate_streaming_response as
+    the prepared kwarg.
+
+    Returns:
+        StreamingRequest: The chat settings, the prompt chat, whether tools are offered, the
+            cached response (or None) and the function that stores a fresh response in the caches.
+    """
     # Initialize the chat settings based on the service ID and kwargs
     service_id = chat_service.service_id
-    chat_settings = sk_aoai.OpenAIChatPromptExecutionSettings(
+    chat_settings = _import("semantic_kernel.connectors.ai.open_ai").OpenAIChatPromptExecutionSettings(
         service_id=service_id,
         max_tokens=kwargs.get("max_tokens", 2000),
         temperature=kwargs.get("temperature", 0.7),
@@ -132,8 +1018,21 @@ async def generate_streaming_response(response_holder, chat_service, system_mess
         presence_penalty=kwargs.get("presence_penalty", 0.0),
         stream=True,
     )
-    
-    
+
+    # Build the chat for the prompt from the system message and the chat history, within the service's token budget
+    chat = await prepare_prompt_history(chat_service, system_message, chat_history, **kwargs)
+
+    # In tool mode the model may call the kernel's plugins; their results change, so tool mode bypasses the caches
+    use_tools = kwargs.get("tools", False) and supports_tools(service_id)
+
+    # Look up the request in the completion and semantic caches, if enabled
+    cached, save_to_caches = await _lookup_caches(service_id, chat, chat_settings, kwargs.get("use_cache", True) and not use_tools)
+    return StreamingRequest(chat_settings, chat, use_tools, cached, save_to_caches)
+
+
+# Generate streaming response
+async def generate_streaming_response(response_holder, chat_service, system_message, chat_history, user_input, **kwargs):
+
     # Build the chat history based on the system message and user input
     
     # If no chat history is provided, create a new one
@@ -143,42 +1042,363 @@ async def generate_streaming_response(response_holder, chat_service, system_mess
     # Add the user input to the chat history
     if user_input:
         chat_history.add_user_message(user_input)
-        
-    # If system message is provided, initialize the chat for the prompt with it and the chat history, otherwise just the chat history
-    if system_message:
-        chat = ChatHistory(messages=chat_history.messages, system_message=system_message)
-    else:
-        chat = chat_history
 
-    # Execute the prompt 
-    output = ""
-    stream = chat_service.complete_chat_stream(chat_history=chat, settings=chat_settings)
+    # Build the prompt and look it up in the caches, unless the caller has (see run_streaming_response)
+    service_id = chat_service.service_id
+    request = kwargs.get("prepared") or await prepare_streaming_request(chat_service, system_message, chat_history, **kwargs)
+    chat_settings, chat, cached, save_to_caches = request.chat_settings, request.chat, request.cached, request.save
 
-    # Stream the response
-    async for message in stream:
-        output += str(message[0])
-        response_holder.write(output)
+    # Execute the prompt, or replay the cached response through the same streaming path
+    if cached is not None:
+        stream = replay_stream(cached)
+    elif request.use_tools:
+        stream = _tool_calling_text(chat_service, chat, chat_settings)
+    else:
+        stream = _stream_text(chat_service, chat, chat_settings)
 
-    # Post-process the entire stream for JSON formatting at the end of streaming
+    # Stream the response, buffering chunks and flushing to the placeholder on a time or chunk budget.
+    # A caller-supplied renderer keeps the partial output available if the stream is cancelled.
+    # JSON responses are parsed as they stream and shown as a pretty JSON view (json_mode: True/False/None to detect).
+    renderer = kwargs.get("renderer") or StreamingRenderer(
+        response_holder,
+        flush_interval=kwargs.get("flush_interval", DEFAULT_FLUSH_INTERVAL),
+        flush_tokens=kwargs.get("flush_tokens", DEFAULT_FLUSH_TOKENS),
+        json_mode=kwargs.get("json_mode"),
+    )
+    started = time.perf_counter()
+    status, error = "ok", None
     try:
-        # Attempt to parse the JSON and reformat it
-        parsed_json = json.loads(output)
-        response_holder.json(output)  # Display the pretty-printed JSON
-    except json.JSONDecodeError:
-        # If JSON parsing fails, do nothing or handle it accordingly
-        print(f"JSON parsing failed. {service_id}")
-        pass
+        async for chunk in stream:
+            renderer.add(chunk)
+    except asyncio.CancelledError:
+        status = renderer.cancel_reason or "cancelled"
+        raise
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        # End the stream if it was left unfinished (e.g. the script run was stopped while rendering)
+        await stream.aclose()
+
+        # Show whatever arrived, even if the stream failed or was cancelled, and record the call
+        output = renderer.close()
+        _record_call(service_id, "stream", chat, output, started, status, error, kwargs.get("queue_time"), renderer, cached is not None)
+
+    # Store the completed response in the caches
+    if cached is None:
+        save_to_caches(output)
 
     # Return the output
     return output
 
 
+# Run a streaming response within the deployment's quota, retrying failed calls
+async def run_streaming_response(response_holder, chat_service, system_message, chat_history, user_input, **kwargs):
+    """
+    Run generate_streaming_response on its own with the service's timeouts, without raising.
+
+    The request is first looked up in the caches (see prepare_streaming_request); a cached
+    answer is replayed straight away. Otherwise the call is admitted within the deployment's
+    quota (see get_admission_controller), showing its queue position and ETA in the response
+    holder while it waits, then waits for a slot from the concurrency scheduler (see
+    get_scheduler); the timeouts start once it is admitted by both.
+
+    The stream is cancelled if no token arrives within first_token_timeout seconds or if it
+    does not finish within stream_timeout seconds (from the service's registry entry, or the
+    kwargs of the same name). Whatever was received before a timeout or error is kept.
+
+    A call that fails with a retryable status (429, 5xx, ...) before producing any output is
+    retried up to MODEL_CALL_RETRIES times (or the retries kwarg). A 429 pauses every call to
+    the deployment for its Retry-After time; other errors back off exponentially.
+
+    Returns:
+        dict: output (str, possibly partial), status ("ok", "timeout" or "error"), error (str or None),
+            queue_time (quota and scheduler wait), throttle_time (quota wait), time_to_first_token
+            and total_time (seconds of the last attempt), and attempts.
+    """
+    service_id = chat_service.service_id
+    session_id = kwargs.pop("session_id", None)
+    retries = kwargs.pop("retries", MODEL_CALL_RETRIES)
+    controller = _current_resources().admission_controller
+
+    # Retries resend the same prompt, so the user input is added to the chat history only once
+    if chat_history is None:
+        chat_history = new_chat_history()
+    if user_input:
+        chat_history.add_user_message(user_input)
+    tokens = estimate_request_tokens(service_id, system_message, chat_history, None, kwargs.get("max_tokens", 2000))
+
+    # Build the prompt and look it up in the caches once, before waiting for quota or a slot
+    try:
+        request = await prepare_streaming_request(chat_service, system_message, chat_history, **kwargs)
+    except Exception as e:
+        return {"output": "", "status": "error", "error": str(e), "queue_time": 0.0, "time_to_first_token": None,
+                "total_time": 0.0, "throttle_time": 0.0, "attempts": 1}
+
+    def show_queue_position(position, eta):
+        response_holder.write(f"Waiting for {service_id} quota: #{position} in queue, about {eta:.0f}s")
+
+    throttle_time = 0.0
+    for attempt in range(retries + 1):
+        # A cached answer never reaches the deployment, so it takes no quota
+        waited = 0.0
+        if request.cached is None:
+            waited = await controller.admit(service_id, tokens, session_id, on_wait=show_queue_position)
+            if waited:
+                response_holder.write("")
+        throttle_time += waited
+
+        result = await _run_streaming_attempt(response_holder, chat_service, system_message, chat_history, waited, prepared=request, **kwargs)
+        status_code, retry_after = error_status(result.pop("exception"))
+        if result["status"] != "error" or result["output"] or status_code not in RETRYABLE_STATUS_CODES or attempt == retries:
+            break
+
+        # Back off: a 429 pauses the whole deployment, so every session waits out the Retry-After together
+        backoff = retry_after if retry_after is not None else min(60.0, 2 ** attempt) * (0.5 + random.random())
+        if status_code == 429:
+            controller.throttle(service_id, backoff)
+        else:
+            await asyncio.sleep(backoff)
+
+    return {**result, "throttle_time": throttle_time, "attempts": attempt + 1}
+
+
+# Run one streaming attempt with timeouts, capturing partial output
+async def _run_streaming_attempt(response_holder, chat_service, system_message, chat_history, admission_wait, **kwargs):
+    """
+    Stream one attempt of run_streaming_response; returns its result plus the exception raised, if any.
+    """
+    resources = _current_resources()
+    options = resources.registry.get_options(chat_service.service_id)
+    first_token_timeout = kwargs.pop("first_token_timeout", options.get("first_token_timeout"))
+    stream_timeout = kwargs.pop("stream_timeout", options.get("stream_timeout"))
+
+    # Wait for the model's turn on a local endpoint and a slot on the service's endpoint, then
+    # stream; a cached answer is replayed without either, so it neither waits for nor loads a model
+    cached = kwargs["prepared"].cached is not None
+    manager = resources.model_manager
+    model_slot = nullcontext(False) if cached else manager.slot(chat_service.service_id)
+    endpoint_slot = nullcontext(0.0) if cached else resources.scheduler.slot(get_service_endpoint(chat_service.service_id))
+    async with model_slot as cold, endpoint_slot as slot_wait:
+        queue_time = admission_wait + slot_wait
+        renderer = StreamingRenderer(
+            response_holder,
+            flush_interval=kwargs.pop("flush_interval", DEFAULT_FLUSH_INTERVAL),
+            flush_tokens=kwargs.pop("flush_tokens", DEFAULT_FLUSH_TOKENS),
+            json_mode=kwargs.get("json_mode"),
+            on_first_chunk=kwargs.pop("on_first_chunk", None),
+        )
+        task = asyncio.ensure_future(generate_streaming_response(response_holder, chat_service, system_message, chat_history, None, renderer=renderer, queue_time=queue_time, **kwargs))
+        status, error, exception = "ok", None, None
+        try:
+            # Wait for the first token, then for the rest of the stream
+            await asyncio.wait({task}, timeout=first_token_timeout)
+            if not task.done() and renderer.first_chunk_at is None:
+                status = "timeout"
+            else:
+                remaining = None if stream_timeout is None else max(stream_timeout - renderer.total_time, 0)
+                await asyncio.wait({task}, timeout=remaining)
+                if not task.done():
+                    status = "timeout"
+            if status == "ok":
+                task.result()
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        except Exception as e:
+            status, error, exception = "error", str(e), e
+        finally:
+            if not task.done():
+                if status == "timeout":
+                    renderer.cancel_reason = "timeout"
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    if not cached:
+        manager.observe(chat_service.service_id, cold, renderer.time_to_first_token)
+    return {
+        "output": renderer.close(),
+        "status": status,
+        "error": error,
+        "exception": exception,
+        "queue_time": queue_time,
+        "time_to_first_token": renderer.time_to_first_token,
+        "total_time": renderer.total_time,
+    }
+
+
+# Start a streaming response in the background worker
+def start_background_response(history_name, service_id, system_message, chat_history, **kwargs):
+    """
+    Start run_streaming_response for a chat history of the current session on the background
+    worker (see get_generation_worker), which commits the response to the history store when
+    the stream ends. The user input must already be in the chat history. The service is taken
+    by ID since chat services are bound to the event loop they were built on.
+
+    Script runs attach to the generation with get_background_response and render its buffer, so
+    a rerun or a browser reconnect neither stops the generation nor loses its output. It runs
+    under a cancellation token (see get_generation_tracker), and is cancelled when a newer
+    prompt supersedes it (keeping its partial response), when the chat history is reset, or
+    when the session has had no open tab for GENERATION_ORPHAN_GRACE seconds.
+
+    Returns:
+        GenerationBuffer: The buffer the response streams into; its result is the
+            run_streaming_response result once done.
+    """
+    session_id = get_session_id()
+    store = get_history_store()
+    tracker = get_generation_tracker()
+    resources = get_resources()
+
+    async def generate(buffer):
+        _resources.set(resources)
+        async with tracker.generation(session_id, history_name, service_id) as token:
+            chat_service = get_chat_service(service_id)
+            try:
+                result = await run_streaming_response(buffer, chat_service, system_message, chat_history, None, session_id=session_id, **kwargs)
+            except asyncio.CancelledError:
+                # A newer prompt superseded the response: keep what arrived, so the chat history
+                # still alternates between the user and the assistant
+                if token.reason == "superseded" and buffer.text:
+                    chat_history.add_assistant_message(buffer.text)
+                    store.put(session_id, history_name, chat_history)
+                raise
+
+            # Add the response (complete or partial) to the chat history and save it
+            if result["output"]:
+                chat_history.add_assistant_message(result["output"])
+            store.put(session_id, history_name, chat_history)
+            return result
+
+    return get_generation_worker().start(session_id, history_name, service_id, generate, history_length=len(chat_history.messages))
+
+
+# Get the background response of a chat history
+def get_background_response(history_name):
+    """
+    Return the buffer of the current session's background generation for the chat history, or None.
+    """
+    return get_generation_worker().get(get_session_id(), history_name)
+
+
+# Drop the background response of a chat history once it has been shown
+def clear_background_response(history_name):
+    """
+    Forget the current session's finished background generation for the chat history.
+    """
+    get_generation_worker().clear(get_session_id(), history_name)
+
+
+# Run a streaming response hedged with a backup service
+async def run_hedged_streaming_response(response_holder, chat_service, backup_service, system_message, chat_history, user_input, **kwargs):
+    """
+    Run run_streaming_response on the primary service, and send the same request to the backup
+    service if the primary has produced no token after hedge_after seconds (or has failed).
+
+    Whichever service produces a token first wins the placeholder and the other request is
+    cancelled. The deadline comes from the hedge_after kwarg, the primary's hedge_after option
+    or HEDGE_AFTER. The outcome is recorded in the hedging statistics (see get_hedge_stats).
+
+    Returns:
+        dict: The winner's run_streaming_response result (the primary's if neither produced a
+            token) with time_to_first_token and total_time counted from the start of the primary
+            request, plus service_id (the service that answered), hedged (bool) and
+            latency_saved (estimated seconds, or None).
+    """
+    resources = _current_resources()
+    options = resources.registry.get_options(chat_service.service_id)
+    hedge_after = kwargs.pop("hedge_after", options.get("hedge_after", HEDGE_AFTER))
+    primary_id, backup_id = chat_service.service_id, backup_service.service_id
+
+    # Both requests share the prompt, so the user input is added to the chat history only once
+    if chat_history is None:
+        chat_history = new_chat_history()
+    if user_input:
+        chat_history.add_user_message(user_input)
+
+    gate = HedgeGate()
+    started = time.perf_counter()
+
+    def start(name, service):
+        return asyncio.ensure_future(run_streaming_response(
+            gate.holder(name, response_holder), service, system_message, chat_history, None,
+            on_first_chunk=partial(gate.claim, name), **kwargs))
+
+    tasks = {primary_id: start(primary_id, chat_service)}
+    claimed = asyncio.ensure_future(gate.claimed.wait())
+    hedged = fallback = False
+    try:
+        # Wait for the primary's first token, its end, or the hedge deadline
+        await asyncio.wait({tasks[primary_id], claimed}, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+        primary_done = tasks[primary_id].done()
+        primary_failed = primary_done and tasks[primary_id].result()["status"] != "ok"
+        if gate.winner is None and (not primary_done or primary_failed):
+            hedged, fallback = True, primary_failed
+            tasks[backup_id] = start(backup_id, backup_service)
+
+        # Wait until a service claims the placeholder or every request has ended
+        pending = set(tasks.values())
+        while gate.winner is None and pending:
+            _, pending = await asyncio.wait(pending | {claimed}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(claimed)
+
+        # Cancel the loser and wait for the winner
+        for name, task in tasks.items():
+            if gate.winner is not None and name != gate.winner:
+                task.cancel()
+        winner = gate.winner or primary_id
+        result = await tasks[winner]
+    finally:
+        claimed.cancel()
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    # Record the outcome; the time a backup win saved is estimated from the primary's slow calls
+    latency_saved = None
+    if hedged and gate.winner == backup_id and not fallback:
+        latency_saved = estimate_latency_saved(resources.metrics.records(), primary_id, hedge_after, gate.claimed_at - started)
+    resources.hedge_stats.record(primary_id, backup_id, hedged, gate.winner, fallback, latency_saved)
+
+    # Report the latency the user saw, from the start of the primary request
+    time_to_first_token = gate.claimed_at - started if gate.claimed_at is not None else None
+    return {**result, "time_to_first_token": time_to_first_token, "total_time": time.perf_counter() - started,
+            "service_id": winner, "hedged": hedged, "latency_saved": latency_saved}
+
+
+# Run a streaming response on the service picked by the adaptive router
+async def run_routed_streaming_response(response_holder, system_message, chat_history, user_input, candidates=None, **kwargs):
+    """
+    Let the adaptive router pick a chat service for the request (see get_router), then run
+    run_streaming_response on it.
+
+    Args:
+        candidates (list): The service IDs to choose from (default: all registered services).
+
+    Returns:
+        dict: The run_streaming_response result plus service_id (None if every service's
+            circuit breaker is open) and decision (the router's decision).
+    """
+    resources = _current_resources()
+    decision = resources.router.choose(candidates or resources.registry.service_ids())
+    if decision["service_id"] is None:
+        return {"output": "", "status": "error", "error": "No chat service available: every circuit breaker is open.",
+                "queue_time": 0.0, "time_to_first_token": None, "total_time": 0.0, "service_id": None, "decision": decision}
+
+    try:
+        result = await run_streaming_response(response_holder, get_chat_service(decision["service_id"]), system_message, chat_history, user_input, **kwargs)
+    finally:
+        # A trial request that ended before its call was recorded must not hold the half-open breaker
+        resources.router.release(decision["service_id"])
+    return {**result, "service_id": decision["service_id"], "decision": decision}
+
+
 # Generate a response
 async def generate_response(response_holder, chat_service, system_message, chat_history, user_input, **kwargs):
     
     # Initialize the chat settings based on the service ID and kwargs
     service_id = chat_service.service_id
-    chat_settings = sk_aoai.AzureChatPromptExecutionSettings(
+    chat_settings = _import("semantic_kernel.connectors.ai.open_ai").AzureChatPromptExecutionSettings(
         service_id=service_id,
         max_tokens=kwargs.get("max_tokens", 2000),
         temperature=kwargs.get("temperature", 0.0),
@@ -198,17 +1418,32 @@ async def generate_response(response_holder, chat_service, system_message, chat_
     if user_input:
         chat_history.add_user_message(user_input)
         
-    # If system message is provided, initialize the chat for the prompt with it and the chat history, otherwise just the chat history
-    if system_message:
-        chat = ChatHistory(messages=chat_history.messages, system_message=system_message)
-    else:
-        chat = chat_history
+    # Build the chat for the prompt from the system message and the chat history, within the service's token budget
+    chat = await prepare_prompt_history(chat_service, system_message, chat_history, **kwargs)
         
-    # Await the completion of the chat
-    completions = await chat_service.complete_chat(chat_history=chat, settings=chat_settings)
+    # Look up the request in the completion and semantic caches, if enabled
+    output, save_to_caches = await _lookup_caches(service_id, chat, chat_settings, kwargs.get("use_cache", True))
+
+    # Await the completion of the chat on a cache miss, and record the call
+    cached = output is not None
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        if not cached:
+            completions = await chat_service.complete_chat(chat_history=chat, settings=chat_settings)
+            output = completions[0].content
+            save_to_caches(output)
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        _record_call(service_id, "complete", chat, output, started, status, error, kwargs.get("queue_time"), cached=cached)
 
     # Use the concatenated response
-    response_holder.write(completions[0].content)
+    response_holder.write(output)
  
-    return completions[0].content
+    return output
         
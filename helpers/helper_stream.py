@@ -0,0 +1,294 @@
+# Helper for rendering streamed model output in Streamlit
+
+# Imports
+
+# Standard imports
+import json
+import time
+
+
+# Default flush budgets for streamed output
+DEFAULT_FLUSH_INTERVAL = 0.05   # Seconds between flushes to the placeholder
+DEFAULT_FLUSH_TOKENS = 20       # Chunks buffered before a flush is forced
+
+
+class JsonStreamParser:
+    """
+    Scans streamed JSON text as it arrives to find the longest prefix that can be closed into
+    valid JSON, so a partial document can be rendered while the rest is still streaming.
+
+    Each character is scanned once. The parser tracks the open objects/arrays and strings, and
+    remembers the last cut point (after a closing bracket or before a comma) as `cut`, an
+    (end index, closing brackets) tuple. It gives up (failed) as soon as the text can't be
+    a single JSON object or array.
+    """
+
+    def __init__(self):
+        self.position = 0
+        self.started = False
+        self.failed = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self.cut = None
+        self._parsed_cut = None
+        self._parsed_value = None
+
+    @property
+    def complete(self):
+        """
+        True when a whole JSON object or array has been received.
+        """
+        return self.started and not self.failed and not self._stack and not self._in_string
+
+    def feed(self, chunk):
+        """
+        Scan the next chunk of the streamed text.
+        """
+        for char in chunk:
+            index = self.position
+            self.position += 1
+            if self.failed:
+                continue
+
+            # Inside a string only the closing quote matters
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char.isspace():
+                continue
+            if self.started and not self._stack:
+                # Anything after the top-level value means this is not a JSON document
+                self.failed = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+                self.started = True
+            elif not self.started:
+                # Only objects and arrays are rendered as JSON
+                self.failed = True
+            elif char == '"':
+                self._in_string = True
+            elif char in "}]":
+                if self._stack[-1] != char:
+                    self.failed = True
+                    continue
+                self._stack.pop()
+                self.cut = (index + 1, "".join(reversed(self._stack)))
+            elif char == ",":
+                self.cut = (index, "".join(reversed(self._stack)))
+
+    def partial_value(self, text):
+        """
+        Return the parsed value of the longest closable prefix of the text, or None if there is
+        none yet. The prefix is only parsed again when the cut point has moved.
+
+        Args:
+            text (str): The text fed to the parser so far.
+        """
+        if self.cut is None or self.failed:
+            return None
+        if self.cut != self._parsed_cut:
+            end, closers = self.cut
+            try:
+                self._parsed_value = json.loads(text[:end] + closers)
+            except ValueError:
+                self._parsed_value = None
+            self._parsed_cut = self.cut
+        return self._parsed_value
+
+
+class StreamingRenderer:
+    """
+    Buffers streamed chunks and writes them to a Streamlit placeholder on a time or chunk budget.
+
+    Writing to an `st.empty()` placeholder re-sends the whole text every time, so writing on every
+    chunk costs quadratic bytes over the websocket. The renderer collects chunks and only writes
+    when `flush_interval` seconds have passed or `flush_tokens` chunks are pending, plus a final
+    flush when the stream ends.
+
+    JSON responses (detected from the first non-whitespace character, or forced with json_mode)
+    are parsed incrementally and rendered as a pretty JSON view that grows as the document
+    streams in. Other responses are written as text and never parsed.
+
+    Args:
+        response_holder: The Streamlit placeholder (or any object with `write` and `json` methods).
+        flush_interval (float): Maximum seconds between flushes.
+        flush_tokens (int): Maximum number of chunks buffered between flushes.
+        json_mode (bool): True to treat the response as JSON, False to never do so, None to detect it.
+        on_first_chunk (callable): Optional, called with no arguments when the first chunk arrives.
+    """
+
+    def __init__(self, response_holder, flush_interval=DEFAULT_FLUSH_INTERVAL, flush_tokens=DEFAULT_FLUSH_TOKENS, json_mode=None, on_first_chunk=None):
+        self.response_holder = response_holder
+        self.on_first_chunk = on_first_chunk
+        self.flush_interval = flush_interval
+        self.flush_tokens = flush_tokens
+        self.json_mode = json_mode
+        self._json = JsonStreamParser() if json_mode else None
+        self._rendered_cut = None
+
+        # Text already flushed and chunks waiting for the next flush
+        self._text = ""
+        self._pending = []
+        self._last_flush = time.perf_counter()
+
+        # Why the stream was cancelled, if its owner cancels it on purpose (e.g. "timeout")
+        self.cancel_reason = None
+
+        # Timing of the response
+        self.started_at = self._last_flush
+        self.first_chunk_at = None
+        self.last_chunk_at = None
+        self.finished_at = None
+
+        # Gaps between consecutive chunks
+        self.gap_count = 0
+        self.gap_total = 0.0
+        self.gap_max = 0.0
+
+        # Render statistics
+        self.chunk_count = 0
+        self.flush_count = 0
+        self.bytes_written = 0
+        self.render_time = 0.0
+
+    def add(self, chunk):
+        """
+        Add a streamed chunk and flush if the time or chunk budget is used up.
+
+        Args:
+            chunk (str): The chunk of text received from the stream.
+        """
+        if not chunk:
+            return
+        now = time.perf_counter()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+            if self.on_first_chunk is not None:
+                self.on_first_chunk()
+        else:
+            gap = now - self.last_chunk_at
+            self.gap_count += 1
+            self.gap_total += gap
+            self.gap_max = max(self.gap_max, gap)
+        self.last_chunk_at = now
+        self._pending.append(chunk)
+        self.chunk_count += 1
+
+        if len(self._pending) >= self.flush_tokens or time.perf_counter() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, final=False):
+        """
+        Write the buffered text to the placeholder, if anything is pending.
+
+        Args:
+            final (bool): True for the last flush of the stream.
+        """
+        if not self._pending and not (final and self._json is not None and not self._json.failed):
+            return
+        new_text = "".join(self._pending)
+        self._text += new_text
+        self._pending = []
+
+        # Detect JSON from the first non-whitespace character and scan the new text
+        if self.json_mode is None and self._json is None and self._text.strip():
+            self.json_mode = self._text.lstrip()[0] in "{["
+            if self.json_mode:
+                self._json = JsonStreamParser()
+                new_text = self._text
+        if self._json is not None:
+            self._json.feed(new_text)
+
+        # Write the full text or JSON view (the placeholder replaces its content) and track the cost
+        start = time.perf_counter()
+        written = self._render(final)
+        self._last_flush = time.perf_counter()
+        if written is not None:
+            self.render_time += self._last_flush - start
+            self.flush_count += 1
+            self.bytes_written += len(written.encode("utf-8"))
+
+    def _render(self, final):
+        # Returns the text sent to the placeholder, or None if nothing was sent
+        value = None
+        if self._json is not None and not self._json.failed:
+            if final:
+                # Parse the whole document once; an incomplete or invalid one (e.g. "[Draft answer]") is shown as text
+                if self._json.complete:
+                    try:
+                        value = json.loads(self._text)
+                    except ValueError:
+                        value = None
+            elif self._json.cut is not None:
+                if self._json.cut == self._rendered_cut:
+                    # Nothing new to show in the JSON view yet
+                    return None
+                self._rendered_cut = self._json.cut
+                value = self._json.partial_value(self._text)
+
+        if value is not None:
+            if self.response_holder is not None:
+                self.response_holder.json(value)
+            return json.dumps(value)
+        if self.response_holder is not None:
+            self.response_holder.write(self._text)
+        return self._text
+
+    def close(self):
+        """
+        Final flush at the end of the stream. Returns the complete text.
+        """
+        if self.finished_at is None:
+            self.flush(final=True)
+            self.finished_at = time.perf_counter()
+        return self._text
+
+    @property
+    def text(self):
+        """
+        The complete text received so far, including chunks not yet flushed.
+        """
+        return self._text + "".join(self._pending)
+
+    @property
+    def time_to_first_token(self):
+        """
+        Seconds from the start of the response to the first chunk, or None if nothing arrived.
+        """
+        return None if self.first_chunk_at is None else self.first_chunk_at - self.started_at
+
+    @property
+    def total_time(self):
+        """
+        Seconds from the start of the response to the final flush (or until now if still streaming).
+        """
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def mean_inter_token_gap(self):
+        """
+        Mean seconds between consecutive chunks, or None if fewer than two chunks arrived.
+        """
+        return self.gap_total / self.gap_count if self.gap_count else None
+
+    def stats(self):
+        """
+        Return the render statistics for the response as a dict.
+        """
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": self.total_time,
+            "mean_inter_token_gap": self.mean_inter_token_gap,
+            "max_inter_token_gap": self.gap_max,
+            "chunks": self.chunk_count,
+            "flushes": self.flush_count,
+            "bytes_written": self.bytes_written,
+            "render_time": self.render_time,
+        }
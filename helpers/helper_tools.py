@@ -0,0 +1,304 @@
+# Helper for running the tool calls of a model turn: concurrently, memoized and with timeouts
+
+# Imports
+
+# Standard imports
+import json
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# How a plugin's functions run: on the event loop (I/O-bound, async functions), or in a thread
+# or a process pool (CPU-bound, sync functions)
+EXECUTION_MODES = ("async", "thread", "process")
+
+# JSON schema types of the parameter types Semantic Kernel reports
+JSON_TYPES = {"str": "string", "int": "integer", "float": "number", "bool": "boolean", "list": "array", "dict": "object"}
+
+# A tool call of a model turn; arguments is None if the model sent arguments that aren't a JSON object
+ToolCall = namedtuple("ToolCall", "id plugin_name function_name arguments")
+
+
+# Return the tool name of a kernel function
+def tool_name(plugin_name, function_name):
+    """
+    Return the name a kernel function is offered to the model under ("math-evaluate"), as
+    Semantic Kernel's function calling names it.
+    """
+    return f"{plugin_name}-{function_name}"
+
+
+# Describe kernel functions as tools
+def tool_definitions(kernel, plugin_names=None):
+    """
+    Return the OpenAI tool definitions of the kernel's plugin functions.
+
+    Args:
+        kernel: The Semantic Kernel kernel holding the plugins.
+        plugin_names (list): The plugins to offer, or None for all of them.
+
+    Returns:
+        list: One {"type": "function", "function": {...}} dict per kernel function.
+    """
+    tools = []
+    for plugin_name, plugin in kernel.plugins.items():
+        if plugin_names is not None and plugin_name not in plugin_names:
+            continue
+        for function_name, function in plugin.functions.items():
+            properties, required = {}, []
+            for parameter in function.metadata.parameters:
+                schema = dict(getattr(parameter, "schema_data", None) or {"type": JSON_TYPES.get(parameter.type_, "string")})
+                if parameter.description:
+                    schema.setdefault("description", parameter.description)
+                properties[parameter.name] = schema
+                if parameter.is_required:
+                    required.append(parameter.name)
+            tools.append({"type": "function", "function": {
+                "name": tool_name(plugin_name, function_name),
+                "description": function.metadata.description or "",
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            }})
+    return tools
+
+
+# Format a function's return value as a tool result
+def format_result(value):
+    """
+    Return a function's return value as the text sent back to the model.
+    """
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+# Return the multiprocessing context process workers are started with
+def _process_context(preload=()):
+    """
+    Return the "forkserver" context where the platform has it, else "spawn"; never "fork".
+
+    A forkserver child is forked from a single-threaded server process that has imported the
+    preload modules once, so new workers start quickly; a spawned child imports them itself.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(list(preload))
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls a model makes in one turn concurrently, so a multi-tool answer waits for
+    its slowest tool rather than for the sum of them.
+
+    Each plugin is configured with an execution mode (see EXECUTION_MODES), a timeout, and
+    whether its results are memoized. Memoized results are kept in an LRU shared by every
+    session, keyed by function and arguments, for `cache_ttl` seconds; identical calls in one
+    turn run once. A call that fails or times out returns an error message as its result, so the
+    model can answer with the other results. When a process call times out, the process pool is
+    shut down and replaced, so later calls don't queue behind it (other calls running in that
+    pool fail). Neither a process nor a thread call can be stopped once running, so plugins
+    must bound their own work (see helper_plugins); a timed-out call is abandoned.
+
+    Process workers are not forked from the app's process, which runs several threads (the worker
+    event loop, the asset and tool thread pools): a forked child could inherit a lock another
+    thread held and deadlock. They come from a forkserver that has imported `preload` (or are
+    spawned where there is no forkserver, e.g. on Windows).
+
+    Args:
+        plugin_options (dict): Plugin name -> {"mode": ..., "timeout": ..., "memoize": ...}.
+        default_timeout (float): Seconds a call may take when its plugin sets no timeout.
+        max_threads (int): Threads for "thread" plugins.
+        max_processes (int): Processes for "process" plugins (started on first use).
+        cache_entries (int): Maximum memoized results.
+        cache_ttl (float): Seconds a memoized result stays valid.
+        preload (list): Modules the forkserver imports once for the process workers (e.g. the
+            modules of the "process" plugins).
+    """
+
+    def __init__(self, plugin_options=None, default_timeout=10.0, max_threads=8, max_processes=2, cache_entries=1024, cache_ttl=300, preload=()):
+        self.plugin_options = {}
+        self.default_timeout = default_timeout
+        self.max_processes = max_processes
+        self.preload = list(preload)
+        self.cache_entries = cache_entries
+        self.cache_ttl = cache_ttl
+        for plugin_name, options in (plugin_options or {}).items():
+            self.configure(plugin_name, **options)
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._threads = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="tool")
+        self._processes = None
+
+        # Counters
+        self.turns = 0
+        self.calls = 0
+        self.memo_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.pool_resets = 0
+        self.call_time = 0.0
+        self.wall_time = 0.0
+
+    def configure(self, plugin_name, mode="async", timeout=None, memoize=False):
+        """
+        Set how a plugin's functions run.
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode {mode!r} for plugin {plugin_name}; expected one of {EXECUTION_MODES}.")
+        self.plugin_options[plugin_name] = {"mode": mode, "timeout": timeout, "memoize": memoize}
+
+    async def run(self, kernel, calls):
+        """
+        Run the tool calls of one model turn concurrently.
+
+        Args:
+            kernel: The kernel holding the plugins.
+            calls (list): The ToolCalls.
+
+        Returns:
+            list: The result text of each call, in order.
+        """
+        started = time.perf_counter()
+
+        # Identical calls run once
+        keys = [self._key(call) for call in calls]
+        unique = {}
+        for key, call in zip(keys, calls):
+            unique.setdefault(key, call)
+        results = await asyncio.gather(*(self._run_call(kernel, key, call) for key, call in unique.items()))
+        by_key = dict(zip(unique, results))
+
+        with self._lock:
+            self.turns += 1
+            self.wall_time += time.perf_counter() - started
+        return [by_key[key] for key in keys]
+
+    def _key(self, call):
+        return (call.plugin_name, call.function_name, json.dumps(call.arguments, sort_keys=True, default=str))
+
+    async def _run_call(self, kernel, key, call):
+        options = self.plugin_options.get(call.plugin_name, {})
+        memoize = options.get("memoize", False)
+        if memoize:
+            result = self._lookup(key)
+            if result is not None:
+                return result
+
+        timeout = options.get("timeout") or self.default_timeout
+        mode = options.get("mode", "async")
+        pool = self._pool(mode)
+        started = time.perf_counter()
+        failed = False
+        try:
+            if call.arguments is None:
+                raise ValueError("the arguments are not a JSON object")
+            function = kernel.get_function(call.plugin_name, call.function_name)
+            value = await asyncio.wait_for(self._invoke(kernel, function, pool, call.arguments), timeout)
+            result = format_result(value)
+        except asyncio.TimeoutError:
+            failed = True
+            with self._lock:
+                self.timeouts += 1
+            if mode == "process":
+                self._reset_processes(pool)
+            result = f"Error: {tool_name(call.plugin_name, call.function_name)} timed out after {timeout:g}s."
+        except Exception as e:
+            failed = True
+            with self._lock:
+                self.errors += 1
+            logging.warning(f"Tool call {tool_name(call.plugin_name, call.function_name)} failed: {e}")
+            result = f"Error: {tool_name(call.plugin_name, call.function_name)} failed: {e}"
+
+        with self._lock:
+            self.calls += 1
+            self.call_time += time.perf_counter() - started
+            if memoize and not failed:
+                self._remember(key, result)
+        return result
+
+    async def _invoke(self, kernel, function, pool, arguments):
+        if pool is None:
+            # Imported here to keep Semantic Kernel out of the app's import time
+            from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+            result = await function.invoke(kernel, KernelArguments(**arguments))
+            exception = (getattr(result, "metadata", None) or {}).get("exception")
+            if exception is not None:
+                raise exception
+            return getattr(result, "value", result)
+
+        # Sync functions run off the event loop, on the function's own method
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, partial(function.method, **arguments))
+
+    def _pool(self, mode):
+        # The executor a call runs in: None for async calls, which run on the event loop
+        if mode == "async":
+            return None
+        if mode == "thread":
+            return self._threads
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.max_processes, mp_context=_process_context(self.preload))
+            return self._processes
+
+    def _reset_processes(self, pool):
+        # Shut the pool down without waiting: its queued calls are cancelled, its workers exit once
+        # their running calls end, and a new pool is started on next use. A pool already replaced
+        # after another timeout is left alone.
+        with self._lock:
+            if self._processes is not pool:
+                return
+            self._processes = None
+            self.pool_resets += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            result, created = entry
+            if time.monotonic() - created >= self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self.memo_hits += 1
+            return result
+
+    def _remember(self, key, result):
+        self._cache[key] = (result, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self):
+        """
+        Return the executor counters as a dict. The latency saved is the time the calls took
+        minus the time the turns waited for them, i.e. what running them one after the other
+        would have added.
+        """
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "calls": self.calls,
+                "memo_hits": self.memo_hits,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "pool_resets": self.pool_resets,
+                "call_time": self.call_time,
+                "wall_time": self.wall_time,
+                "latency_saved": max(self.call_time - self.wall_time, 0.0),
+                "memoized_results": len(self._cache),
+            }
@@ -2,18 +2,49 @@
 
 # Import required libraries
 import streamlit as st
-from PIL import Image
-from PIL import UnidentifiedImageError
 import os
 import json
 import logging
+from functools import lru_cache
+from dotenv import load_dotenv
 
+# Local imports
+from helpers.helper_assets import AssetCache, file_version
 
-# Function to read the contents of a file
+
+# Number of most recent messages display_message_history renders as individual chat messages
+HISTORY_VISIBLE_MESSAGES = 20
+
+# Load settings from .env (this module is imported before helper_sk, which loads it too)
+load_dotenv(override=True)
+
+# Image and CSS cache: total size of the cached images, preload threads and the width images are scaled to for display
+ASSET_CACHE_BYTES = int(os.getenv("ASSET_CACHE_MB", "64")) * 1024 * 1024
+ASSET_PRELOAD_WORKERS = int(os.getenv("ASSET_PRELOAD_WORKERS", "4"))
+IMAGE_DISPLAY_WIDTH = int(os.getenv("IMAGE_DISPLAY_WIDTH", "1440")) or None
+
+
+# Get the process-wide asset cache
 @st.cache_resource
+def get_asset_cache():
+    """
+    Return the image and CSS cache shared by every session.
+    """
+    return AssetCache(max_bytes=ASSET_CACHE_BYTES, max_workers=ASSET_PRELOAD_WORKERS)
+
+
+# Read a version of a file, cached until the file changes
+@lru_cache(maxsize=64)
+def _read_file_version(file_path, version):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+# Function to read the contents of a file
 def read_file(file_path, safe_mode=False):
     """
-    Reads the contents of a file.
+    Reads the contents of a file. The contents are cached until the file's modification time or
+    size changes.
     
     Args:
         file_path (str): Path to the file.
@@ -23,15 +54,16 @@ def read_file(file_path, safe_mode=False):
         str or None: The content of the file or None if an error occurs and safe_mode is True.
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
+        return _read_file_version(file_path, file_version(file_path))
     except FileNotFoundError:
         logging.error(f"File '{file_path}' not found.")
+        if not safe_mode:
+            raise
     except Exception as e:
         logging.error(f"Error reading file '{file_path}': {e}")
-    if safe_mode:
-        return None
-    raise
+        if not safe_mode:
+            raise
+    return None
 
 
 # Function to read the contents of a JSON file
@@ -49,58 +81,60 @@ def load_json_from_file(file_path):
 
 
 # Function to get the custom CSS
-@st.cache_resource
-def get_custom_css(css_file):
+def get_custom_css(css_files):
     """
-    Reads a custom CSS file and wraps its content in HTML style tags.
+    Reads one or more custom CSS files and merges them into one block of HTML style tags. The
+    bundle is cached until one of the files changes.
 
     Args:
-        css_file (str): The path to the CSS file.
+        css_files (str or list): The path of the CSS file, or a list of paths.
 
     Returns:
         str: The CSS content wrapped in <style> tags.
 
     Raises:
-        Exception: Propagates exceptions from the read_file function.
+        Exception: Propagates errors reading the files.
     """
+    if isinstance(css_files, str):
+        css_files = [css_files]
     try:
-        # Read the custom CSS from the file
-        custom_css = read_file(css_file)
-        logging.info("Custom CSS loaded")
-
-        # Wrap the custom CSS in style tags
-        return f"<style>{custom_css}</style>"
+        return get_asset_cache().css(css_files)
     except Exception as e:
-        logging.error(f"Error loading CSS file {css_file}: {e}")
+        logging.error(f"Error loading CSS files {css_files}: {e}")
         raise
 
 
 # Function to insert custom CSS
-def insert_custom_css(css_file):
+def insert_custom_css(css_files):
     """
-    Inserts custom CSS into the Streamlit application.
+    Inserts custom CSS into the Streamlit application, as a single style block.
 
     Args:
-        css_file (str): The path to the CSS file.
+        css_files (str or list): The path of the CSS file, or a list of paths.
     """
     # Insert the custom CSS into the app
-    st.markdown(get_custom_css(css_file), unsafe_allow_html=True)
+    st.markdown(get_custom_css(css_files), unsafe_allow_html=True)
 
 
 
 # Function to display a local image file
-def display_local_image(image_file):
+def display_local_image(image_file, width=IMAGE_DISPLAY_WIDTH):
     """
-    Displays a local image file in a Streamlit application.
+    Displays a local image file in a Streamlit application. The image is decoded once and served
+    from the asset cache, scaled down to `width` pixels and compressed.
 
     Args:
         image_file (str): Path to the image file.
+        width (int): Width in pixels the image is scaled down to, or None to keep its size.
 
     If the file is not found or cannot be opened as an image, an error message is displayed.
     """
+    # PIL is only imported when an image is shown
+    from PIL import UnidentifiedImageError
+
     try:
-        # Open the local image file
-        image = Image.open(image_file)
+        # Get the display variant of the local image file
+        image = get_asset_cache().image(image_file, width)
         st.image(image, use_column_width=True)
     except FileNotFoundError:
         error_msg = f"Error: The slide '{image_file}' cannot be found. Please check the file path."
@@ -112,4 +146,67 @@ def display_local_image(image_file):
         logging.error(error_msg)
     except Exception as e:
         error_msg = f"Error presenting the '{image_file}' slide: {e}"
-        st.error(error_msg)
\ No newline at end of file
+        st.error(error_msg)
+
+
+# Function to preload local image files
+def preload_local_images(image_files, width=IMAGE_DISPLAY_WIDTH):
+    """
+    Decodes and caches local image files in background threads, so the slides of a deck display
+    without delay when the user moves through them.
+
+    Args:
+        image_files (list): Paths to the image files.
+        width (int): Width in pixels the images are scaled down to, as for display_local_image.
+    """
+    get_asset_cache().preload(image_files, width)
+
+
+
+# Function to render a chat message as a line of a transcript
+def format_transcript_message(role, content):
+    """
+    Renders a chat message as markdown for a transcript.
+
+    Args:
+        role (str): The message role.
+        content (str): The message content.
+
+    Returns:
+        str: The markdown for the message.
+    """
+    return f"**{role}:** {content}"
+
+
+# Function to display the message history of a chat
+def display_message_history(container, chat_history, key, visible_messages=HISTORY_VISIBLE_MESSAGES):
+    """
+    Displays the message history of a chat in a container.
+
+    Only the latest `visible_messages` messages are rendered as chat messages. Older messages are
+    collapsed behind a toggle and, when shown, rendered as a single markdown transcript, so a rerun
+    costs about the same however long the chat gets.
+
+    Args:
+        container: The Streamlit container to display the messages in.
+        chat_history: The chat history (an object with a list of messages with role and content).
+        key (str): Unique key for the history's widgets.
+        visible_messages (int): Number of most recent messages rendered as chat messages.
+    """
+    if container is None or chat_history is None:
+        return
+
+    messages = chat_history.messages
+    older = len(messages) - visible_messages
+
+    # Earlier messages, collapsed unless requested. The label stays the same as the chat grows, so
+    # the toggle keeps its state; the count goes in its help tooltip
+    if older > 0 and container.toggle("Show earlier messages", key=f"{key}_show_earlier", help=f"{older} earlier messages"):
+        transcript = [format_transcript_message(getattr(message.role, "value", str(message.role)), str(message.content)) for message in messages[:older]]
+        container.markdown("\n\n".join(transcript))
+
+    # Latest messages
+    for message in messages[max(older, 0):]:
+        with container.chat_message(message.role):
+            st.markdown(message.content)
+
@@ -0,0 +1,233 @@
+# Helper for running generations on a background event loop that outlives Streamlit script runs
+
+# Imports
+
+# Standard imports
+import time
+import asyncio
+import threading
+
+
+class GenerationBuffer:
+    """
+    Output of one background generation, written by the worker and read by the script runs.
+
+    It stands in for the Streamlit placeholder as the generation's response holder: the latest
+    text (or parsed JSON value) is kept, and version counts the writes so a reader only redraws
+    on change. Attributes are replaced whole, so readers on other threads see consistent values.
+
+    Args:
+        service_id (str): The service generating the response.
+        history_length (int): Messages in the chat history when the generation started.
+        on_change (callable): Optional; called (on the writer's thread) after every write.
+    """
+
+    def __init__(self, service_id, history_length=0, on_change=None):
+        self.service_id = service_id
+        self.history_length = history_length
+        self.on_change = on_change
+        self.text = ""
+        self.json_value = None
+        self.version = 0
+        self.started = time.time()
+        self.finished = None
+        self.result = None
+        self.future = None
+
+    def write(self, text):
+        self.text = str(text)
+        self._changed()
+
+    def json(self, value):
+        self.json_value = value
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change()
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def finish(self, result):
+        self.finished = time.time()
+        self.result = result
+
+
+class BackgroundWorker:
+    """
+    Runs generations on an asyncio event loop in a dedicated daemon thread.
+
+    The loop lives as long as the process, so the chat services, HTTP clients and connection
+    pools built on it (which are bound to their event loop) are shared by every script run and
+    session instead of being rebuilt on each rerun. Script runs await work on it with run().
+
+    A Streamlit rerun stops the script run, and with it any stream awaited there. Generations
+    started here keep running across reruns, page switches and browser reconnects, writing into
+    a GenerationBuffer per (session, key) that script runs attach to and render. Finished
+    buffers the session never comes back for are dropped after idle_ttl seconds.
+
+    Args:
+        idle_ttl (float): Seconds a finished buffer is kept for its session.
+        name (str): Name of the worker thread.
+    """
+
+    def __init__(self, idle_ttl=3600, name="generation-worker"):
+        self.idle_ttl = idle_ttl
+        self.loop = asyncio.new_event_loop()
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+        # Counters
+        self.started = 0
+        self.completed = 0
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """
+        Run a coroutine on the worker's event loop; returns a concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def run(self, generate, response_holder):
+        """
+        Await, from another event loop (e.g. a Streamlit script run), a generation run on the
+        worker's event loop, rendering its output into the caller's response holder.
+
+        Streamlit elements can only be written from their script run's thread, so the
+        generation writes into a GenerationBuffer and the caller redraws the response holder
+        from its own loop when the buffer changes (only the latest write, however many came
+        in between). If the caller stops awaiting (e.g. its script run is stopped), the
+        generation is cancelled.
+
+        Args:
+            generate (callable): Called on the worker's loop with the buffer; returns a
+                coroutine that streams into it (like the generate argument of start).
+            response_holder: The caller's placeholder (anything with write and json).
+
+        Returns:
+            The coroutine's result.
+        """
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                # The caller's event loop has closed
+                pass
+
+        buffer = GenerationBuffer(None, on_change=wake)
+
+        async def run():
+            # generate is called here, on the worker's loop, so the services it looks up are bound to it
+            return await generate(buffer)
+
+        future = asyncio.wrap_future(self.submit(run()))
+        drawn = 0
+        try:
+            while True:
+                waiter = asyncio.ensure_future(changed.wait())
+                try:
+                    await asyncio.wait((future, waiter), return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                changed.clear()
+                if buffer.version != drawn:
+                    drawn = buffer.version
+                    if buffer.json_value is not None:
+                        response_holder.json(buffer.json_value)
+                    else:
+                        response_holder.write(buffer.text)
+                if future.done():
+                    return future.result()
+        finally:
+            future.cancel()
+
+    def start(self, session_id, key, service_id, generate, history_length=0):
+        """
+        Start a generation for the session under the key, replacing any earlier buffer.
+
+        Args:
+            session_id (str): The session ID.
+            key (str): The generation's key within the session (e.g. the chat history name).
+            service_id (str): The service generating the response.
+            generate (callable): Called with the buffer; returns a coroutine that streams into
+                it and returns the result dict.
+            history_length (int): Messages in the chat history when the generation started.
+
+        Returns:
+            GenerationBuffer: The buffer the generation writes to.
+        """
+        buffer = GenerationBuffer(service_id, history_length)
+
+        async def run():
+            try:
+                result = await generate(buffer)
+            except asyncio.CancelledError:
+                buffer.finish({"output": buffer.text, "status": "cancelled", "error": None, "time_to_first_token": None, "total_time": time.time() - buffer.started})
+                raise
+            except Exception as e:
+                result = {"output": buffer.text, "status": "error", "error": str(e), "time_to_first_token": None, "total_time": time.time() - buffer.started}
+            buffer.finish(result)
+            with self._lock:
+                self.completed += 1
+
+        with self._lock:
+            self._evict()
+            previous = self._buffers.get((session_id, key))
+            if previous is not None and not previous.done:
+                previous.future.cancel()
+            self._buffers[(session_id, key)] = buffer
+            self.started += 1
+        buffer.future = self.submit(run())
+        return buffer
+
+    def get(self, session_id, key):
+        """
+        Return the session's buffer under the key, or None.
+        """
+        with self._lock:
+            return self._buffers.get((session_id, key))
+
+    def clear(self, session_id, key):
+        """
+        Drop the session's buffer under the key once its result has been shown.
+        """
+        with self._lock:
+            self._buffers.pop((session_id, key), None)
+
+    def cancel(self, session_id, key):
+        """
+        Cancel the session's generation under the key, if running, and drop its buffer.
+        """
+        with self._lock:
+            buffer = self._buffers.pop((session_id, key), None)
+        if buffer is not None and not buffer.done:
+            buffer.future.cancel()
+
+    def _evict(self):
+        # Must hold the lock
+        cutoff = time.time() - self.idle_ttl
+        for key in [key for key, buffer in self._buffers.items() if buffer.done and buffer.finished < cutoff]:
+            del self._buffers[key]
+
+    def stats(self):
+        """
+        Return the worker counters as a dict.
+        """
+        with self._lock:
+            return {
+                "running": sum(not buffer.done for buffer in self._buffers.values()),
+                "unread": sum(buffer.done for buffer in self._buffers.values()),
+                "started": self.started,
+                "completed": self.completed,
+            }
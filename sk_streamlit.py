@@ -7,6 +7,7 @@ import asyncio
 
 # Third-party imports
 import streamlit as st
+import pandas as pd
 
 # Local imports
 from helpers import helper_utils as utils
@@ -18,7 +19,10 @@ from helpers import helper_sk as sk
 #***********************************************************************************************
 MENU_ITEMS = [
     {"menu_title": "Chat Services", "return_value": "chat_services", "submenu": []},
+    {"menu_title": "Chat", "return_value": "chat", "submenu": []},
     {"menu_title": "Chat Compare", "return_value": "chat_compare", "submenu": []},
+    {"menu_title": "Chat Compare N-Way", "return_value": "chat_compare_multi", "submenu": []},
+    {"menu_title": "Performance", "return_value": "performance", "submenu": []},
 
     # Add your menu items (and submenus) 
     # {"menu_title": "Agents", "return_value": "agents", "submenu": []},
@@ -29,6 +33,25 @@ MENU_ITEMS = [
 ]
 
 
+# Number of columns in the N-way chat compare grid
+GRID_COLUMNS = 2
+
+# Seconds between redraws of a response generating in the background
+BACKGROUND_REFRESH_INTERVAL = 0.1
+
+# Seconds a new prompt waits for the responses it supersedes to stop and commit their partial output
+SUPERSEDE_WAIT = 2.0
+
+# How a response that ended early is labelled, by status
+CANCELLED_STATUSES = {
+    "cancelled": "Cancelled",
+    "superseded": "Stopped for a newer prompt",
+    "reset": "Stopped, the conversation was reset",
+    "orphaned": "Stopped, no tab was showing it",
+    "interrupted": "Stopped with the page",
+}
+
+
 #***********************************************************************************************
 # Page content functions
 #***********************************************************************************************
@@ -43,6 +66,46 @@ async def chat_services():
 
     # Display the chat services
     st.write(st.session_state.chat_services)
+
+    # Display the shared connection pool statistics
+    st.markdown("**Connection Pools**")
+    st.dataframe(sk.get_pool_stats(), hide_index=True)
+
+    # Display the chat history store statistics
+    st.markdown("**Chat History Store**")
+    st.dataframe([sk.get_history_store().stats()], hide_index=True)
+
+    # Display the concurrency scheduler statistics
+    st.markdown("**Concurrency Scheduler**")
+    st.dataframe([sk.get_scheduler().stats()], hide_index=True)
+
+    # Display the local model residency, load/evict events and cold-start penalties
+    manager = sk.get_model_manager()
+    if manager.services:
+        st.markdown("**Local Models**")
+        st.dataframe(manager.residency(), hide_index=True)
+        cold_starts = manager.cold_start_stats()
+        if cold_starts:
+            st.dataframe(cold_starts, hide_index=True)
+        events = [{**event, "timestamp": pd.to_datetime(event["timestamp"], unit="s")} for event in manager.events()[:50]]
+        if events:
+            st.dataframe(events, hide_index=True)
+
+    # Display the completion cache counters, if the cache is enabled
+    cache = sk.get_completion_cache()
+    if cache:
+        st.markdown("**Completion Cache**")
+        cache_stats = cache.stats()
+        hits_col, misses_col, ratio_col = st.columns(3)
+        hits_col.metric("Hits (memory / disk)", f"{cache_stats['memory_hits']} / {cache_stats['disk_hits']}")
+        misses_col.metric("Misses", cache_stats["misses"])
+        ratio_col.metric("Hit ratio", f"{cache_stats['hit_ratio']:.0%}")
+
+    # Display the semantic cache counters, if the semantic cache is enabled
+    semantic_cache = sk.get_semantic_cache()
+    if semantic_cache:
+        st.markdown("**Semantic Cache**")
+        st.dataframe([semantic_cache.stats()], hide_index=True)
     
     # Show information about semantic kernel
     st.write("Semantic Kernel is an open-source SDK that lets you easily build agents that can call your existing code. As a highly extensible SDK, you can use Semantic Kernel with models from OpenAI, Azure OpenAI, Hugging Face, and more! By combining your existing C#, Python, and Java code with these models, you can build agents that answer questions and automate processes.")
@@ -51,22 +114,47 @@ async def chat_services():
     st.markdown("- [Semantic Kernel GitHub](https://github.com/microsoft/semantic-kernel)")
 
 
-async def chat_compare():
+async def chat():
     """
-    Display the chat compare page content.
+    Display the chat page content.
     """
 
+    # Display the header and description
+    st.markdown("### Chat")
+    st.write("Chat with one service, optionally hedged with a backup service that is asked when the first is slow to answer, "
+             "or let the router pick the fastest healthy service for each message (Auto).")
 
-    # Function to display message history
-    def display_message_history(container, chat_history):
-        """
-        Display the message history.
-        """
-        if container != None and chat_history != None:
-            for message in chat_history.messages:
-                with container.chat_message(message.role):
-                    st.markdown(message.content)
+    # Setup the sidebar and get the selected service (None for Auto), backup service, hedge deadline and tool mode
+    service_name, backup_name, hedge_after, tools = await setup_chat_sidebar()
 
+    # Display the chat history
+    chat_history = sk.get_chat_history("chat")
+    utils.display_message_history(st.container(), chat_history, key="chat")
+
+    # Get the user prompt
+    if prompt := st.chat_input():
+
+        # Add the user input to the chat history and display it
+        chat_history.add_user_message(prompt)
+        st.chat_message("user").markdown(prompt)
+
+        # Stream the response, hedged with the backup service if one is selected
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            stats_holder = st.empty()
+        result = await stream_chat_response("chat", service_name, chat_history, placeholder, stats_holder, backup_name=backup_name, hedge_after=hedge_after, tools=tools)
+
+        # Show why the router picked the service
+        if result.get("decision"):
+            with st.expander("Routing decision"):
+                st.write(f"**{result['decision']['service_id']}**: {result['decision']['reason']}")
+                st.dataframe(result["decision"]["candidates"], hide_index=True)
+
+
+async def chat_compare():
+    """
+    Display the chat compare page content.
+    """
 
     # Display the header and description
     st.markdown("### Chat Compare")
@@ -79,74 +167,333 @@ async def chat_compare():
     # Create two columns
     col1, col2 = st.columns(2)
 
-    # Display the chat service name, set the chat service, and get the chat history, display the chat history   
+    # Display the chat service name, get the chat history and display it
     with col1:
         st.markdown(f"**{st.session_state.chat_service_1}**")
-        chat_service_1 = st.session_state.get(f"{st.session_state.chat_service_1}_service")
-        chat_history_1 = st.session_state.get(f"{st.session_state.chat_service_1}_history")    
-        display_message_history(col1, chat_history_1)
+        chat_history_1 = sk.get_chat_history(st.session_state.chat_service_1)
+        shown_1 = len(chat_history_1.messages)
+        utils.display_message_history(col1, chat_history_1, key=f"chat_compare_1_{st.session_state.chat_service_1}")
 
-    # Display the chat service name, set the chat service, and get the chat history, display the chat history   
+    # Display the chat service name, get the chat history and display it
     with col2:
         st.markdown(f"**{st.session_state.chat_service_2}**")
-        chat_service_2 = st.session_state.get(f"{st.session_state.chat_service_2}_service")
-        chat_history_2 = st.session_state.get(f"{st.session_state.chat_service_2}_history")
-        display_message_history(col2, chat_history_2)
+        chat_history_2 = sk.get_chat_history(st.session_state.chat_service_2)
+        shown_2 = len(chat_history_2.messages)
+        utils.display_message_history(col2, chat_history_2, key=f"chat_compare_2_{st.session_state.chat_service_2}")
 
+    # Responses still generating in the background, e.g. from before a rerun
+    history_names = (st.session_state.chat_service_1, st.session_state.chat_service_2)
+    busy = any(buffer is not None and not buffer.done for buffer in map(sk.get_background_response, history_names))
 
     # Get the user prompt
     if prompt := st.chat_input():
+        if busy:
+            # The new prompt supersedes the responses still generating: stop them and show the partial
+            # responses they committed to the chat histories
+            for history_name in history_names:
+                sk.cancel_generation(history_name, "superseded", wait=SUPERSEDE_WAIT)
+                sk.clear_background_response(history_name)
+            for column, chat_history, shown in ((col1, chat_history_1, shown_1), (col2, chat_history_2, shown_2)):
+                for message in chat_history.messages[shown:]:
+                    column.chat_message(message.role).markdown(message.content)
+            shown_1, shown_2 = len(chat_history_1.messages), len(chat_history_2.messages)
 
         # Add the user input to the chat history and display the user input
         chat_history_1.add_user_message(prompt)
         chat_history_2.add_user_message(prompt)
-        
+        sk.save_chat_history(st.session_state.chat_service_1, chat_history_1)
+        sk.save_chat_history(st.session_state.chat_service_2, chat_history_2)
+        shown_1, shown_2 = shown_1 + 1, shown_2 + 1
+
         # Display the user input
         col1.chat_message("user").markdown(prompt)
         col2.chat_message("user").markdown(prompt)
 
-        # Create placeholders for the assistant's response and setup the routine to get the responses
-        with col1.chat_message("assistant"):
-            placeholder_1 = st.empty()
-            
-            # Initialize the response coroutine
-            response_1 = sk.generate_streaming_response(
-                response_holder=placeholder_1,
-                chat_service=chat_service_1,
+        # Generate both responses in the background worker, each on its own, so a failing or
+        # slow service doesn't hold up the other and a rerun doesn't stop either
+        sk.start_background_response(st.session_state.chat_service_1, st.session_state.chat_service_1, "You are a helpful AI assistant.", chat_history_1, tools=st.session_state.chat_compare_tools)
+        sk.start_background_response(st.session_state.chat_service_2, st.session_state.chat_service_2, "You are a helpful AI assistant.", chat_history_2, tools=st.session_state.chat_compare_tools)
+
+    # Render the background responses as they stream
+    await display_background_responses([(col1, st.session_state.chat_service_1, shown_1), (col2, st.session_state.chat_service_2, shown_2)])
+
+
+async def chat_compare_multi():
+    """
+    Display the N-way chat compare page content.
+    """
+
+    # Display the header and description
+    st.markdown("### Chat Compare N-Way")
+    st.write("Send one prompt to all selected chat services at once.")
+
+    # Setup the sidebar and get the selected chat services
+    selected_services = await setup_chat_compare_multi_sidebar()
+    if not selected_services:
+        st.info("Select at least one chat service in the sidebar.")
+        return
+
+    # Lay the chat services out in a grid and display their chat histories
+    cells = []
+    for row_start in range(0, len(selected_services), GRID_COLUMNS):
+        row = st.columns(GRID_COLUMNS)
+        for service_name, column in zip(selected_services[row_start:row_start + GRID_COLUMNS], row):
+            column.markdown(f"**{service_name}**")
+            chat_history = sk.get_chat_history(f"{service_name}_multi")
+            utils.display_message_history(column, chat_history, key=f"{service_name}_multi_history")
+            cells.append((service_name, column, chat_history))
+
+    # Get the user prompt
+    if prompt := st.chat_input():
+
+        # Add the user input to each chat history, display it, and setup the response coroutines
+        responses = []
+        for service_name, column, chat_history in cells:
+            chat_history.add_user_message(prompt)
+            column.chat_message("user").markdown(prompt)
+            with column.chat_message("assistant"):
+                placeholder = st.empty()
+                stats_holder = st.empty()
+            responses.append(stream_chat_response(f"{service_name}_multi", service_name, chat_history, placeholder, stats_holder))
+
+        # Fan the prompt out; the scheduler bounds how many calls run at once overall and per endpoint
+        await asyncio.gather(*responses)
+
+
+async def performance():
+    """
+    Display the performance page content.
+    """
+
+    # Display the header and description
+    st.markdown("### Performance")
+    st.write("Latency and throughput of the recent model calls of all sessions, per chat service.")
+
+    # Get the recorded calls
+    records = sk.get_metrics().records()
+    if not records:
+        st.info("No model calls recorded yet.")
+        return
+    calls = pd.DataFrame(records)
+
+    # Latencies are None for calls that produced no token; as NaN they are left out of the aggregates
+    for column in ("time_to_first_token", "mean_inter_token_gap", "max_inter_token_gap", "duration", "queue_wait"):
+        calls[column] = pd.to_numeric(calls[column], errors="coerce")
+
+    # Display the summary per chat service; failed calls (errors and timeouts) and cancelled calls are counted apart
+    by_service = calls.groupby("service_id")
+    summary = pd.DataFrame({
+        "calls": by_service.size(),
+        "errors": by_service["status"].apply(lambda status: status.isin(["error", "timeout"]).sum()),
+        "cancelled": by_service["status"].apply(lambda status: status.isin(list(CANCELLED_STATUSES)).sum()),
+        "cached": by_service["cached"].sum(),
+        "prompt tokens": by_service["prompt_tokens"].sum(),
+        "completion tokens": by_service["completion_tokens"].sum(),
+        "tokens/s": by_service["completion_tokens"].sum() / by_service["duration"].sum(),
+        "mean inter-token gap (ms)": by_service["mean_inter_token_gap"].mean() * 1000,
+    })
+    st.dataframe(summary)
+
+    # Display p50/p95/p99 per chat service for each latency
+    for metric, label in (("time_to_first_token", "Time to first token (s)"), ("duration", "Total duration (s)"), ("queue_wait", "Queue wait (s)")):
+        st.markdown(f"**{label}**")
+        percentiles = by_service[metric].quantile([0.5, 0.95, 0.99]).unstack()
+        percentiles.columns = ["p50", "p95", "p99"]
+        st.bar_chart(percentiles, stack=False)
+
+    # Display the hedged request statistics
+    hedge_stats = sk.get_hedge_stats().stats()
+    if hedge_stats:
+        st.markdown("**Hedged requests**")
+        st.dataframe(hedge_stats, hide_index=True)
+
+    # Display the admission control queues and throttling per deployment
+    admission_stats = sk.get_admission_controller().stats()
+    if admission_stats:
+        st.markdown("**Admission control**")
+        st.dataframe(admission_stats, hide_index=True)
+
+    # Display the background generation counters
+    st.markdown("**Background generations**")
+    st.dataframe([sk.get_generation_worker().stats()], hide_index=True)
+
+    # Display the generation lifecycle: outcomes, tokens wasted by and saved by cancelled generations, and running generations
+    tracker = sk.get_generation_tracker()
+    if tracker.stats():
+        st.markdown("**Generation lifecycle**")
+        st.dataframe(tracker.stats(), hide_index=True)
+    if tracker.running():
+        st.dataframe(tracker.running(), hide_index=True)
+
+    # Display the tool executor counters: calls, memoized results, timeouts and the latency saved by running each turn's calls together
+    tool_stats = sk.get_tool_executor().stats()
+    if tool_stats["turns"]:
+        st.markdown("**Tool calls**")
+        st.dataframe([tool_stats], hide_index=True)
+
+    # Display the router's view of each service and its recent decisions
+    router = sk.get_router()
+    if router.health():
+        st.markdown("**Router**")
+        st.dataframe(router.health(), hide_index=True)
+        decisions = [{"time": pd.to_datetime(decision["timestamp"], unit="s"), "service_id": decision["service_id"], "reason": decision["reason"]}
+                     for decision in router.decisions()[:50]]
+        if decisions:
+            st.dataframe(decisions, hide_index=True)
+
+    # Display the most recent calls
+    st.markdown("**Recent calls**")
+    st.dataframe(calls.tail(100).iloc[::-1], hide_index=True)
+
+
+#***********************************************************************************************
+# Page display and styling helper functions
+#***********************************************************************************************
+async def stream_chat_response(history_name, service_name, chat_history, placeholder, stats_holder, backup_name=None, hedge_after=None, tools=False):
+    """
+    Stream one assistant response into its placeholder and commit it to the chat history as soon
+    as the stream ends, then show its latency (or what went wrong) below it.
+
+    With a backup service, the request is hedged: the backup is asked too if the chat service
+    has not answered within hedge_after seconds, and the first to answer is shown. Without a
+    chat service, the adaptive router picks one. With tools, the model may call the kernel's
+    plugins (see sk.TOOL_PLUGINS). The response is generated on the background
+    worker's long-lived event loop and tracked under the chat history name (see
+    sk.run_generation), so a stopped script run closes its stream. Returns the response result.
+    """
+    session_id = sk.get_session_id()
+    candidates = st.session_state.chat_services
+
+    # Called on the worker's event loop, where the chat services are looked up
+    def generate(response_holder):
+        if service_name is None:
+            return sk.run_routed_streaming_response(
+                response_holder=response_holder,
                 system_message="You are a helpful AI assistant.",
-                chat_history=chat_history_1,
+                chat_history=chat_history,
                 user_input=None, # Already added to chat history.
+                session_id=session_id,
+                candidates=candidates,
+                tools=tools,
             )
-
-        # Placeholder for the assistant's response
-        with col2.chat_message("assistant"):
-            placeholder_2 = st.empty()
-
-            # Initialize the response coroutine
-            response_2 = sk.generate_streaming_response(
-                response_holder=placeholder_2,
-                chat_service=chat_service_2,
+        if backup_name is not None:
+            return sk.run_hedged_streaming_response(
+                response_holder=response_holder,
+                chat_service=sk.get_chat_service(service_name),
+                backup_service=sk.get_chat_service(backup_name),
                 system_message="You are a helpful AI assistant.",
-                chat_history=chat_history_2,
+                chat_history=chat_history,
                 user_input=None, # Already added to chat history.
+                session_id=session_id,
+                hedge_after=hedge_after,
+                tools=tools,
             )
-                
-        # Build and gather the response coroutines
-        coroutines = [response_1, response_2]
-        responses = await asyncio.gather(*coroutines)
+        return sk.run_streaming_response(
+            response_holder=response_holder,
+            chat_service=sk.get_chat_service(service_name),
+            system_message="You are a helpful AI assistant.",
+            chat_history=chat_history,
+            user_input=None, # Already added to chat history.
+            session_id=session_id,
+            tools=tools,
+        )
 
-        # Add the assistant's response to the chat history
-        chat_history_1.add_assistant_message(responses[0])
-        chat_history_2.add_assistant_message(responses[1])
+    result = await sk.run_generation(history_name, service_name or "auto", generate, placeholder)
 
-        # Important: Update the session state with the modified chat history
-        st.session_state[f"{chat_service_1}_history"] = chat_history_1
-        st.session_state[f"{chat_service_2}_history"] = chat_history_2 
+    # Add the assistant's response (complete or partial) to the chat history
+    if result["output"]:
+        chat_history.add_assistant_message(result["output"])
+
+    # Important: Save the modified chat history to the history store
+    sk.save_chat_history(history_name, chat_history)
+
+    display_response_stats(stats_holder, result)
+    return result
+
+
+def display_response_stats(stats_holder, result):
+    """
+    Show a response's time to first token and total latency, and flag timeouts and errors.
+    """
+    ttft = result["time_to_first_token"]
+    latency = f"first token {ttft:.2f}s · total {result['total_time']:.2f}s" if ttft is not None else f"no tokens · {result['total_time']:.2f}s"
+    if result.get("hedged"):
+        latency = f"{result['service_id']} (hedged) · {latency}"
+    elif result.get("decision") and result["service_id"]:
+        latency = f"routed to {result['service_id']} · {latency}"
+    if result["status"] == "timeout":
+        stats_holder.warning(f"Timed out ({latency}); partial response kept.")
+    elif result["status"] == "error":
+        stats_holder.error(f"{result['error']} ({latency})")
+    elif result["status"] in CANCELLED_STATUSES:
+        stats_holder.warning(f"{CANCELLED_STATUSES[result['status']]} ({latency}).")
+    else:
+        stats_holder.caption(latency)
+
+
+async def display_background_responses(columns):
+    """
+    Attach to the background responses of the chat histories and render them until they end.
+
+    Args:
+        columns (list): (container, history name, number of history messages shown) tuples.
+            A response the shown history already holds has been committed and is not rendered again.
+    """
+    views = []
+    for container, history_name, shown in columns:
+        buffer = sk.get_background_response(history_name)
+        if buffer is None:
+            continue
+        if shown > buffer.history_length:
+            sk.clear_background_response(history_name)
+            continue
+        with container.chat_message("assistant"):
+            views.append((history_name, buffer, st.empty(), st.empty(), [None]))
+
+    # Redraw each response when it changes; a rerun stops this loop, not the generations
+    while views:
+        for view in list(views):
+            history_name, buffer, placeholder, stats_holder, drawn = view
+            if buffer.version != drawn[0]:
+                drawn[0] = buffer.version
+                if buffer.json_value is not None:
+                    placeholder.json(buffer.json_value)
+                else:
+                    placeholder.markdown(buffer.text)
+            if buffer.done:
+                display_response_stats(stats_holder, buffer.result)
+                sk.clear_background_response(history_name)
+                views.remove(view)
+        await asyncio.sleep(BACKGROUND_REFRESH_INTERVAL)
+
+
+async def setup_chat_sidebar():
+    """
+    Setup the sidebar for the chat page and return (service or None for Auto, backup service or
+    None, hedge deadline, whether tools are enabled).
+    """
+    with st.sidebar:
+        st.sidebar.markdown("**Chat Service**")
+        service_name = st.radio("Chat Service", ["Auto"] + st.session_state.chat_services, key="chat_service", label_visibility="collapsed")
+        auto = service_name == "Auto"
+
+        st.sidebar.markdown("**Hedge With**")
+        backup_options = ["None"] + [name for name in st.session_state.chat_services if name != service_name]
+        backup_name = st.selectbox("Hedge With", backup_options, key="chat_backup_service", label_visibility="collapsed", disabled=auto)
+        hedge_after = st.number_input("Hedge after (s)", min_value=0.0, value=sk.HEDGE_AFTER, step=0.5, disabled=auto or backup_name == "None")
+
+        # Let the model call the kernel's plugins (services whose connector can't call tools just chat)
+        tools = st.toggle("Use tools", key="chat_tools", help="Let the model call the kernel's plugins: " + ", ".join(sk.get_service_registry().plugin_names()))
+
+        # Clear the conversation on request
+        if st.button("New conversation"):
+            sk.reset_chat_history("chat")
+
+    if auto:
+        return None, None, hedge_after, tools
+    return service_name, None if backup_name == "None" else backup_name, hedge_after, tools
 
 
-#***********************************************************************************************
-# Page display and styling helper functions
-#***********************************************************************************************
 async def setup_chat_compare_sidebar():
     """
     Setup the sidebar for the chat compare page and detect changes in the selection.
@@ -169,15 +516,42 @@ async def setup_chat_compare_sidebar():
             label_visibility="collapsed"
         )
 
+        # Let the models call the kernel's plugins
+        st.toggle("Use tools", key="chat_compare_tools", help="Let the models call the kernel's plugins: " + ", ".join(sk.get_service_registry().plugin_names()))
+
         # Detect changes, update session state, reinitialize histories, and rerun the app
         if st.session_state.chat_service_1 != chat_service_1_selection or st.session_state.chat_service_2 != chat_service_2_selection:
+            # The responses still generating for the previous selection will never be shown
+            sk.cancel_generation(st.session_state.chat_service_1, "reset")
+            sk.cancel_generation(st.session_state.chat_service_2, "reset")
             st.session_state.chat_service_1 = chat_service_1_selection
-            st.session_state[f"{chat_service_1_selection}_history"] = sk.new_chat_history()
+            sk.reset_chat_history(chat_service_1_selection)
             st.session_state.chat_service_2 = chat_service_2_selection
-            st.session_state[f"{chat_service_2_selection}_history"] = sk.new_chat_history()
+            sk.reset_chat_history(chat_service_2_selection)
             st.rerun()
 
 
+async def setup_chat_compare_multi_sidebar():
+    """
+    Setup the sidebar for the N-way chat compare page and return the selected chat services.
+    """
+    with st.sidebar:
+        st.sidebar.markdown("**Chat Services**")
+        selected_services = st.multiselect(
+            "Chat Services",
+            st.session_state.chat_services,
+            default=st.session_state.chat_services,
+            label_visibility="collapsed",
+        )
+
+        # Clear the N-way conversations on request
+        if st.button("New conversation"):
+            for service_name in st.session_state.chat_services:
+                sk.reset_chat_history(f"{service_name}_multi")
+
+    return selected_services
+
+
 async def initialize_app_session_state():
     """
     Initialize the session state variables for the application.
@@ -186,14 +560,15 @@ async def initialize_app_session_state():
     # Initialize chat_sevices if necssary
     if "chat_services" not in st.session_state:
         sk.initialize_chat_services()
+
+    # Record this tab as showing the session, so its background generations aren't treated as orphaned
+    sk.touch_session()
         
 
     # Initialize chat app specific settings
     if "chat_compare_initialized" not in st.session_state:
         
-        # Create a chat_history for each service
-        for service_name in st.session_state.chat_services:
-            st.session_state[f"{service_name}_history"] = sk.new_chat_history()
+        # Chat histories are created in the history store when a service is first selected
 
         # Initialize chat service 1 and 2
         st.session_state.chat_service_1 = st.session_state.chat_services[0]
@@ -209,8 +584,7 @@ async def setup_styling_and_menu():
     """
     
     # Insert custom CSS into the page
-    utils.insert_custom_css('./helpers/style_helpers/site.css')
-    utils.insert_custom_css('./helpers/style_helpers/menu.css')
+    utils.insert_custom_css(['./helpers/style_helpers/site.css', './helpers/style_helpers/menu.css'])
 
     # Setup the menu
     menu_items = []
@@ -280,7 +654,9 @@ async def main():
         # Initialize the session state vars for the application
         await initialize_app_session_state()
 
-        # Setup the page, get the selected_title, display the page content
+        # Setup the page, get the selected_title, display the page content. The model calls run on
+        # the background worker's long-lived event loop (see sk.run_generation), so this run's
+        # event loop only renders and holds no clients to close.
         selected_return_value = await setup_styling_and_menu()
         await display_page_content(selected_return_value)
 